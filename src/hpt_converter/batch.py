@@ -0,0 +1,279 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from enum import StrEnum
+from logging import getLogger
+from typing import List, Optional
+
+from hpt_converter.csv2parquet import Csv2Parquet, Engine, FileMetaData
+from hpt_converter.lib.compressed import (ARCHIVE_SUFFIX, COMPRESSION_CODECS,
+                                          list_archive_members,
+                                          split_archive_path)
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import PriceType
+from hpt_converter.lib.schema.csv.v2.standard_charge import MODEL_CACHE
+from hpt_converter.lib.writer import (DEFAULT_ROW_GROUP_SIZE, OUTPUT_CODECS,
+                                     OutputFormat, OutputSink)
+
+MANIFEST_FILE_NAME = 'manifest.jsonl'
+INPUT_SUFFIXES = ['.csv'] + [f'.csv{suffix}' for suffix in COMPRESSION_CODECS] + [ARCHIVE_SUFFIX]
+
+logger = getLogger(__name__)
+
+
+class ConversionStatus(StrEnum):
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+@dataclass
+class ConversionResult:
+    input_path: str
+    output_path: str
+    status: ConversionStatus
+    started_at: str
+    elapsed_seconds: float
+    meta_data: Optional[FileMetaData] = None
+    error: Optional[str] = None
+
+
+def find_input_files(input_pattern: str) -> List[str]:
+    """Finds CSV files to convert. Compressed CSV files are included, and zip archives are expanded into
+    the CSV files in them(see `split_archive_path`).
+
+    Args:
+        input_pattern (str): A directory, in which case all CSV files under it are found, or a glob pattern.
+    Returns:
+        List[str]: sorted absolute paths of input files.
+    """
+    if os.path.isdir(input_pattern):
+        paths = [path for suffix in INPUT_SUFFIXES
+                 for path in glob.glob(os.path.join(input_pattern, '**', f'*{suffix}'), recursive=True)]
+    else:
+        paths = glob.glob(input_pattern, recursive=True)
+    input_files = []
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        path = os.path.abspath(path)
+        input_files += list_archive_members(path) if path.lower().endswith(ARCHIVE_SUFFIX) else [path]
+    return sorted(input_files)
+
+
+def get_output_path(input_path: str, input_root: str, out_dir_path: str) -> str:
+    """Returns the output folder of an input file: its path relative to `input_root` without extensions,
+    under `out_dir_path`. A file in an archive is in the folder of the archive, e.g. `mrfs/hospital_a` for
+    `mrfs.zip!hospital_a.csv`."""
+    file_path, member = split_archive_path(input_path)
+    relative_path = os.path.relpath(file_path, input_root)
+    if member:
+        relative_path = os.path.join(os.path.splitext(relative_path)[0], member)
+    relative_path, suffix = os.path.splitext(relative_path)
+    if suffix.lower() in COMPRESSION_CODECS:
+        relative_path = os.path.splitext(relative_path)[0]
+    return os.path.join(out_dir_path, relative_path)
+
+
+def read_manifest(manifest_path: str) -> List[ConversionResult]:
+    """Reads the results recorded in a manifest file. Later records of the same input file override earlier ones.
+
+    Args:
+        manifest_path (str): Path to JSON lines manifest.
+    Returns:
+        List[ConversionResult]: the latest result of each input file.
+    """
+    results = {}
+    if not os.path.exists(manifest_path):
+        return []
+    with open(manifest_path, mode='r', encoding='utf-8') as manifest_file:
+        for line in manifest_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('meta_data'):
+                record['meta_data'] = FileMetaData.from_dict(record['meta_data'])
+            record['status'] = ConversionStatus(record['status'])
+            results[record['input_path']] = ConversionResult(**record)
+    return list(results.values())
+
+
+def convert_file(input_path: str, output_path: str, engine: Engine = Engine.PYTHON,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE, model_cache_dir: str = None,
+                 compact: bool = False, price_type: PriceType = PriceType.DECIMAL,
+                 write_codes: bool = False, write_index: bool = False,
+                 sink: Optional[OutputSink] = None) -> ConversionResult:
+    """Converts a single file, capturing any error in the result instead of raising it.
+    Standard charge models are shared by the files converted in the same worker process(see `MODEL_CACHE`).
+
+    Args:
+        input_path (str): Path to input CSV file.
+        output_path (str): Path to output folder of the file.
+        engine (Engine): conversion engine.
+        row_group_size (int): Number of rows per row group of standard charge file.
+        model_cache_dir (str): If given, standard charge models are also cached in this folder.
+        compact (bool): If True, output is written in compact layout(see `Converter`).
+        price_type (PriceType): type of price columns.
+        write_codes (bool): If True, codes are also written to standard_charge_codes.parquet.
+        write_index (bool): If True, the index looked up by `hpt_converter.query` is written.
+        sink (OutputSink): format and compression of output files. Default is Parquet with SNAPPY compression.
+    Returns:
+        ConversionResult: the result of conversion.
+    """
+    if model_cache_dir:
+        MODEL_CACHE.cache_dir = model_cache_dir
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        meta_data = Csv2Parquet(csv_file_path=input_path, out_dir_path=output_path, engine=engine,
+                                row_group_size=row_group_size, compact=compact, price_type=price_type,
+                                write_codes=write_codes, write_index=write_index, sink=sink).convert()
+        return ConversionResult(input_path=input_path, output_path=output_path, status=ConversionStatus.SUCCEEDED,
+                                started_at=started_at, elapsed_seconds=time.perf_counter() - start, meta_data=meta_data)
+    except Exception as e:
+        return ConversionResult(input_path=input_path, output_path=output_path, status=ConversionStatus.FAILED,
+                                started_at=started_at, elapsed_seconds=time.perf_counter() - start,
+                                error=f"{type(e).__name__}: {e}")
+
+
+def convert_batch(input_pattern: str, out_dir_path: str, workers: int = None, engine: Engine = Engine.PYTHON,
+                  row_group_size: int = DEFAULT_ROW_GROUP_SIZE, manifest_path: str = None,
+                  skip_succeeded: bool = False, model_cache_dir: str = None,
+                  compact: bool = False, price_type: PriceType = PriceType.DECIMAL,
+                  write_codes: bool = False, write_index: bool = False,
+                  sink: Optional[OutputSink] = None) -> List[ConversionResult]:
+    """Converts many files concurrently in a process pool. Each file is written to its own output folder
+    (see `get_output_path`), and its result is appended to the manifest as soon as it completes, so that
+    a failed file doesn't abort the run. If a worker process dies, e.g. killed by the OOM killer, the files that
+    were not finished are converted again by a single worker, and the file that kills it is recorded as failed.
+
+    Args:
+        input_pattern (str): A directory or a glob pattern of input CSV files.
+        out_dir_path (str): Path to output root folder.
+        workers (int): Number of worker processes. Default is the number of CPUs.
+        engine (Engine): conversion engine.
+        row_group_size (int): Number of rows per row group of standard charge file.
+        manifest_path (str): Path to JSON lines manifest. Default is 'manifest.jsonl' in the output root folder.
+        skip_succeeded (bool): If True, files recorded as succeeded in the manifest are not converted again.
+        model_cache_dir (str): If given, standard charge models are also cached in this folder across runs.
+        compact (bool): If True, output is written in compact layout(see `Converter`).
+        price_type (PriceType): type of price columns.
+        write_codes (bool): If True, codes are also written to standard_charge_codes.parquet.
+        write_index (bool): If True, the index looked up by `hpt_converter.query` is written for each file.
+        sink (OutputSink): format and compression of output files. Default is Parquet with SNAPPY compression.
+    Returns:
+        List[ConversionResult]: results of the files converted in this run, in the order of completion.
+    Raises:
+        ValueError: If input files have the same output folder, e.g. `a.csv` and `a.csv.gz`.
+    """
+    manifest_path = manifest_path or os.path.join(out_dir_path, MANIFEST_FILE_NAME)
+    input_files = find_input_files(input_pattern)
+    # output folders are of every input file, so that they don't change when succeeded files are skipped.
+    input_root = os.path.abspath(input_pattern) if os.path.isdir(input_pattern) else os.path.commonpath(
+        [os.path.dirname(split_archive_path(path)[0]) for path in input_files] or [os.getcwd()])
+    output_paths = {}
+    for path in input_files:
+        output_path = get_output_path(path, input_root, out_dir_path)
+        other_path = output_paths.setdefault(os.path.normcase(output_path), path)
+        if other_path != path:
+            raise ValueError(f"Input files({other_path}, {path}) would be written to the same folder({output_path})")
+    if skip_succeeded:
+        succeeded = {result.input_path for result in read_manifest(manifest_path)
+                     if result.status == ConversionStatus.SUCCEEDED}
+        input_files = [path for path in input_files if path not in succeeded]
+    logger.info(f"Converting {len(input_files)} files with {workers or os.cpu_count()} workers")
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    results = []
+    with open(manifest_path, mode='a', encoding='utf-8') as manifest_file:
+
+        def _record(result: ConversionResult):
+            if result.status == ConversionStatus.FAILED:
+                logger.error(f"Failed to convert {result.input_path}: {result.error}")
+            manifest_file.write(json.dumps(asdict(result)) + '\n')
+            manifest_file.flush()
+            results.append(result)
+
+        def _failed(path: str, error: str) -> ConversionResult:
+            return ConversionResult(input_path=path, output_path=get_output_path(path, input_root, out_dir_path),
+                                    status=ConversionStatus.FAILED, started_at=datetime.now(timezone.utc).isoformat(),
+                                    elapsed_seconds=0.0, error=error)
+
+        pending, isolated = input_files, False
+        while pending:
+            interrupted = []
+            with ProcessPoolExecutor(max_workers=1 if isolated else workers) as executor:
+                futures = {executor.submit(convert_file, path, get_output_path(path, input_root, out_dir_path),
+                                           engine, row_group_size, model_cache_dir, compact, price_type, write_codes,
+                                           write_index, sink): path
+                           for path in pending}
+                for future in as_completed(futures):
+                    try:
+                        _record(future.result())
+                    except BrokenProcessPool:
+                        interrupted.append(futures[future])
+                    except Exception as e:
+                        _record(_failed(futures[future], f"{type(e).__name__}: {e}"))
+            interrupted.sort(key=pending.index)
+            if interrupted and isolated:
+                # a single worker converts files in order, so the first file not finished is the one that killed it.
+                _record(_failed(interrupted[0], "BrokenProcessPool: the worker process died while converting the file"))
+                interrupted = interrupted[1:]
+            if interrupted:
+                logger.warning(f"A worker process died, converting {len(interrupted)} files not finished again")
+            pending, isolated = interrupted, isolated or bool(interrupted)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a batch of HPT CSV files to abstract schema in Parquet.")
+
+    parser.add_argument("input", type=str, help="Path to input folder or glob pattern of input CSV files.")
+    parser.add_argument("--output-folder", type=str, required=True, help="Path to output root folder.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes. Default is the number of CPUs.")
+    parser.add_argument("--engine", choices=[m.value for m in Engine], default=Engine.PYTHON.value,
+                        help="Conversion engine(\"python\" or \"arrow\"). Default is \"python\".")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Number of rows per row group of standard charge file. Default is {DEFAULT_ROW_GROUP_SIZE}.")
+    parser.add_argument("--manifest", type=str, help=f"Path to manifest file. Default is {MANIFEST_FILE_NAME} in the output folder.")
+    parser.add_argument("--skip-succeeded", action='store_true',
+                        help="Skip files that are recorded as succeeded in the manifest, i.e. re-run only failures.")
+    parser.add_argument("--model-cache-dir", type=str,
+                        help="Path to folder where standard charge models are cached by header. Default is no disk cache.")
+    parser.add_argument("--compact", action='store_true',
+                        help="Dictionary encode low-cardinality columns and refer to payer plans by int32 plan_key.")
+    parser.add_argument("--price-type", choices=[m.value for m in PriceType], default=PriceType.DECIMAL.value,
+                        help="Type of price columns(\"decimal\", \"float\" or \"cents\"). Default is \"decimal\".")
+    parser.add_argument("--write-codes", action='store_true',
+                        help="Also write codes to standard_charge_codes.parquet, one row per code.")
+    parser.add_argument("--write-index", action='store_true',
+                        help="Write the index of codes, descriptions and plan ids looked up by hpt_converter.query.")
+    parser.add_argument("--output-format", choices=[m.value for m in OutputFormat], default=OutputFormat.PARQUET.value,
+                        help="Format of output files(\"parquet\", \"arrow\" IPC file or \"arrows\" IPC stream). "
+                             "Default is \"parquet\".")
+    parser.add_argument("--compression", type=str,
+                        help=f"Codec of output files. Default is {OUTPUT_CODECS[OutputFormat.PARQUET][0]} for parquet "
+                             f"and {OUTPUT_CODECS[OutputFormat.ARROW][0]} for arrow, \"none\" for no compression.")
+    parser.add_argument("--compression-level", type=int, help="Level of the codec of output files, e.g. 19 for zstd.")
+    args = parser.parse_args()
+
+    try:
+        results = convert_batch(args.input, args.output_folder, workers=args.workers, engine=Engine(args.engine),
+                                row_group_size=args.row_group_size, manifest_path=args.manifest,
+                                skip_succeeded=args.skip_succeeded, model_cache_dir=args.model_cache_dir,
+                                compact=args.compact, price_type=PriceType(args.price_type),
+                                write_codes=args.write_codes, write_index=args.write_index,
+                                sink=OutputSink(OutputFormat(args.output_format), args.compression,
+                                                args.compression_level))
+    except ValueError as e:
+        print(f"Failed: {str(e)}")
+        sys.exit(-1)
+    failed = [result for result in results if result.status == ConversionStatus.FAILED]
+    print(f"Converted {len(results) - len(failed)} files, failed {len(failed)} files.")
+    sys.exit(-1 if failed else 0)
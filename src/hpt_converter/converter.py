@@ -0,0 +1,446 @@
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+
+from hpt_converter.lib.schema.abstract.v1 import GeneralDataElements, PayerPlan
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    COMPACT_PAYER_PLAN_SCHEMA, REJECTED_ROW_SCHEMA, ROW_HASH_SCHEMA,
+    STANDARD_CHARGE_CODE_SCHEMA, PriceType, flatten_codes,
+    get_delta_schema, get_standard_charge_schema, to_compact_standard_charges,
+    to_price_type)
+from hpt_converter.lib.delta import (ROW_HASH_FILE_NAME, ChangeType,
+                                    RowHashDelta,
+                                    hash_standard_charges, read_row_hashes)
+from hpt_converter.lib.index import INDEX_FILE_NAME, build_index
+from hpt_converter.lib.memory import PYTHON_OBJECT_FACTOR, MemoryBudget
+from hpt_converter.lib.metrics import (PeakMemory, PipelineStageMetrics,
+                                      ProgressCallback, StageMetrics)
+from hpt_converter.lib.pipeline import Pipeline
+from hpt_converter.lib.writer import (DEFAULT_ROW_GROUP_SIZE, OutputFormat,
+                                     OutputSink, PartitionedWriter,
+                                     RowGroupWriter)
+
+STANDARD_CHARGE_WRITER_SHARE = 0.75     # share of the writer budget of `max_memory` for standard charges
+MIN_ROWS_FOR_ERROR_RATIO = 10000    # input rows read before `max_error_ratio` is checked during conversion
+# transforms a raw block read by an engine into (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans,
+# number of input rows).
+BlockTransform = Callable[[Any], Tuple[pa.Table, List[PayerPlan], int]]
+
+
+def get_path_size(path: str) -> int:
+    """Returns the size of a file, or the total size of the files in a folder, or 0 if the path doesn't exist."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, file_name))
+                   for root, _, file_names in os.walk(path) for file_name in file_names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+@dataclass
+class FileMetaData:
+    """Counts of a conversion. Measurements, which differ from run to run, are excluded from comparison.
+    `stages` maps 'read', 'validate', 'transform' and 'write'(and 'merge' of parallel conversion) to their metrics.
+    Stages of worker processes are summed, so their wall time may exceed `elapsed_seconds`.
+    `pipeline` maps 'read', 'transform' and 'write' to the utilization and queue depth of the threads of a pipelined
+    conversion, and is empty otherwise.
+    `peak_memory_bytes` is the peak resident set size of the process during the conversion(see `PeakMemory`), and of
+    the largest worker process of a parallel conversion, whose byte ranges are measured one by one.
+    """
+    input_row_count: int = 0
+    standard_charge_count: int = 0
+    plan_count: int = 0
+    rejected_row_count: int = 0
+    added_count: int = 0
+    changed_count: int = 0
+    removed_count: int = 0
+    input_bytes: int = field(default=0, compare=False)
+    output_bytes: int = field(default=0, compare=False)
+    elapsed_seconds: float = field(default=0.0, compare=False)
+    cpu_seconds: float = field(default=0.0, compare=False)
+    peak_memory_bytes: int = field(default=0, compare=False)
+    peak_buffered_bytes: int = field(default=0, compare=False)
+    output_sink: str = field(default='', compare=False)
+    rows_per_second: float = field(default=0.0, compare=False)
+    stages: Dict[str, StageMetrics] = field(default_factory=dict, compare=False)
+    pipeline: Dict[str, PipelineStageMetrics] = field(default_factory=dict, compare=False)
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> 'FileMetaData':
+        """Creates an instance from the output of `dataclasses.asdict`."""
+        stages = {name: StageMetrics(**stage) for name, stage in (values.get('stages') or {}).items()}
+        pipeline = {name: PipelineStageMetrics(**stage) for name, stage in (values.get('pipeline') or {}).items()}
+        return cls(**{**values, 'stages': stages, 'pipeline': pipeline})
+
+    def stage(self, name: str) -> StageMetrics:
+        return self.stages.setdefault(name, StageMetrics())
+
+    def merge(self, other: 'FileMetaData'):
+        """Adds the time and stages of a conversion done by another process, e.g. of a byte range."""
+        self.cpu_seconds += other.cpu_seconds
+        self.peak_memory_bytes = max(self.peak_memory_bytes, other.peak_memory_bytes)
+        self.peak_buffered_bytes = max(self.peak_buffered_bytes, other.peak_buffered_bytes)
+        for name, stage in other.stages.items():
+            self.stage(name).add(stage)
+        for name, stage in other.pipeline.items():
+            self.pipeline.setdefault(name, PipelineStageMetrics()).add(stage)
+
+
+class Converter:
+    """Base class of converters that write the abstract schema of an HPT file into 3 parquet files.
+    If `compact` is True, low-cardinality columns are dictionary encoded and standard charges refer to payer plans
+    by int32 `plan_key` instead of `plan_id`(see `COMPACT_STANDARD_CHARGE_SCHEMA`).
+    `price_type` selects decimal128(16, 2), float64 or int64 cents price columns.
+    If `write_codes` is True, codes are also written to standard_charge_codes.parquet, one row per code.
+    `progress` is called with (bytes read, total bytes of input, input rows converted) after each block.
+    If `lenient` is True, invalid rows are written to rejected_rows.parquet(see `REJECTED_ROW_SCHEMA`) instead of
+    aborting the conversion, unless more than `max_errors` rows or `max_error_ratio` of input rows are rejected.
+    If `partition_by` is given, standard charges are written to a hive partitioned dataset in the standard_charges folder
+    instead(see `PartitionedWriter`). `sort_by` sorts the rows of each row group, and `write_page_index` writes
+    page-level statistics, of standard charge files.
+    If `previous_dir_path`, the output folder of the previous version of the file, is given, only standard charges that
+    are added, changed or removed since that version are written, to standard_charges_delta.parquet(see `RowHashDelta`).
+    Row hashes are written to standard_charge_hashes.parquet in delta mode or if `write_row_hashes` is True, so that
+    the output can be the previous version of the next delta conversion.
+    If `pipeline_depth` is given, blocks are read, transformed and written on 3 threads connected by queues of that
+    many blocks(see `Pipeline`), instead of one after another.
+    If `max_memory` is given, blocks and row groups are sized to keep the data buffered by the conversion within that
+    many bytes(see `MemoryBudget`), and `peak_buffered_bytes` of the metadata reports the largest amount buffered.
+    If `write_index` is True, the index of codes, descriptions and plan ids used by `hpt_converter.query` is written to
+    standard_charge_index.parquet after the other files(see `build_index`).
+    `sink` selects the format and compression of standard charges, codes, general data elements and payer plans
+    (see `OutputSink`), e.g. Parquet with ZSTD at a chosen level, or Arrow IPC files, which are named with its suffix.
+    Row hashes, rejected rows and the index are always Parquet. `output_sink` of the metadata describes the sink, and
+    the `write` stage its bytes and time.
+    """
+    def __init__(self, out_dir_path, row_group_size: int = DEFAULT_ROW_GROUP_SIZE, compact: bool = False,
+                 price_type: PriceType = PriceType.DECIMAL, write_codes: bool = False,
+                 progress: Optional[ProgressCallback] = None, lenient: bool = False,
+                 max_errors: Optional[int] = None, max_error_ratio: Optional[float] = None,
+                 partition_by: Optional[List[str]] = None, sort_by: Optional[List[str]] = None,
+                 write_page_index: bool = False, previous_dir_path: Optional[str] = None,
+                 write_row_hashes: bool = False, pipeline_depth: Optional[int] = None,
+                 max_memory: Optional[int] = None, write_index: bool = False, sink: Optional[OutputSink] = None):
+        self.out_dir_path = out_dir_path
+        self.row_group_size = row_group_size
+        self.compact = compact
+        self.price_type = PriceType(price_type)
+        self.write_codes = write_codes
+        self.partition_by = list(partition_by or [])
+        self.sort_by = list(sort_by or [])
+        self.write_page_index = write_page_index
+        schema = self.standard_charge_schema
+        for name in self.partition_by + self.sort_by:
+            if name not in schema.names or pa.types.is_list(schema.field(name).type):
+                raise ValueError(f"Invalid standard charge column to partition or sort by: {name}")
+        if self.partition_by and write_codes:
+            raise ValueError("Codes can't be written with partitioned standard charges, whose row numbers are not stable")
+        if previous_dir_path and (self.partition_by or write_codes):
+            raise ValueError("Delta conversion can't write codes or partitioned standard charges")
+        if write_index and (self.partition_by or previous_dir_path):
+            raise ValueError("Only standard charges in a single file can be indexed, not partitioned or delta")
+        self.sink = sink or OutputSink()
+        if self.sink.format != OutputFormat.PARQUET and (write_index or write_page_index):
+            raise ValueError(f"Only parquet standard charges can be indexed or have a page index, not {self.sink.format.value}")
+        self.write_index = write_index
+        self.previous_dir_path = previous_dir_path
+        self.write_row_hashes = write_row_hashes or bool(previous_dir_path)
+        if pipeline_depth is not None and pipeline_depth <= 0:
+            raise ValueError(f"Invalid pipeline depth: {pipeline_depth}")
+        self.pipeline_depth = pipeline_depth
+        # blocks queued between and held by the stages of a pipeline, or being built and written.
+        blocks_in_flight = 2 * pipeline_depth + 3 if pipeline_depth else 2
+        self.max_memory = max_memory
+        self.memory_budget = MemoryBudget(max_memory, blocks_in_flight) if max_memory else None
+        self.plan_ids = pa.array([], pa.string())
+        self.progress = progress
+        self.lenient = lenient
+        self.max_errors = max_errors
+        self.max_error_ratio = max_error_ratio
+        # a converter without output folder only converts in memory(see `Csv2Parquet.iter_batches`).
+        self.rejected_rows_file_path = os.path.join(out_dir_path, 'rejected_rows.parquet') if out_dir_path else None
+        self.rejected_rows: List[Dict[str, Any]] = []  # rejected rows not written yet
+        self.meta_data: FileMetaData = FileMetaData(output_sink=str(self.sink))
+        self.input_size = 0     # total bytes of input, set by subclasses
+        self.bytes_read = 0     # bytes of input read so far, updated by subclasses
+        self.output_paths: List[str] = []
+        self.logger = getLogger(self.__class__.__module__)
+
+    def output_file_path(self, name: str) -> str:
+        """Returns the path to an output file, named with the suffix of the sink, e.g. standard_charges.arrow."""
+        return os.path.join(self.out_dir_path, name + self.sink.suffix)
+
+    def reject_row(self, line_number: Optional[int], raw_values: Optional[Dict[str, Any]], error: str):
+        """Records a row rejected by lenient conversion. It is written to rejected_rows.parquet after the current block.
+
+        Args:
+            line_number (int): line number of the row, or None if it is unknown.
+            raw_values (dict): raw values of the row keyed by header field, or None if the row couldn't be parsed.
+            error (str): error message.
+        Raises:
+            ValueError: If more rows than `max_errors` are rejected.
+        """
+        self.logger.debug(f"Rejected line {line_number}: {error}")
+        if raw_values is not None:
+            raw_values = [(str(key), value if value is None or isinstance(value, str) else str(value))
+                          for key, value in raw_values.items()]
+        self.rejected_rows.append({'line_number': line_number, 'raw_values': raw_values, 'error': error})
+        self.meta_data.rejected_row_count += 1
+        if self.max_errors is not None and self.meta_data.rejected_row_count > self.max_errors:
+            raise ValueError(f"Rejected more than max_errors({self.max_errors}) rows, "
+                             f"the last at line {line_number}: {error}")
+
+    def check_error_ratio(self, final: bool = False):
+        """Raises ValueError if more than `max_error_ratio` of input rows are rejected. Until the end of input,
+        it is checked only after `MIN_ROWS_FOR_ERROR_RATIO` rows, so that a few errors at the start don't abort."""
+        rejected, total = self.meta_data.rejected_row_count, self.meta_data.input_row_count
+        if self.max_error_ratio is None or not total or not (final or total >= MIN_ROWS_FOR_ERROR_RATIO):
+            return
+        if rejected > self.max_error_ratio * total:
+            raise ValueError(f"Rejected {rejected} of {total} rows, more than max_error_ratio({self.max_error_ratio})")
+
+    def _write_rejected_rows(self, writer: RowGroupWriter, rejected_rows: Optional[List[Dict[str, Any]]] = None):
+        if rejected_rows is None:
+            rejected_rows, self.rejected_rows = self.rejected_rows, []
+        if rejected_rows:
+            writer.write(pa.Table.from_pylist(rejected_rows, schema=REJECTED_ROW_SCHEMA))
+
+    def _with_rejected_rows(self, blocks: Iterator[Tuple[pa.Table, List[PayerPlan], int]]) -> Iterator[Tuple]:
+        """Pairs each block with the rows rejected while reading it, so that they are written with the block
+        even if the next block is being read on another thread."""
+        for block in blocks:
+            rejected_rows, self.rejected_rows = self.rejected_rows, []
+            yield block, rejected_rows
+
+    def report_progress(self):
+        if self.progress:
+            self.progress(self.bytes_read, self.input_size, self.meta_data.input_row_count)
+
+    def block_rows(self, default: int, factor: float = PYTHON_OBJECT_FACTOR, input_rows: bool = True) -> int:
+        """Returns the number of rows of the next block, adapted to `max_memory` if it is given
+        (see `MemoryBudget.block_rows`)."""
+        return self.memory_budget.block_rows(default, factor, input_rows) if self.memory_budget else default
+
+    def csv_block_size(self, default: int) -> int:
+        """Returns the bytes of CSV parsed into each record batch, adapted to `max_memory` if it is given."""
+        return self.memory_budget.csv_block_size(default) if self.memory_budget else default
+
+    def _max_buffer_bytes(self, share: float) -> Optional[int]:
+        return int(self.memory_budget.writer_bytes * share) if self.memory_budget else None
+
+    @contextmanager
+    def measure(self) -> Iterator[FileMetaData]:
+        """Measures a conversion: elapsed and CPU time, peak memory, throughput and bytes of input and output."""
+        started, cpu_started = time.perf_counter(), time.process_time()
+        with PeakMemory() as peak_memory:
+            yield self.meta_data
+        meta_data = self.meta_data
+        meta_data.elapsed_seconds = time.perf_counter() - started
+        meta_data.cpu_seconds += time.process_time() - cpu_started
+        meta_data.peak_memory_bytes = max(meta_data.peak_memory_bytes, peak_memory.peak_bytes)
+        if self.memory_budget:
+            meta_data.peak_buffered_bytes = max(meta_data.peak_buffered_bytes, self.memory_budget.peak_buffered_bytes)
+            if meta_data.peak_memory_bytes > self.max_memory:
+                self.logger.warning(f"Peak memory({meta_data.peak_memory_bytes} bytes) of the process during the "
+                                    f"conversion exceeded max_memory({self.max_memory} bytes)")
+        meta_data.rows_per_second = (meta_data.input_row_count / meta_data.elapsed_seconds
+                                     if meta_data.elapsed_seconds else 0.0)
+        meta_data.input_bytes = self.bytes_read
+        meta_data.output_bytes = sum(get_path_size(path) for path in self.output_paths)
+        read_stage = meta_data.stage('read')
+        read_stage.bytes, read_stage.rows = self.bytes_read, meta_data.input_row_count
+        meta_data.stage('write').bytes = meta_data.output_bytes
+
+    def add_payer_plan(self, payer_plans_map: Dict[str, PayerPlan], payer_plan: PayerPlan):
+        if payer_plan.plan_id not in payer_plans_map:
+            payer_plans_map[payer_plan.plan_id] = payer_plan
+            self.meta_data.plan_count += 1
+
+    @property
+    def standard_charge_schema(self) -> pa.Schema:
+        return get_standard_charge_schema(self.compact, self.price_type)
+
+    def to_output_table(self, table: pa.Table, payer_plans_map: Dict[str, PayerPlan]) -> pa.Table:
+        """Converts standard charges in `STANDARD_CHARGE_SCHEMA` to the output schema.
+
+        Args:
+            table (pa.Table): standard charges.
+            payer_plans_map (dict): payer plans found so far, including the payer plans of the table.
+        Returns:
+            pa.Table: standard charges in `standard_charge_schema`.
+        """
+        if self.compact:
+            if len(self.plan_ids) != len(payer_plans_map):
+                self.plan_ids = pa.array(list(payer_plans_map), pa.string())
+            table = to_compact_standard_charges(table, self.plan_ids)
+        return to_price_type(table, self.price_type)
+
+    def _to_delta_table(self, output_table: pa.Table, hashes: pa.Table, changes: pa.Array) -> pa.Table:
+        """Returns the added and changed rows of standard charges in the output schema with their change and hashes."""
+        mask = changes.is_valid()
+        return pa.Table.from_arrays([changes.filter(mask), *hashes.filter(mask).columns, *output_table.filter(mask).columns],
+                                    schema=get_delta_schema(self.standard_charge_schema))
+
+    def _to_removed_table(self, removed: pa.Table) -> pa.Table:
+        arrays = [pa.array([ChangeType.REMOVED.value] * removed.num_rows, pa.string()), *removed.columns]
+        arrays += [pa.nulls(removed.num_rows, field.type) for field in self.standard_charge_schema]
+        return pa.Table.from_arrays(arrays, schema=get_delta_schema(self.standard_charge_schema))
+
+    def write_standard_charges(self, blocks: Iterable, sc_file_path: str,
+                               transform: Optional[BlockTransform] = None) -> Dict[str, PayerPlan]:
+        """Streams blocks of standard charges into a single file of the sink, one row group at a time, or into a
+        partitioned dataset in the folder of the same name without extension if `partition_by` is given.
+        If `write_codes` is True, their codes are streamed into standard_charge_codes in the same folder.
+        In delta mode, only the changes are written, to standard_charges_delta in the same folder.
+        If `transform` is given, blocks are raw blocks of an engine, e.g. parsed rows, which are validated and
+        transformed by it in the transform stage of a pipelined conversion, while the read stage only parses.
+
+        Args:
+            blocks (Iterable): tuples of (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans, number of input rows),
+                or raw blocks of `transform`.
+            sc_file_path (str): path to the standard charge file.
+            transform (BlockTransform): function of a raw block to a tuple of `blocks`.
+        Returns:
+            dict: payer plans found in the file, keyed by plan id.
+        """
+        payer_plans_map = {}
+        transform_stage, write_stage = self.meta_data.stage('transform'), self.meta_data.stage('write')
+        codes_file_path = os.path.join(os.path.dirname(sc_file_path), 'standard_charge_codes' + self.sink.suffix)
+        hashes_file_path = os.path.join(os.path.dirname(sc_file_path), ROW_HASH_FILE_NAME)
+        delta = None
+        if self.previous_dir_path:
+            with self.meta_data.stage('read'):
+                delta = RowHashDelta(read_row_hashes(self.previous_dir_path))
+            sc_file_path = os.path.join(os.path.dirname(sc_file_path), 'standard_charges_delta' + self.sink.suffix)
+            sc_writer = RowGroupWriter(sc_file_path, get_delta_schema(self.standard_charge_schema),
+                                       row_group_size=self.row_group_size, sink=self.sink, sort_by=self.sort_by,
+                                       write_page_index=self.write_page_index,
+                                       max_buffer_bytes=self._max_buffer_bytes(STANDARD_CHARGE_WRITER_SHARE))
+        elif self.partition_by:
+            sc_file_path = os.path.splitext(sc_file_path)[0]
+            sc_writer = PartitionedWriter(sc_file_path, self.standard_charge_schema, self.partition_by,
+                                          row_group_size=self.row_group_size, sink=self.sink, sort_by=self.sort_by,
+                                          write_page_index=self.write_page_index,
+                                          max_buffer_bytes=self._max_buffer_bytes(STANDARD_CHARGE_WRITER_SHARE))
+        else:
+            sc_writer = RowGroupWriter(sc_file_path, self.standard_charge_schema, row_group_size=self.row_group_size,
+                                       sink=self.sink, sort_by=self.sort_by, write_page_index=self.write_page_index,
+                                       max_buffer_bytes=self._max_buffer_bytes(STANDARD_CHARGE_WRITER_SHARE))
+        # codes, hashes and rejected rows share the rest of the writer budget.
+        aux_buffer_bytes = self._max_buffer_bytes((1 - STANDARD_CHARGE_WRITER_SHARE) / 3)
+        with ExitStack() as stack:
+            writer = stack.enter_context(sc_writer)
+            codes_writer = stack.enter_context(RowGroupWriter(
+                codes_file_path, STANDARD_CHARGE_CODE_SCHEMA, row_group_size=self.row_group_size, sink=self.sink,
+                max_buffer_bytes=aux_buffer_bytes)) if self.write_codes else None
+            rejects_writer = stack.enter_context(RowGroupWriter(
+                self.rejected_rows_file_path, REJECTED_ROW_SCHEMA, row_group_size=self.row_group_size,
+                max_buffer_bytes=aux_buffer_bytes)) if self.lenient else None
+            hashes_writer = stack.enter_context(RowGroupWriter(
+                hashes_file_path, ROW_HASH_SCHEMA, row_group_size=self.row_group_size,
+                max_buffer_bytes=aux_buffer_bytes)) if self.write_row_hashes else None
+            row_count = 0
+
+            def prepare(item: Any) -> Tuple:
+                nonlocal row_count
+                if transform:
+                    # rows are rejected by the transform, on the thread of this stage.
+                    table, payer_plans, input_row_count = transform(item)
+                    rejected_rows, self.rejected_rows = self.rejected_rows, []
+                else:
+                    (table, payer_plans, input_row_count), rejected_rows = item
+                self.meta_data.input_row_count += input_row_count
+                self.meta_data.standard_charge_count += table.num_rows
+                for payer_plan in payer_plans:
+                    self.add_payer_plan(payer_plans_map, payer_plan)
+                if self.memory_budget:
+                    self.memory_budget.observe(table, input_row_count)
+                with transform_stage:
+                    codes = flatten_codes(table['codes'], row_count) if codes_writer else None
+                    output_table = self.to_output_table(table, payer_plans_map)
+                    hashes = hash_standard_charges(table) if hashes_writer else None
+                    if delta:
+                        output_table = self._to_delta_table(output_table, hashes, delta.compare(hashes))
+                row_count += table.num_rows
+                return output_table, codes, hashes, rejected_rows, table.num_rows
+
+            def write(prepared: Tuple):
+                output_table, codes, hashes, rejected_rows, num_rows = prepared
+                with write_stage:
+                    if codes_writer:
+                        codes_writer.write(codes)
+                    if hashes_writer:
+                        hashes_writer.write(hashes)
+                    writer.write(output_table)
+                write_stage.rows += num_rows
+                if self.memory_budget:
+                    self.memory_budget.add_buffered_bytes(output_table.nbytes + sum(
+                        buffer_writer.buffered_bytes for buffer_writer in (writer, codes_writer, hashes_writer, rejects_writer)
+                        if buffer_writer))
+                if rejects_writer:
+                    self._write_rejected_rows(rejects_writer, rejected_rows)
+                    self.check_error_ratio()
+                self.report_progress()
+
+            source = blocks if transform else self._with_rejected_rows(blocks)
+            if self.pipeline_depth:
+                pipeline = Pipeline(source, [('transform', prepare)], depth=self.pipeline_depth)
+                for prepared in pipeline:
+                    write(prepared)
+                for name, stage in pipeline.metrics.items():
+                    self.meta_data.pipeline.setdefault(name, PipelineStageMetrics()).add(stage)
+            else:
+                for item in source:
+                    write(prepare(item))
+            if rejects_writer:
+                self._write_rejected_rows(rejects_writer)
+                self.check_error_ratio(final=True)
+            if delta:
+                with transform_stage:
+                    removed = delta.removed()
+                with write_stage:
+                    writer.write(self._to_removed_table(removed))
+                self.meta_data.added_count += delta.added_count
+                self.meta_data.changed_count += delta.changed_count
+                self.meta_data.removed_count += delta.removed_count
+            with write_stage:
+                stack.close()
+        self.output_paths += [sc_file_path, codes_file_path] if self.write_codes else [sc_file_path]
+        if self.write_row_hashes:
+            self.output_paths.append(hashes_file_path)
+        if delta:
+            self.logger.info(f"Delta since {self.previous_dir_path}: {delta.added_count} added, "
+                             f"{delta.changed_count} changed, {delta.removed_count} removed")
+        if self.lenient:
+            self.output_paths.append(self.rejected_rows_file_path)
+            if self.meta_data.rejected_row_count:
+                self.logger.warning(f"Rejected {self.meta_data.rejected_row_count} rows, "
+                                    f"written to {self.rejected_rows_file_path}")
+        return payer_plans_map
+
+    def write_standard_charge_index(self):
+        """Writes the index of standard_charges.parquet, which reads payer_plans.parquet if it is compact."""
+        with self.meta_data.stage('write'):
+            build_index(self.out_dir_path)
+        self.output_paths.append(os.path.join(self.out_dir_path, INDEX_FILE_NAME))
+
+    def write_general_data_elements(self, general_data_elements: GeneralDataElements):
+        file_path = self.output_file_path('general_data_elements')
+        with self.meta_data.stage('write'):
+            self.sink.write_table(pa.Table.from_pylist([general_data_elements.model_dump()]), file_path)
+        self.output_paths.append(file_path)
+
+    def write_payer_plans(self, payer_plans_map: Dict[str, PayerPlan]):
+        if self.compact:
+            table = pa.Table.from_pylist([{'plan_key': plan_key, **pp.model_dump()}
+                                          for plan_key, pp in enumerate(payer_plans_map.values())],
+                                         schema=COMPACT_PAYER_PLAN_SCHEMA)
+        else:
+            table = pa.Table.from_pylist([pp.model_dump() for pp in payer_plans_map.values()])
+        file_path = self.output_file_path('payer_plans')
+        with self.meta_data.stage('write'):
+            self.sink.write_table(table, file_path)
+        self.output_paths.append(file_path)
@@ -0,0 +1,288 @@
+import argparse
+import glob
+import os
+import sys
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    PRICE_TYPE, STANDARD_CHARGE_SCHEMA, from_compact_standard_charges)
+from hpt_converter.lib.writer import DEFAULT_ROW_GROUP_SIZE, RowGroupWriter
+
+logger = getLogger(__name__)
+
+DEFAULT_ROWS_PER_FILE = 16 * DEFAULT_ROW_GROUP_SIZE
+STANDARD_CHARGE_DIR_NAME = 'standard_charges'
+SOURCES_FILE_NAME = 'sources.parquet'
+PAYER_PLAN_COLUMNS = ['plan_id', 'payer_name', 'plan_name']
+# output folders merged into a corpus, with the range of part files their standard charges were written to, which is
+# -1 for a folder without standard charges.
+CORPUS_SOURCE_SCHEMA = pa.schema([pa.field('output_path', pa.string()),
+                                  pa.field('file_id', pa.string()),
+                                  pa.field('standard_charge_count', pa.int64()),
+                                  pa.field('first_part', pa.int32()),
+                                  pa.field('last_part', pa.int32()),
+                                  pa.field('merged_at', pa.string())])
+
+
+@dataclass
+class CorpusResult:
+    merged_count: int = 0           # output folders merged in this run
+    skipped_count: int = 0          # output folders whose file_id is already in the corpus
+    failed_count: int = 0           # output folders that failed to merge, left out of the corpus
+    standard_charge_count: int = 0  # standard charges appended in this run
+    plan_count: int = 0             # payer plans of the corpus
+    file_count: int = 0             # general data elements of the corpus, one per file_id
+    part_count: int = 0             # standard charge files of the corpus
+
+
+def find_output_folders(paths: List[str]) -> List[str]:
+    """Returns the conversion output folders, which have standard_charges.parquet, under each path or glob pattern
+    in sorted order. Folders in a corpus are skipped."""
+    folders = set()
+    for pattern in paths:
+        for path in glob.glob(pattern) if glob.has_magic(pattern) else [pattern]:
+            for root, dir_names, file_names in os.walk(path):
+                if SOURCES_FILE_NAME in file_names:
+                    dir_names.clear()
+                elif 'standard_charges.parquet' in file_names:
+                    folders.add(os.path.abspath(root))
+    return sorted(folders)
+
+
+def _drop_duplicates(table: pa.Table, key: str) -> pa.Table:
+    """Keeps the first row of each value of the key column."""
+    if table.num_rows == 0:
+        return table
+    _, first = np.unique(table[key].to_numpy(zero_copy_only=False), return_index=True)
+    return table.take(pa.array(np.sort(first)))
+
+
+def _write_table(table: pa.Table, file_path: str):
+    """Writes a table to a temporary file first, so that a failure doesn't leave a partial file."""
+    pq.write_table(table, file_path + '.tmp', compression='SNAPPY')
+    os.replace(file_path + '.tmp', file_path)
+
+
+class CorpusWriter:
+    """Merges conversion outputs into a corpus folder: a payer_plans.parquet dimension deduplicated by plan id,
+    general_data_elements.parquet with one row per file id, and standard charges rewritten in the default layout
+    into `standard_charges/part-<n>.parquet` files of `rows_per_file` rows, so that queries read a few footers instead
+    of one per hospital. Standard charges are streamed one row group at a time, so memory is bounded by a row group.
+    A corpus is appended to incrementally: output folders whose file id is already in `sources.parquet` are skipped,
+    and part files and general data elements that are not recorded there, left by a failed run, are removed. Each run
+    starts a new part file, and so does the merge after a failed one, whose standard charges are removed.
+
+    Args:
+        corpus_dir_path (str): corpus folder, created if it doesn't exist.
+        rows_per_file (int): number of standard charges per part file.
+        row_group_size (int): number of rows per row group of part files.
+    """
+    def __init__(self, corpus_dir_path: str, rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        if rows_per_file < row_group_size:
+            raise ValueError(f"rows_per_file({rows_per_file}) is less than row_group_size({row_group_size})")
+        self.corpus_dir_path = corpus_dir_path
+        self.rows_per_file = rows_per_file
+        self.row_group_size = row_group_size
+        self.part_dir_path = os.path.join(corpus_dir_path, STANDARD_CHARGE_DIR_NAME)
+        os.makedirs(self.part_dir_path, exist_ok=True)
+        self.sources = self._read(SOURCES_FILE_NAME, CORPUS_SOURCE_SCHEMA)
+        self.payer_plans = self._read('payer_plans.parquet')
+        self.general_data_elements = self._read('general_data_elements.parquet')
+        if self.general_data_elements is not None:
+            # a run that failed after writing the dimensions left general data elements of files it didn't record.
+            self.general_data_elements = self.general_data_elements.filter(
+                pc.is_in(self.general_data_elements['file_id'], value_set=self.sources['file_id'].combine_chunks()))
+        self.part_count = max(self.sources['last_part'].to_pylist(), default=-1) + 1
+        self._remove_orphan_parts()
+        self.writer: Optional[RowGroupWriter] = None
+
+    def _read(self, file_name: str, schema: Optional[pa.Schema] = None) -> Optional[pa.Table]:
+        file_path = os.path.join(self.corpus_dir_path, file_name)
+        if os.path.exists(file_path):
+            return pq.read_table(file_path)
+        return schema.empty_table() if schema else None
+
+    def _part_path(self, part: int) -> str:
+        return os.path.join(self.part_dir_path, f'part-{part:05d}.parquet')
+
+    def _remove_orphan_parts(self):
+        recorded = {os.path.basename(self._part_path(part)) for part in range(self.part_count)}
+        for file_name in os.listdir(self.part_dir_path):
+            if file_name not in recorded:
+                logger.warning(f"Removing part file not recorded in the corpus: {file_name}")
+                os.remove(os.path.join(self.part_dir_path, file_name))
+
+    def _write_standard_charges(self, table: pa.Table):
+        """Writes standard charges to the current part file, starting a new one when it is full."""
+        offset = 0
+        while offset < table.num_rows:
+            if self.writer is None:
+                self.writer = RowGroupWriter(self._part_path(self.part_count), STANDARD_CHARGE_SCHEMA,
+                                             row_group_size=self.row_group_size)
+                self.part_count += 1
+            size = min(table.num_rows - offset, self.rows_per_file - self.writer.row_count)
+            self.writer.write(table.slice(offset, size))
+            offset += size
+            if self.writer.row_count >= self.rows_per_file:
+                self.writer.close()
+                self.writer = None
+
+    def _truncate(self, part: int, row_count: int):
+        """Removes the standard charges written after the first `row_count` rows of a part file, and the part files
+        after it. The next standard charges are written to a new part file."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        for later_part in range(part + 1, self.part_count):
+            os.remove(self._part_path(later_part))
+        part_path = self._part_path(part)
+        if not row_count:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            self.part_count = part
+            return
+        with RowGroupWriter(part_path + '.tmp', STANDARD_CHARGE_SCHEMA, row_group_size=self.row_group_size) as writer:
+            for batch in pq.ParquetFile(part_path).iter_batches(batch_size=self.row_group_size):
+                writer.write(pa.Table.from_batches([batch]).slice(0, row_count - writer.row_count))
+                if writer.row_count >= row_count:
+                    break
+        os.replace(part_path + '.tmp', part_path)
+        self.part_count = part + 1
+
+    @staticmethod
+    def _read_payer_plans(output_path: str) -> pa.Table:
+        payer_plans = pq.read_table(os.path.join(output_path, 'payer_plans.parquet'))
+        return pa.Table.from_arrays([payer_plans[name].cast(pa.string()) for name in PAYER_PLAN_COLUMNS],
+                                    names=PAYER_PLAN_COLUMNS)
+
+    def merge(self, output_path: str) -> int:
+        """Appends the output of a conversion to the corpus. If it fails, the standard charges written so far are
+        removed, and the corpus is left as it was.
+
+        Args:
+            output_path (str): output folder of a conversion in the default or compact layout with decimal prices.
+        Returns:
+            int: number of standard charges appended, or -1 if the file id is already in the corpus.
+        Raises:
+            ValueError: If the prices are not decimal.
+            OSError: If a file of the output folder is missing or corrupt.
+        """
+        general_data_elements = pq.read_table(os.path.join(output_path, 'general_data_elements.parquet'))
+        file_id = general_data_elements['file_id'][0].as_py()
+        if file_id in self.sources['file_id'].to_pylist():
+            logger.info(f"Skipping {output_path}, file {file_id} is already in the corpus")
+            return -1
+        parquet_file = pq.ParquetFile(os.path.join(output_path, 'standard_charges.parquet'))
+        schema = parquet_file.schema_arrow
+        if any(schema.field(name).type != PRICE_TYPE for name in ('gross_charge', 'negotiated_dollar')):
+            raise ValueError(f"Standard charges with prices other than {PRICE_TYPE} can't be merged: {output_path}")
+        payer_plans = self._read_payer_plans(output_path)
+        plan_ids = payer_plans['plan_id'].combine_chunks()
+        first_part = self.part_count - 1 if self.writer is not None else self.part_count
+        first_part_row_count = self.writer.row_count if self.writer is not None else 0
+        count = 0
+        try:
+            for batch in parquet_file.iter_batches(batch_size=self.row_group_size):
+                table = pa.Table.from_batches([batch])
+                if 'plan_key' in table.column_names:
+                    table = from_compact_standard_charges(table, plan_ids)
+                self._write_standard_charges(table.select(STANDARD_CHARGE_SCHEMA.names).cast(STANDARD_CHARGE_SCHEMA))
+                count += table.num_rows
+        except Exception:
+            self._truncate(first_part, first_part_row_count)
+            raise
+        self.payer_plans = _drop_duplicates(pa.concat_tables(
+            [table for table in (self.payer_plans, payer_plans) if table is not None]), 'plan_id')
+        self.general_data_elements = pa.concat_tables(
+            [table for table in (self.general_data_elements, general_data_elements) if table is not None],
+            promote_options='permissive')
+        if not count:
+            first_part = -1
+        source = {'output_path': os.path.abspath(output_path), 'file_id': file_id, 'standard_charge_count': count,
+                  'first_part': first_part, 'last_part': self.part_count - 1 if count else -1,
+                  'merged_at': datetime.now(timezone.utc).isoformat()}
+        self.sources = pa.concat_tables([self.sources, pa.Table.from_pylist([source], schema=CORPUS_SOURCE_SCHEMA)])
+        return count
+
+    def close(self):
+        """Closes the current part file and writes the dimensions, then the sources that record the part files.
+        General data elements of files that are not recorded, left if the run fails in between, are removed when the
+        corpus is opened again."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.payer_plans is not None:
+            _write_table(self.payer_plans, os.path.join(self.corpus_dir_path, 'payer_plans.parquet'))
+        if self.general_data_elements is not None:
+            _write_table(self.general_data_elements, os.path.join(self.corpus_dir_path, 'general_data_elements.parquet'))
+        _write_table(self.sources, os.path.join(self.corpus_dir_path, SOURCES_FILE_NAME))
+
+
+def compact_corpus(paths: List[str], corpus_dir_path: str, rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+                   row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> CorpusResult:
+    """Merges conversion outputs into a corpus folder, appending to it if it exists(see `CorpusWriter`).
+
+    Args:
+        paths (List[str]): output folders of conversions, folders or glob patterns to search for them, e.g. the output
+            folder of `hpt_converter.batch`.
+        corpus_dir_path (str): corpus folder.
+        rows_per_file (int): number of standard charges per part file.
+        row_group_size (int): number of rows per row group of part files.
+    Returns:
+        CorpusResult: counts of the run and of the corpus. An output folder that fails to merge, e.g. with float
+            prices or a missing payer_plans.parquet, is logged and counted as failed, and the others are merged.
+    """
+    output_paths = find_output_folders(paths)
+    logger.info(f"Merging {len(output_paths)} output folders into {corpus_dir_path}")
+    writer = CorpusWriter(corpus_dir_path, rows_per_file, row_group_size)
+    result = CorpusResult()
+    # sources are recorded when the writer is closed, so a failed run leaves only unrecorded part files, which are
+    # removed by the next run.
+    for output_path in output_paths:
+        try:
+            count = writer.merge(output_path)
+        except Exception as e:
+            logger.error(f"Failed to merge {output_path}: {type(e).__name__}: {e}")
+            result.failed_count += 1
+            continue
+        if count < 0:
+            result.skipped_count += 1
+        else:
+            result.merged_count += 1
+            result.standard_charge_count += count
+    writer.close()
+    result.plan_count = writer.payer_plans.num_rows if writer.payer_plans is not None else 0
+    result.file_count = writer.general_data_elements.num_rows if writer.general_data_elements is not None else 0
+    result.part_count = writer.part_count
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge conversion outputs into a corpus dataset.")
+
+    parser.add_argument("input", type=str, nargs='+',
+                        help="Output folders of conversions, or folders or glob patterns to search for them.")
+    parser.add_argument("--corpus-folder", type=str, required=True,
+                        help="Path to corpus folder. An existing corpus is appended to.")
+    parser.add_argument("--rows-per-file", type=int, default=DEFAULT_ROWS_PER_FILE,
+                        help=f"Number of standard charges per part file. Default is {DEFAULT_ROWS_PER_FILE}.")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Number of rows per row group of part files. Default is {DEFAULT_ROW_GROUP_SIZE}.")
+    args = parser.parse_args()
+
+    try:
+        result = compact_corpus(args.input, args.corpus_folder, args.rows_per_file, args.row_group_size)
+        print(f"Result: {asdict(result)}")
+        sys.exit(-1 if result.failed_count else 0)
+    except Exception as e:
+        print(f"Failed: {str(e)}")
+        sys.exit(-1)
@@ -1,41 +1,137 @@
 import csv
+import io
+import json
+import mmap
 import os
 import argparse
 import tempfile
-from dataclasses import dataclass, asdict
-from logging import getLogger
-from typing import List, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict
+from enum import StrEnum
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
 import sys
 import pyarrow as pa
-import pyarrow.dataset as ds
 import pyarrow.parquet as pq
 
-from hpt_converter.lib.csv.utils import (infer_csv_type,
-                                         read_general_data_elements)
+from hpt_converter.converter import BlockTransform, Converter, FileMetaData
+from hpt_converter.lib.checkpoint import (DEFAULT_CHECKPOINT_SIZE,
+                                          CheckpointStore)
+from hpt_converter.lib.compressed import (get_input_size, is_compressed,
+                                          open_input, skip_bytes)
+from hpt_converter.lib.csv.arrow_engine import (DEFAULT_BLOCK_SIZE,
+                                                ENUM_FIELDS, RowErrors,
+                                                StandardChargeTransformer,
+                                                create_codes_array,
+                                                create_standard_charge_table,
+                                                open_standard_charge_reader,
+                                                to_string_array,
+                                                unpivot_payer_plans,
+                                                validate_enum)
+from hpt_converter.lib.csv.profile import (DEFAULT_SAMPLE_SIZE,
+                                           DEFAULT_SAMPLES, inspect_csv)
+from hpt_converter.lib.csv.utils import (ByteRangeFile, CsvPrelude,
+                                         infer_csv_type, normalize_header_fields,
+                                         open_memory_map, read_prelude,
+                                         split_byte_ranges)
+from hpt_converter.lib.memory import parse_size
+from hpt_converter.lib.metrics import (ProgressBar, ProgressCallback,
+                                      iter_timed)
+from hpt_converter.lib.pipeline import DEFAULT_PIPELINE_DEPTH
 from hpt_converter.lib.schema.abstract.v1 import *
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    REJECTED_ROW_SCHEMA, STANDARD_CHARGE_SCHEMA, PriceType)
 from hpt_converter.lib.schema.csv import CsvType
-from hpt_converter.lib.schema.csv.v2.standard_charge import \
-    create_standard_charge_model
+from hpt_converter.lib.schema.csv.v2.standard_charge import (
+    MODEL_CACHE, StandardChargeModelCache, WidePayerPlanFields,
+    create_standard_charge_model, get_code_columns, get_payer_plan_columns)
+from hpt_converter.lib.writer import (DEFAULT_ROW_GROUP_SIZE, OUTPUT_CODECS,
+                                     OutputFormat, OutputSink, RowGroupWriter)
 
 
-@dataclass
-class FileMetaData:
-    input_row_count: int = 0
-    standard_charge_count: int = 0
-    plan_count: int = 0
+RAW_STANDARD_CHARGE_BLOCK_SIZE = 10000
+MIN_BYTE_RANGE_SIZE = 64 << 20  # smallest byte range converted by a worker process
+# standard charges of byte ranges are read back once by the merging process, so they are written to memory mapped
+# Arrow IPC files with a fast codec rather than to parquet.
+BYTE_RANGE_SINK = OutputSink(OutputFormat.ARROW, 'lz4')
 
 
-class Csv2Parquet:
-    def __init__(self, csv_file_path, out_dir_path,
-                 csv_type: CsvType = None):
+class Engine(StrEnum):
+    PYTHON = 'python'   # validates each row with the dynamic pydantic model.
+    ARROW = 'arrow'     # reads record batches with pyarrow and transforms them with compute kernels.
+
+
+class Csv2Parquet(Converter):
+    def __init__(self, csv_file_path, out_dir_path=None,
+                 csv_type: CsvType = None, engine: Engine = Engine.PYTHON,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE, workers: int = 1,
+                 model_cache: StandardChargeModelCache = None, compact: bool = False,
+                 price_type: PriceType = PriceType.DECIMAL, write_codes: bool = False,
+                 progress: Optional[ProgressCallback] = None, lenient: bool = False,
+                 max_errors: Optional[int] = None, max_error_ratio: Optional[float] = None,
+                 partition_by: Optional[List[str]] = None, sort_by: Optional[List[str]] = None,
+                 write_page_index: bool = False, previous_dir_path: Optional[str] = None,
+                 write_row_hashes: bool = False, memory_map: bool = False,
+                 prelude: Optional[CsvPrelude] = None, pipeline_depth: Optional[int] = None,
+                 max_memory: Optional[int] = None, write_index: bool = False, sink: Optional[OutputSink] = None,
+                 checkpoint_dir_path: Optional[str] = None, checkpoint_size: int = DEFAULT_CHECKPOINT_SIZE,
+                 resume: bool = False):
+        if checkpoint_dir_path and is_compressed(csv_file_path):
+            raise ValueError(f"Compressed input({csv_file_path}) can't be split into byte ranges to checkpoint")
+        if checkpoint_size <= 0:
+            raise ValueError(f"Invalid checkpoint size: {checkpoint_size}")
+        if max_memory and workers > 1 and not is_compressed(csv_file_path):
+            # the budget is shared evenly by the worker processes and the process merging their output. A single
+            # worker converts byte ranges in this process(see `iter_byte_range_blocks`), with the whole budget.
+            max_memory //= workers + 1
+        super().__init__(out_dir_path, row_group_size, compact, price_type, write_codes, progress,
+                         lenient, max_errors, max_error_ratio, partition_by, sort_by, write_page_index,
+                         previous_dir_path, write_row_hashes, pipeline_depth, max_memory,
+                         write_index, sink)
         self.csv_file_path = csv_file_path
-        self.out_dir_path = out_dir_path
-        self.csv_type = csv_type or infer_csv_type(csv_file_path)
-        self.meta_data: FileMetaData = FileMetaData()
-        self.logger = getLogger(__name__)
+        self.input_size = get_input_size(csv_file_path)
+        self.engine = Engine(engine)
+        if memory_map and self.engine != Engine.ARROW:
+            raise ValueError(f"memory_map requires the {Engine.ARROW} engine, "
+                             f"the {self.engine} engine reads the input as decoded text")
+        if memory_map and is_compressed(csv_file_path):
+            self.logger.warning(f"Compressed input({csv_file_path}) can't be memory mapped, reading it as a stream")
+        # the arrow engine parses record batches from zero-copy buffers of the mapping, which is open only while
+        # a conversion runs(see `open_mapping`).
+        self.memory_map = memory_map and not is_compressed(csv_file_path)
+        self.mapping: Optional[mmap.mmap] = None
+        self.prelude = prelude or read_prelude(csv_file_path)
+        self.csv_type = csv_type or self.prelude.csv_type
+        self.workers = workers
+        self.model_cache = model_cache or MODEL_CACHE
+        self.payer_plans_map: Dict[str, PayerPlan] = {}     # payer plans found by `iter_batches`
+        self.checkpoint_dir_path = checkpoint_dir_path
+        self.checkpoint_size = checkpoint_size
+        self.resume = resume
+        self.checkpoint: Optional[CheckpointStore] = None
+
+    @contextmanager
+    def open_mapping(self):
+        """Memory maps the input file while a conversion runs, if `memory_map` is set, and closes the mapping after."""
+        if not self.memory_map or self.mapping is not None:
+            yield
+            return
+        self.mapping = open_memory_map(self.csv_file_path)
+        try:
+            yield
+        finally:
+            mapping, self.mapping = self.mapping, None
+            try:
+                mapping.close()
+            except BufferError:
+                # buffers of a read that was interrupted still refer to the mapping, which is unmapped once they
+                # are released.
+                pass
 
     @staticmethod
-    def split_raw_standard_charge(raw_standard_charge, csv_type: CsvType, file_id: str) -> List[Tuple[StandardCharge, PayerPlan]]:
+    def split_raw_standard_charge(raw_standard_charge, csv_type: CsvType, file_id: str,
+                                  payer_plan_columns: Optional[Dict[Tuple[str, str], Dict[str, str]]] = None) -> List[Tuple[StandardCharge, PayerPlan]]:
         """Splits raw standard charge instance into abstract standard charge instances and payer plan instances.
         The CSV type determines the outcome dimition - Tall type produces a single pair while wide type produces multiple pairs.
 
@@ -43,6 +139,8 @@ class Csv2Parquet:
             raw_standard_charge (BaseModel): raw data instance found in file.
             csv_type (CsvType): The type of the CSV file (tall or wide).
             file_id (str): unique id of input file.
+            payer_plan_columns (dict): payer plan specific fields of wide type(see `get_payer_plan_columns`).
+                If None, they are found from the fields of the raw data instance.
         
         Returns:
             list: List of tuple(standard charge, payer plan)
@@ -54,111 +152,508 @@ class Csv2Parquet:
             standard_charge = StandardCharge(file_id=file_id, plan_id=payer_plan.plan_id, **raw_standard_charge.model_dump())
             return [(standard_charge, payer_plan)]
 
-        # wide format may have multiple payer plans per row. We identify them by the presence of "standard_charge|...|negotiated_dollar" fields.
-        payer_plans = {}
-        for field_name in raw_standard_charge.__class__.model_fields:
-            if field_name.startswith('standard_charge|') and field_name.endswith('|negotiated_dollar'):
-                tokens = field_name.split('|')
-                assert len(tokens) == 4, f"Unexpected field name format: {field_name}"
-                payer_plans[tokens[1] + '|' + tokens[2]] = PayerPlan(
-                    file_id=file_id,
-                    payer_name=tokens[1],
-                    plan_name=tokens[2])
+        # wide format may have multiple payer plans per row.
+        if payer_plan_columns is None:
+            payer_plan_columns = get_payer_plan_columns(raw_standard_charge.__class__.model_fields)
 
         return_list = []
         standard_charge_template = (StandardCharge(file_id=file_id, **raw_standard_charge.model_dump())
-                                    .model_dump(exclude=['plan_id', 'negotiated_dollar', 'negotiated_percentage',
-                                                         'negotiated_algorithm', 'estimated_amount', 'methodology',
-                                                         'additional_payer_notes']))
-        for payer_plan_key, payer_plan in payer_plans.items():
+                                    .model_dump(exclude=['plan_id', *WidePayerPlanFields]))
+        for (payer_name, plan_name), columns in payer_plan_columns.items():
+            payer_plan = PayerPlan(file_id=file_id, payer_name=payer_name, plan_name=plan_name)
             standard_charge = StandardCharge(
                 plan_id=payer_plan.plan_id,
-                negotiated_dollar=getattr(raw_standard_charge, f'standard_charge|{payer_plan_key}|negotiated_dollar', None),
-                negotiated_percentage=getattr(raw_standard_charge, f'standard_charge|{payer_plan_key}|negotiated_percentage', None),           
-                negotiated_algorithm=getattr(raw_standard_charge, f'standard_charge|{payer_plan_key}|negotiated_algorithm', None),
-                estimated_amount=getattr(raw_standard_charge, f'estimated_amount|{payer_plan_key}', None),
-                methodology=getattr(raw_standard_charge, f'standard_charge|{payer_plan_key}|methodology', None),
-                additional_payer_notes=getattr(raw_standard_charge, f'additional_payer_notes|{payer_plan_key}', None),
+                **{name: getattr(raw_standard_charge, column, None) for name, column in columns.items()},
                 **standard_charge_template)
             return_list.append((standard_charge, payer_plan))
 
         return return_list
 
-    def convert(self) -> FileMetaData:
+    @staticmethod
+    def create_codes_column(raw_standard_charges: List, first_line: int = 1, errors: Optional[RowErrors] = None) -> pa.Array:
+        """Combines the code fields of a block of raw standard charge instances into the codes column in one pass.
+
+        Args:
+            raw_standard_charges (List[BaseModel]): raw data instances found in file.
+            first_line (int): row number of the first instance, used in error messages.
+            errors (RowErrors): If given, invalid code types are collected in it instead of raised.
+
+        Returns:
+            pa.Array: list of `CODE_INFORMATION_TYPE` per instance.
+        """
+        code_columns = get_code_columns(raw_standard_charges[0].__class__.model_fields) if raw_standard_charges else []
+        return create_codes_array(
+            [to_string_array([getattr(raw, code) for raw in raw_standard_charges]) for code, _ in code_columns],
+            [to_string_array([getattr(raw, code_type) for raw in raw_standard_charges]) for _, code_type in code_columns],
+            len(raw_standard_charges), first_line, errors)
+
+    @staticmethod
+    def unpivot_raw_standard_charges(raw_standard_charges: List, payer_plan_columns: Dict[Tuple[str, str], Dict[str, str]],
+                                     payer_plans: List[PayerPlan], file_id: str, first_line: int = 1,
+                                     errors: Optional[RowErrors] = None) -> pa.Table:
+        """Unpivots a block of wide type raw standard charge instances into a table with one row per (row, payer plan).
+        Only the fields shared by all payer plans are validated per row, payer plan specific fields are validated per column.
+
+        Args:
+            raw_standard_charges (List[BaseModel]): raw data instances found in file.
+            payer_plan_columns (dict): payer plan specific fields(see `get_payer_plan_columns`).
+            payer_plans (List[PayerPlan]): payer plans in the same order as `payer_plan_columns`.
+            file_id (str): unique id of input file.
+            first_line (int): row number of the first instance, used in error messages.
+            errors (RowErrors): If given, invalid values are collected in it instead of raised.
+
+        Returns:
+            pa.Table: standard charges in `STANDARD_CHARGE_SCHEMA`.
+        """
+        templates = [StandardCharge(file_id=file_id, **raw_standard_charge.model_dump())
+                     .model_dump(exclude=['file_id', 'codes', 'plan_id', *WidePayerPlanFields])
+                     for raw_standard_charge in raw_standard_charges]
+        base_columns = {name: to_string_array([template[name] for template in templates])
+                        for name in (templates[0] if templates else {})}
+        base_columns['codes'] = Csv2Parquet.create_codes_column(raw_standard_charges, first_line, errors)
+        per_plan_columns = {}
+        for name in WidePayerPlanFields:
+            per_plan_columns[name] = [to_string_array([getattr(raw_standard_charge, columns[name], None)
+                                                       for raw_standard_charge in raw_standard_charges])
+                                      for columns in payer_plan_columns.values()]
+            if name in ENUM_FIELDS:
+                per_plan_columns[name] = [validate_enum(column, name, first_line, errors) for column in per_plan_columns[name]]
+        columns = unpivot_payer_plans(base_columns, per_plan_columns, [pp.plan_id for pp in payer_plans],
+                                      len(raw_standard_charges))
+        return create_standard_charge_table(columns, file_id)
+
+    def read_standard_charges(self, sc_model, file_id: str, byte_range: Optional[Tuple[int, int]] = None
+                              ) -> Tuple[Iterator[Tuple[int, List[Tuple[int, Dict[str, str]]]]], BlockTransform]:
+        """Reads standard charge rows in blocks of raw rows, and returns them with the function that validates a block
+        with the dynamic model, one row at a time, and transforms it, so that a pipelined conversion validates a block
+        while the next one is read.
+
+        Args:
+            sc_model (BaseModel): dynamic standard charge model of the file.
+            file_id (str): unique id of input file.
+            byte_range (Tuple[int, int]): If given, only the rows in [start, end) byte range are converted.
+                Line numbers in error messages are relative to the start of the range.
+        Returns:
+            tuple: (raw blocks of (line number of the first row, (line number, raw values) of each row),
+                function of a raw block to (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans, number of input rows))
+        """
+        # in the order of this file's header, since files with reordered headers share a cached model.
+        payer_plan_columns = (get_payer_plan_columns(normalize_header_fields(self.prelude.header))
+                              if self.csv_type == CsvType.WIDE else {})
+        payer_plans = [PayerPlan(file_id=file_id, payer_name=payer_name, plan_name=plan_name)
+                       for payer_name, plan_name in payer_plan_columns]
+        read_stage, validate_stage = self.meta_data.stage('read'), self.meta_data.stage('validate')
+        transform_stage = self.meta_data.stage('transform')
+
+        def _read_blocks() -> Iterator[Tuple[int, List[Tuple[int, Dict[str, str]]]]]:
+            rows = []
+            block_size = self.block_rows(RAW_STANDARD_CHARGE_BLOCK_SIZE)
+            if byte_range:
+                start = byte_range[0]
+                binary_file = io.BufferedReader(ByteRangeFile(self.csv_file_path, *byte_range))
+            else:
+                start = 0
+                binary_file = open_input(self.csv_file_path, read_ahead=True)
+                skip_bytes(binary_file, self.prelude.data_offset)
+            with io.TextIOWrapper(binary_file, newline='', encoding='utf-8') as csv_file:
+                csv_reader = csv.DictReader(csv_file, fieldnames=self.prelude.header)
+                for row_num, row in enumerate(iter_timed(csv_reader, read_stage), start=1):
+                    rows.append((row_num, row))
+                    if len(rows) >= block_size:
+                        self.bytes_read = binary_file.tell() - start
+                        yield rows[0][0], rows
+                        rows = []
+                        block_size = self.block_rows(RAW_STANDARD_CHARGE_BLOCK_SIZE)
+                if rows:
+                    self.bytes_read = binary_file.tell() - start
+                    yield rows[0][0], rows
 
-        general_data_elements = read_general_data_elements(self.csv_file_path)
-        self.logger.info(f"General Data Elements: {general_data_elements.model_dump()}")
-
-        sc_model = create_standard_charge_model(self.csv_file_path)
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            sc_temp_path = os.path.join(tmp_dir, 'standard_charges')
-            os.makedirs(sc_temp_path)
-            payer_plans_map = {}
-            standard_charges = []
-            sc_file_count = 1
-            with open(self.csv_file_path, mode='r', newline='', encoding='utf-8') as csv_file:
-                # skip first 2 lines
-                next(csv_file)
-                next(csv_file)
-                csv_reader = csv.DictReader(csv_file)
-                for row_num, row in enumerate(csv_reader, start=1):
-                    try:
+        def _transform(raw_block: Tuple[int, List[Tuple[int, Dict[str, str]]]]) -> Tuple[pa.Table, List[PayerPlan], int]:
+            first_line, raw_rows = raw_block
+            block = []
+            rows = []   # (line number, raw values) of the rows in the block, kept in lenient mode only.
+            for row_num, row in raw_rows:
+                try:
+                    with validate_stage:
                         raw_standard_charge = sc_model(**row)
-                        ## standard_charge = sc_model.model_validate(row)
-                        self.meta_data.input_row_count += 1
-                        sc_pp_pair_list = self.split_raw_standard_charge(raw_standard_charge, self.csv_type, general_data_elements.file_id)
-                        for standard_charge, payer_plan in sc_pp_pair_list:
-                            standard_charges.append(standard_charge)
-                            self.meta_data.standard_charge_count += 1
-                            if payer_plan.plan_id not in payer_plans_map:
-                                payer_plans_map[payer_plan.plan_id] = payer_plan
-                                self.meta_data.plan_count += 1
-
-                        if len(standard_charges) >= 10000000:
-                            # Write to temp parquet file
-                            sc_file_path = os.path.join(sc_temp_path, f'standard_charges_{sc_file_count}.parquet')
-                            pq.write_table(
-                                pa.Table.from_pylist([sc.model_dump() for sc in standard_charges]),
-                                sc_file_path,
-                                compression='SNAPPY'
-                            )
-                            standard_charges = []
-                            sc_file_count += 1
-
-                    except Exception as e:
+                        if self.csv_type == CsvType.TALL:
+                            # tall format has only one payer plan per row
+                            block.append((raw_standard_charge,
+                                          *self.split_raw_standard_charge(raw_standard_charge, self.csv_type, file_id)[0]))
+                        else:
+                            block.append(raw_standard_charge)
+                except Exception as e:
+                    if not self.lenient:
                         self.logger.error(f"Error processing line {row_num}: {e}")
-                        raise
-
-            # Write remaining standard charges
-            if standard_charges:
-                sc_file_path = os.path.join(sc_temp_path, f'standard_charges_{sc_file_count}.parquet')
-                pq.write_table(
-                    pa.Table.from_pylist([sc.model_dump() for sc in standard_charges]),
-                    sc_file_path,
-                    compression='SNAPPY'
-                )
-            # Merge temp parquet files into final output
-            dataset = ds.dataset(sc_temp_path, format='parquet')
-            pq.write_table(
-                dataset.to_table(),
-                os.path.join(self.out_dir_path, 'standard_charges.parquet'),
-                compression='SNAPPY'
-            )
+                        raise ValueError(f"Invalid standard charge at line {row_num}: {e}") from e
+                    self.reject_row(row_num, row, str(e))
+                    continue
+                if self.lenient:
+                    rows.append((row_num, row))
+
+            with transform_stage:
+                if self.lenient and block:
+                    errors = RowErrors()
+                    table, block_payer_plans = _transform_block(block, first_line, errors)
+                    if not errors:
+                        return table, block_payer_plans, len(raw_rows)
+                    for index, message in errors.messages.items():
+                        self.reject_row(*rows[index], message)
+                    block = [entry for index, entry in enumerate(block) if index not in errors.messages]
+                if not block:
+                    return STANDARD_CHARGE_SCHEMA.empty_table(), [], len(raw_rows)
+                return *_transform_block(block, first_line), len(raw_rows)
+
+        def _transform_block(block: List, first_line: int,
+                             errors: Optional[RowErrors] = None) -> Tuple[pa.Table, List[PayerPlan]]:
+            if self.csv_type == CsvType.TALL:
+                standard_charges = [standard_charge.model_dump(exclude=['file_id', 'codes']) for _, standard_charge, _ in block]
+                columns = {name: to_string_array([sc[name] for sc in standard_charges])
+                           for name in StandardCharge.model_fields if name not in ('file_id', 'codes')}
+                columns['codes'] = self.create_codes_column([raw for raw, _, _ in block], first_line, errors)
+                return create_standard_charge_table(columns, file_id), [pp for _, _, pp in block]
+            return (self.unpivot_raw_standard_charges(block, payer_plan_columns, payer_plans, file_id, first_line, errors),
+                    payer_plans)
+
+        return _read_blocks(), _transform
+
+    def read_standard_charges_arrow(self, sc_model, file_id: str, byte_range: Optional[Tuple[int, int]] = None
+                                    ) -> Tuple[Iterator[Tuple[Optional[pa.RecordBatch], List]], BlockTransform]:
+        """Reads standard charge rows in record batches, and returns them with the function that transforms a batch
+        with Arrow compute kernels. The output is identical to `read_standard_charges`.
+
+        Args:
+            sc_model (BaseModel): dynamic standard charge model of the file.
+            file_id (str): unique id of input file.
+            byte_range (Tuple[int, int]): If given, only the rows in [start, end) byte range are converted.
+        Returns:
+            tuple: (raw blocks of (record batch, rows with a wrong number of columns skipped up to the batch),
+                function of a raw block to (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans, number of input rows))
+        """
+        # rows with a wrong number of columns, skipped by the parser threads in lenient mode.
+        unparsed_rows = deque()
+
+        def _skip_invalid_row(row) -> str:
+            unparsed_rows.append(row)
+            return 'skip'
+
+        def _pop_unparsed_rows() -> List:
+            rows = []
+            while unparsed_rows:
+                rows.append(unparsed_rows.popleft())
+            return rows
+
+        transformer = None
+        transform_stage = self.meta_data.stage('transform')
+
+        def _read_blocks() -> Iterator[Tuple[Optional[pa.RecordBatch], List]]:
+            nonlocal transformer
+            header, reader, source = open_standard_charge_reader(self.csv_file_path,
+                                                                 block_size=self.csv_block_size(DEFAULT_BLOCK_SIZE),
+                                                                 byte_range=byte_range,
+                                                                 invalid_row_handler=_skip_invalid_row if self.lenient else None,
+                                                                 prelude=self.prelude, mapping=self.mapping)
+            transformer = StandardChargeTransformer(sc_model, header, self.csv_type, file_id)
+            start = byte_range[0] if byte_range else 0
+            try:
+                for batch in iter_timed(reader, self.meta_data.stage('read')):
+                    self.bytes_read = source.tell() - start
+                    yield batch, _pop_unparsed_rows()
+                if unparsed_rows:
+                    yield None, _pop_unparsed_rows()
+            finally:
+                reader.close()
+
+        def _transform(raw_block: Tuple[Optional[pa.RecordBatch], List]) -> Tuple[pa.Table, List[PayerPlan], int]:
+            batch, rows = raw_block
+            table, payer_plans = STANDARD_CHARGE_SCHEMA.empty_table(), []
+            if batch is not None:
+                errors = RowErrors() if self.lenient else None
+                try:
+                    with transform_stage:
+                        table, payer_plans = transformer.transform(batch, errors)
+                except Exception as e:
+                    self.logger.error(f"Error processing standard charges after line {transformer.rows_seen}: {e}")
+                    raise
+                if errors:
+                    first_line = transformer.rows_seen - batch.num_rows + 1
+                    indices = sorted(errors.messages)
+                    for index, raw_values in zip(indices, batch.take(pa.array(indices)).to_pylist()):
+                        self.reject_row(first_line + index, raw_values, errors.messages[index])
+            for row in rows:
+                self.reject_row(None, None, f"Expected {row.expected_columns} columns, got {row.actual_columns}: {row.text}")
+            return table, payer_plans, (batch.num_rows if batch is not None else 0) + len(rows)
+
+        return _read_blocks(), _transform
+
+    def read_blocks(self, sc_model, file_id: str,
+                    byte_range: Optional[Tuple[int, int]] = None) -> Tuple[Iterator, BlockTransform]:
+        """Returns the raw blocks of the engine and the function that transforms them(see `write_standard_charges`)."""
+        if self.engine == Engine.ARROW:
+            return self.read_standard_charges_arrow(sc_model, file_id, byte_range)
+        return self.read_standard_charges(sc_model, file_id, byte_range)
+
+    def iter_blocks(self, sc_model, file_id: str,
+                    byte_range: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[pa.Table, List[PayerPlan], int]]:
+        """Reads and transforms the blocks of the engine in turn.
+
+        Yields:
+            tuple: (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans, number of input rows)
+        """
+        raw_blocks, transform = self.read_blocks(sc_model, file_id, byte_range)
+        for raw_block in raw_blocks:
+            yield transform(raw_block)
+
+    def convert_byte_range(self, file_id: str, byte_range: Tuple[int, int], sc_file_path: str) -> Tuple[FileMetaData, List[PayerPlan]]:
+        """Converts the standard charge rows in a byte range of the file to a parquet file.
+
+        Args:
+            file_id (str): unique id of input file.
+            byte_range (Tuple[int, int]): [start, end) byte range that begins and ends at record boundaries.
+            sc_file_path (str): path to the standard charge parquet file of the range.
+        Returns:
+            tuple: (metadata of the range, payer plans found in the range)
+        """
+        with self.measure(), self.open_mapping():
+            sc_model = create_standard_charge_model(self.csv_file_path, self.model_cache, self.prelude.header)
+            raw_blocks, transform = self.read_blocks(sc_model, file_id, byte_range)
+            payer_plans_map = self.write_standard_charges(raw_blocks, sc_file_path, transform)
+        return self.meta_data, list(payer_plans_map.values())
+
+    def _open_checkpoint(self, file_id: str) -> CheckpointStore:
+        stat = os.stat(self.csv_file_path)
+        input_info = {'input_path': os.path.abspath(self.csv_file_path), 'input_size': stat.st_size,
+                      'input_modified_ns': stat.st_mtime_ns, 'file_id': file_id, 'csv_type': self.csv_type.value,
+                      'engine': self.engine.value, 'lenient': self.lenient}
+        return CheckpointStore(self.checkpoint_dir_path, input_info, self.resume)
+
+    def iter_range_blocks(self, sc_model, file_id: str, byte_range: Tuple[int, int], part_path: str,
+                          row_offset: int) -> Generator[Tuple[pa.Table, List[PayerPlan], int], None, Dict]:
+        """Converts the standard charge rows in a byte range in this process and yields them as they are converted,
+        while also writing them to the files of the range, which are only read again if a resumed conversion merges
+        the range. Blocks are written as they come, so they are buffered once, by the writer of the output.
+
+        Args:
+            sc_model (BaseModel): dynamic standard charge model of the file.
+            file_id (str): unique id of input file.
+            byte_range (Tuple[int, int]): [start, end) byte range that begins and ends at record boundaries.
+            part_path (str): path to the standard charge file of the range.
+            row_offset (int): input rows before the range, added to the line numbers of rejected rows.
+        Yields:
+            tuple: (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans, number of input rows)
+        Returns:
+            dict: result of the range to record in the checkpoint, written after the files of the range are closed.
+        """
+        meta_data = FileMetaData(output_sink=str(BYTE_RANGE_SINK))
+        payer_plans_map: Dict[str, PayerPlan] = {}
+        bytes_read = self.bytes_read
+
+        def _write_rejected_rows(rejects_writer: Optional[RowGroupWriter]):
+            # rows are rejected with line numbers relative to the range, which the range's files keep.
+            if rejects_writer and self.rejected_rows:
+                rejects_writer.write(pa.Table.from_pylist(self.rejected_rows, schema=REJECTED_ROW_SCHEMA))
+            for row in self.rejected_rows:
+                row['line_number'] = row['line_number'] + row_offset if row['line_number'] is not None else None
+            meta_data.rejected_row_count += len(self.rejected_rows)
+
+        with (RowGroupWriter(part_path, STANDARD_CHARGE_SCHEMA, row_group_size=self.row_group_size,
+                             sink=BYTE_RANGE_SINK, max_buffer_bytes=0) as part_writer,
+              RowGroupWriter(_get_rejected_rows_path(part_path), REJECTED_ROW_SCHEMA, row_group_size=self.row_group_size,
+                             max_buffer_bytes=0) if self.lenient else nullcontext() as rejects_writer,
+              self.open_mapping()):
+            # engines count the bytes read from the start of the range, which is added while a block is yielded.
+            self.bytes_read = 0
+            for table, payer_plans, input_row_count in self.iter_blocks(sc_model, file_id, byte_range):
+                self.bytes_read += bytes_read
+                meta_data.input_row_count += input_row_count
+                meta_data.standard_charge_count += table.num_rows
+                for payer_plan in payer_plans:
+                    payer_plans_map.setdefault(payer_plan.plan_id, payer_plan)
+                part_writer.write(table)
+                _write_rejected_rows(rejects_writer)
+                yield table, payer_plans, input_row_count
+                self.bytes_read -= bytes_read
+            _write_rejected_rows(rejects_writer)
+        self.bytes_read = bytes_read + byte_range[1] - byte_range[0]
+        return {'input_row_count': meta_data.input_row_count, 'meta_data': asdict(meta_data),
+                'payer_plans': [payer_plan.model_dump() for payer_plan in payer_plans_map.values()]}
+
+    def iter_byte_range_blocks(self, file_id: str) -> Iterator[Tuple[pa.Table, List[PayerPlan], int]]:
+        """Splits the standard charge rows into byte ranges, converts them in worker processes and yields
+        the results in file order. With `checkpoint_dir_path`, ranges of at most `checkpoint_size` bytes are converted
+        into that folder, and each range is recorded in its checkpoint as it completes(see `CheckpointStore`), so that
+        a resumed conversion only converts the ranges that were not completed. Otherwise they are converted into
+        a temporary folder. With a single worker, ranges are converted in this process and streamed into the output
+        as they are converted, instead of being read back from their files(see `iter_range_blocks`).
+
+        Args:
+            file_id (str): unique id of input file.
+        Yields:
+            tuple: (standard charges in `STANDARD_CHARGE_SCHEMA`, payer plans, number of input rows)
+        """
+        data_offset = self.prelude.data_offset
+        file_size = os.path.getsize(self.csv_file_path)
+        num_ranges = min(self.workers, max(1, (file_size - data_offset) // MIN_BYTE_RANGE_SIZE))
+        if self.checkpoint_dir_path:
+            self.checkpoint = self._open_checkpoint(file_id)
+            num_ranges = max(num_ranges, -(-(file_size - data_offset) // self.checkpoint_size))
+        # byte ranges are only converted in this process with a checkpoint, as a single worker converts the whole
+        # file otherwise.
+        in_process = self.workers == 1
+        with (nullcontext() if in_process else ProcessPoolExecutor(max_workers=self.workers) as executor,
+              nullcontext(self.checkpoint_dir_path) if self.checkpoint
+              else tempfile.TemporaryDirectory(dir=self.out_dir_path) as work_dir):
+            checkpoint = self.checkpoint
+            if checkpoint and checkpoint.resumed:
+                byte_ranges = checkpoint.byte_ranges
+                self.logger.info(f"Resuming from checkpoint in {work_dir}: {len(checkpoint.ranges)} of "
+                                 f"{len(byte_ranges)} byte ranges completed")
+            else:
+                byte_ranges = split_byte_ranges(self.csv_file_path, data_offset, file_size, num_ranges,
+                                                map if in_process else executor.map)
+                if checkpoint:
+                    checkpoint.start(byte_ranges)
+            self.logger.info(f"Converting {len(byte_ranges)} byte ranges with {self.workers} workers")
+            part_paths = [os.path.join(work_dir, f'standard_charges_{i}{BYTE_RANGE_SINK.suffix}')
+                          for i in range(len(byte_ranges))]
+            futures = [executor.submit(_convert_byte_range, self.csv_file_path, self.csv_type, self.engine, self.row_group_size,
+                                       file_id, byte_range, part_path, self.lenient, self.max_errors,
+                                       self.memory_map, self.prelude, self.pipeline_depth, self.max_memory)
+                       if not (in_process or (checkpoint and i in checkpoint.ranges)) else None
+                       for i, (byte_range, part_path) in enumerate(zip(byte_ranges, part_paths))]
+            sc_model = (create_standard_charge_model(self.csv_file_path, self.model_cache, self.prelude.header)
+                        if in_process else None)
+
+            self.bytes_read = data_offset
+            row_offset = 0  # input rows of the ranges before the current one
+            merge_stage = self.meta_data.stage('merge')
+            for i, (future, part_path, (start, end)) in enumerate(zip(futures, part_paths, byte_ranges)):
+                if in_process and i not in checkpoint.ranges:
+                    result = yield from self.iter_range_blocks(sc_model, file_id, (start, end), part_path, row_offset)
+                    checkpoint.complete(i, result)
+                    row_offset += result['input_row_count']
+                    continue
+                if future is None:
+                    result = checkpoint.ranges[i]
+                    meta_data = FileMetaData.from_dict(result['meta_data'])
+                    payer_plans = [PayerPlan(**payer_plan) for payer_plan in result['payer_plans']]
+                else:
+                    meta_data, payer_plans = future.result()
+                    if checkpoint:
+                        checkpoint.complete(i, {'input_row_count': meta_data.input_row_count,
+                                                'meta_data': asdict(meta_data),
+                                                'payer_plans': [payer_plan.model_dump() for payer_plan in payer_plans]})
+                self.meta_data.merge(meta_data)
+                self.bytes_read += end - start
+                if self.lenient:
+                    # line numbers of a range are relative to the range, and the rows of earlier ranges are counted.
+                    rejected_rows_path = _get_rejected_rows_path(part_path)
+                    for row in pq.read_table(rejected_rows_path).to_pylist():
+                        self.reject_row(row['line_number'] + row_offset if row['line_number'] is not None else None,
+                                        dict(row['raw_values']) if row['raw_values'] is not None else None, row['error'])
+                    if not checkpoint:
+                        os.remove(rejected_rows_path)
+                row_offset += meta_data.input_row_count
+                yield STANDARD_CHARGE_SCHEMA.empty_table(), payer_plans, meta_data.input_row_count
+                batch_size = self.block_rows(self.row_group_size, factor=1, input_rows=False)
+                batches = BYTE_RANGE_SINK.iter_batches(part_path, batch_size)
+                for batch in iter_timed(batches, merge_stage):
+                    yield pa.Table.from_batches([batch]), [], 0
+                # the output of ranges is kept until the conversion completes, since it is merged again on resume.
+                if not checkpoint:
+                    os.remove(part_path)
+
+    @property
+    def general_data_elements(self) -> GeneralDataElements:
+        """General data elements of the file, read from its prelude."""
+        return self.prelude.general_data_elements
+
+    @property
+    def payer_plans(self) -> List[PayerPlan]:
+        """Payer plans found so far by `iter_batches`, in the order they were found."""
+        return list(self.payer_plans_map.values())
+
+    def iter_batches(self, batch_size: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+        """Converts standard charges in memory, without writing any file, and yields them as the file is parsed, so
+        that callers can stream them into their own sinks with memory bounded by a block. Blocks are converted by the
+        engine in this process, and output options(`compact`, `price_type`, `workers`, etc.) don't apply.
+        `payer_plans` has the payer plans found up to each batch and `meta_data` the counts, and in lenient mode
+        `rejected_rows` collects the rows rejected so far.
+
+        Args:
+            batch_size (int): maximum number of rows of a record batch. Default is the rows of a block of the engine.
+        Yields:
+            pa.RecordBatch: standard charges in `STANDARD_CHARGE_SCHEMA`.
+        Raises:
+            ValueError: If a row is invalid, or too many rows are rejected in lenient mode.
+        """
+        self.payer_plans_map = {}
+        with self.measure(), self.open_mapping():
+            sc_model = create_standard_charge_model(self.csv_file_path, self.model_cache, self.prelude.header)
+            for table, payer_plans, input_row_count in self.iter_blocks(sc_model, self.general_data_elements.file_id):
+                self.meta_data.input_row_count += input_row_count
+                self.meta_data.standard_charge_count += table.num_rows
+                for payer_plan in payer_plans:
+                    self.add_payer_plan(self.payer_plans_map, payer_plan)
+                if self.memory_budget:
+                    self.memory_budget.observe(table, input_row_count)
+                self.check_error_ratio()
+                self.report_progress()
+                yield from table.to_batches(max_chunksize=batch_size)
+            self.check_error_ratio(final=True)
+
+    def convert(self) -> FileMetaData:
+        if not self.out_dir_path:
+            raise ValueError("Conversion to files requires out_dir_path, use iter_batches to convert in memory")
+        with self.measure():
+            general_data_elements = self.prelude.general_data_elements
+            self.logger.info(f"General Data Elements: {general_data_elements.model_dump()}")
+
+            sc_file_path = self.output_file_path('standard_charges')
+            if self.workers > 1 and is_compressed(self.csv_file_path):
+                self.logger.warning(f"Compressed input({self.csv_file_path}) can't be split into byte ranges, "
+                                    f"converting it in a single process")
+            if (self.workers > 1 or self.checkpoint_dir_path) and not is_compressed(self.csv_file_path):
+                # worker processes map the file themselves.
+                payer_plans_map = self.write_standard_charges(self.iter_byte_range_blocks(general_data_elements.file_id),
+                                                              sc_file_path)
+            else:
+                with self.open_mapping():
+                    sc_model = create_standard_charge_model(self.csv_file_path, self.model_cache, self.prelude.header)
+                    raw_blocks, transform = self.read_blocks(sc_model, general_data_elements.file_id)
+                    payer_plans_map = self.write_standard_charges(raw_blocks, sc_file_path, transform)
+
             # write other files
-            pq.write_table(
-                pa.Table.from_pylist([general_data_elements.model_dump()]),
-                os.path.join(self.out_dir_path, 'general_data_elements.parquet'),
-                compression='SNAPPY')
-            pq.write_table(
-                pa.Table.from_pylist([pp.model_dump() for pp in payer_plans_map.values()]),
-                os.path.join(self.out_dir_path, 'payer_plans.parquet'),
-                compression='SNAPPY'
-            )
+            self.write_general_data_elements(general_data_elements)
+            self.write_payer_plans(payer_plans_map)
+            if self.write_index:
+                self.write_standard_charge_index()
+            if self.checkpoint:
+                self.checkpoint.remove()
         self.logger.info(f"Conversion completed. Output written to {self.out_dir_path}")
         self.logger.info(f"File MetaData: {self.meta_data}")
         return self.meta_data
 
 
+def _get_rejected_rows_path(sc_file_path: str) -> str:
+    return os.path.splitext(sc_file_path)[0] + '_rejected.parquet'
+
+
+def _convert_byte_range(csv_file_path, csv_type: CsvType, engine: Engine, row_group_size: int,
+                        file_id: str, byte_range: Tuple[int, int], sc_file_path: str,
+                        lenient: bool = False, max_errors: Optional[int] = None, memory_map: bool = False,
+                        prelude: Optional[CsvPrelude] = None,
+                        pipeline_depth: Optional[int] = None,
+                        max_memory: Optional[int] = None) -> Tuple[FileMetaData, List[PayerPlan]]:
+    """Entry point of worker processes of `Csv2Parquet.iter_byte_range_blocks`."""
+    converter = Csv2Parquet(csv_file_path, os.path.dirname(sc_file_path), csv_type=csv_type, engine=engine,
+                            row_group_size=row_group_size, lenient=lenient, max_errors=max_errors,
+                            memory_map=memory_map, prelude=prelude, pipeline_depth=pipeline_depth,
+                            max_memory=max_memory, sink=BYTE_RANGE_SINK)
+    converter.rejected_rows_file_path = _get_rejected_rows_path(sc_file_path)
+    return converter.convert_byte_range(file_id, byte_range, sc_file_path)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Convert HPT CSV to abstract schema in Parquet.")
 
@@ -166,19 +661,119 @@ if __name__ == "__main__":
     parser.add_argument("--output-folder", type=str, help="Path to output folder. Default is the folder where the input file is.")
     parser.add_argument("--csv-type", choices=[m.value for m in CsvType], help="Type of input CSV file(\"wide\" or \"tall\")")
     parser.add_argument("--infer-type", action='store_true', help="Infer input CSV file type without conversion.")
+    parser.add_argument("--engine", choices=[m.value for m in Engine], default=Engine.PYTHON.value,
+                        help="Conversion engine(\"python\" or \"arrow\"). Default is \"python\".")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes converting byte ranges of the input file. Default is 1.")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Number of rows per row group of standard charge file. Default is {DEFAULT_ROW_GROUP_SIZE}.")
+    parser.add_argument("--model-cache-dir", type=str,
+                        help="Path to folder where standard charge models are cached by header. Default is no disk cache.")
+    parser.add_argument("--compact", action='store_true',
+                        help="Dictionary encode low-cardinality columns and refer to payer plans by int32 plan_key.")
+    parser.add_argument("--price-type", choices=[m.value for m in PriceType], default=PriceType.DECIMAL.value,
+                        help="Type of price columns(\"decimal\", \"float\" or \"cents\"). Default is \"decimal\".")
+    parser.add_argument("--write-codes", action='store_true',
+                        help="Also write codes to standard_charge_codes.parquet, one row per code.")
+    parser.add_argument("--progress", action='store_true', help="Show a progress bar with ETA.")
+    parser.add_argument("--lenient", action='store_true',
+                        help="Write invalid rows to rejected_rows.parquet instead of aborting the conversion.")
+    parser.add_argument("--max-errors", type=int, help="Abort if more rows than this are rejected in lenient mode.")
+    parser.add_argument("--max-error-ratio", type=float,
+                        help="Abort if more than this ratio of input rows are rejected in lenient mode, e.g. 0.01.")
+    parser.add_argument("--partition-by", type=str,
+                        help="Comma separated standard charge columns, e.g. \"setting,plan_id\", to write standard charges "
+                             "as a hive partitioned dataset in the standard_charges folder.")
+    parser.add_argument("--sort-by", type=str,
+                        help="Comma separated standard charge columns to sort the rows of each row group by.")
+    parser.add_argument("--write-page-index", action='store_true',
+                        help="Write page-level statistics of standard charges, so that readers can skip pages.")
+    parser.add_argument("--previous-output", type=str,
+                        help="Path to output folder of the previous version of the file, to write only the standard "
+                             "charges added, changed or removed since then to standard_charges_delta.parquet.")
+    parser.add_argument("--write-row-hashes", action='store_true',
+                        help="Write row hashes to standard_charge_hashes.parquet, for delta conversion of the next version.")
+    parser.add_argument("--memory-map", action='store_true',
+                        help="Memory map the input file, so that the arrow engine parses it without copying. "
+                             "Requires --engine arrow.")
+    parser.add_argument("--pipeline", type=int, nargs='?', const=DEFAULT_PIPELINE_DEPTH, metavar='DEPTH',
+                        help="Read, transform and write blocks on separate threads, with up to DEPTH blocks queued "
+                             f"between them. Default DEPTH is {DEFAULT_PIPELINE_DEPTH}.")
+    parser.add_argument("--max-memory", type=parse_size,
+                        help="Memory budget of the data buffered by the conversion, e.g. 2G. Block and row group "
+                             "sizes are adapted to it. Default is no budget.")
+    parser.add_argument("--write-index", action='store_true',
+                        help="Write the index of codes, descriptions and plan ids looked up by hpt_converter.query.")
+    parser.add_argument("--output-format", choices=[m.value for m in OutputFormat], default=OutputFormat.PARQUET.value,
+                        help="Format of output files(\"parquet\", \"arrow\" IPC file or \"arrows\" IPC stream). "
+                             "Default is \"parquet\".")
+    parser.add_argument("--compression", type=str,
+                        help=f"Codec of output files. Default is {OUTPUT_CODECS[OutputFormat.PARQUET][0]} for parquet "
+                             f"and {OUTPUT_CODECS[OutputFormat.ARROW][0]} for arrow, \"none\" for no compression.")
+    parser.add_argument("--compression-level", type=int, help="Level of the codec of output files, e.g. 19 for zstd.")
+    parser.add_argument("--checkpoint-dir", type=str,
+                        help="Path to a durable work folder where byte ranges of the input are converted and recorded "
+                             "as they complete, so that an interrupted conversion can be resumed. Default is no checkpoint.")
+    parser.add_argument("--checkpoint-size", type=parse_size, default=DEFAULT_CHECKPOINT_SIZE,
+                        help="Bytes of input converted between checkpoints, e.g. 512M. Default is 1G.")
+    parser.add_argument("--resume", action='store_true',
+                        help="Resume from the checkpoint in --checkpoint-dir, converting only the byte ranges not completed.")
+    parser.add_argument("--inspect", action='store_true',
+                        help="Print a JSON profile of the input file estimated from samples of its rows, without conversion.")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES,
+                        help=f"Number of samples read by --inspect. Default is {DEFAULT_SAMPLES}.")
+    parser.add_argument("--sample-size", type=parse_size, default=DEFAULT_SAMPLE_SIZE,
+                        help="Bytes of each sample read by --inspect, e.g. 4M. Default is 1M.")
     args = parser.parse_args()
 
     if args.infer_type:
         csv_type = infer_csv_type(args.input)
         print(f"File({args.input}) type: {csv_type.value}")
         sys.exit(0)
+    if args.inspect:
+        try:
+            profile = inspect_csv(args.input, args.samples, args.sample_size,
+                                  StandardChargeModelCache(cache_dir=args.model_cache_dir))
+            print(json.dumps(asdict(profile), indent=2))
+            sys.exit(0)
+        except Exception as e:
+            print(f"Failed: {str(e)}")
+            sys.exit(-1)
     if not args.output_folder:
         args.output_folder = os.path.dirname(args.input)
         print(f"Set 'output-folder' to {args.output_folder}")
+    progress_bar = ProgressBar() if args.progress else None
     try:
         result = Csv2Parquet(csv_file_path=args.input,
                              out_dir_path=args.output_folder,
-                             csv_type=CsvType(args.csv_type) if args.csv_type else None).convert()
+                             csv_type=CsvType(args.csv_type) if args.csv_type else None,
+                             engine=Engine(args.engine),
+                             row_group_size=args.row_group_size,
+                             workers=args.workers,
+                             model_cache=StandardChargeModelCache(cache_dir=args.model_cache_dir),
+                             compact=args.compact,
+                             price_type=PriceType(args.price_type),
+                             write_codes=args.write_codes,
+                             progress=progress_bar,
+                             lenient=args.lenient,
+                             max_errors=args.max_errors,
+                             max_error_ratio=args.max_error_ratio,
+                             partition_by=args.partition_by.split(',') if args.partition_by else None,
+                             sort_by=args.sort_by.split(',') if args.sort_by else None,
+                             write_page_index=args.write_page_index,
+                             previous_dir_path=args.previous_output,
+                             write_row_hashes=args.write_row_hashes,
+                             memory_map=args.memory_map,
+                             pipeline_depth=args.pipeline,
+                             max_memory=args.max_memory,
+                             write_index=args.write_index,
+                             sink=OutputSink(OutputFormat(args.output_format), args.compression,
+                                             args.compression_level),
+                             checkpoint_dir_path=args.checkpoint_dir,
+                             checkpoint_size=args.checkpoint_size,
+                             resume=args.resume).convert()
+        if progress_bar:
+            progress_bar.close()
         print(f"Result: {asdict(result)}")
         sys.exit(0)
     except Exception as e:
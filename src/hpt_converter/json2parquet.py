@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+
+from hpt_converter.converter import BlockTransform, Converter, FileMetaData
+from hpt_converter.lib.csv.arrow_engine import (create_standard_charge_table,
+                                                to_string_array)
+from hpt_converter.lib.json.utils import (STANDARD_CHARGE_INFORMATION,
+                                          JsonObjectStream,
+                                          create_general_data_elements,
+                                          get_file_id,
+                                          read_general_data_elements)
+from hpt_converter.lib.memory import parse_size
+from hpt_converter.lib.metrics import (ProgressBar, ProgressCallback,
+                                      iter_timed)
+from hpt_converter.lib.pipeline import DEFAULT_PIPELINE_DEPTH
+from hpt_converter.lib.schema.abstract.v1 import *
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    CODE_INFORMATION_TYPE, PRICE_TYPE, PriceType)
+from hpt_converter.lib.schema.abstract.v1.standard_charge import \
+    CodeInformation
+from hpt_converter.lib.writer import (DEFAULT_ROW_GROUP_SIZE, OUTPUT_CODECS,
+                                     OutputFormat, OutputSink)
+
+STANDARD_CHARGE_BLOCK_SIZE = 10000
+CENTS = Decimal('0.01')
+
+
+def to_price(value: Any, field_name: str = 'price') -> Optional[Decimal]:
+    """Converts a JSON number to a price with 2 decimal places. Prices that don't fit `PRICE_TYPE` are invalid
+    rather than rounded, like prices of CSV files.
+
+    Args:
+        value (Any): int, Decimal, numeric string or None.
+        field_name (str): name of the price, used in error messages.
+    Returns:
+        Decimal: the price, or None if the value is missing.
+    Raises:
+        ValueError: If the value is not a number, or has more decimal places or integer digits than `PRICE_TYPE`.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Invalid {field_name} value({str(value)!r})")
+    if not price.is_finite():
+        raise ValueError(f"Invalid {field_name} value({str(value)!r})")
+    # same checks as pydantic, which applies them to the normalized value.
+    _, digits, exponent = price.normalize().as_tuple()
+    decimals, integer_digits = max(-exponent, 0), max(len(digits) + exponent, 0)
+    if decimals > PRICE_TYPE.scale or integer_digits > PRICE_TYPE.precision - PRICE_TYPE.scale:
+        raise ValueError(f"Invalid {field_name} value({str(value)!r}): expected at most "
+                         f"{PRICE_TYPE.precision - PRICE_TYPE.scale} integer digits and {PRICE_TYPE.scale} decimal places")
+    return price.quantize(CENTS)
+
+
+class Json2Parquet(Converter):
+    def __init__(self, json_file_path, out_dir_path, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 compact: bool = False, price_type: PriceType = PriceType.DECIMAL, write_codes: bool = False,
+                 progress: Optional[ProgressCallback] = None, lenient: bool = False,
+                 max_errors: Optional[int] = None, max_error_ratio: Optional[float] = None,
+                 partition_by: Optional[List[str]] = None, sort_by: Optional[List[str]] = None,
+                 write_page_index: bool = False, previous_dir_path: Optional[str] = None,
+                 write_row_hashes: bool = False, pipeline_depth: Optional[int] = None,
+                 max_memory: Optional[int] = None, write_index: bool = False, sink: Optional[OutputSink] = None):
+        super().__init__(out_dir_path, row_group_size, compact, price_type, write_codes, progress,
+                         lenient, max_errors, max_error_ratio, partition_by, sort_by, write_page_index,
+                         previous_dir_path, write_row_hashes, pipeline_depth, max_memory,
+                         write_index, sink)
+        self.json_file_path = json_file_path
+        self.input_size = os.path.getsize(json_file_path)
+
+    @staticmethod
+    def split_raw_standard_charge(raw_standard_charge: Dict[str, Any], file_id: str) -> List[Tuple[StandardCharge, Optional[PayerPlan]]]:
+        """Splits an item of standard charge information into abstract standard charge instances and payer plan instances.
+        Each standard charge of the item produces one pair per payer plan, or a single pair without payer plan if it
+        has no payer information.
+
+        Args:
+            raw_standard_charge (dict): an item of 'standard_charge_information' array.
+            file_id (str): unique id of input file.
+
+        Returns:
+            list: List of tuple(standard charge, payer plan or None)
+        """
+        drug_information = raw_standard_charge.get('drug_information') or {}
+        codes = [CodeInformation(code=str(code_information.get('code')), code_type=code_information.get('type'))
+                 for code_information in raw_standard_charge.get('code_information') or []]
+        return_list = []
+        for standard_charge in raw_standard_charge.get('standard_charges') or []:
+            template = {
+                'file_id': file_id,
+                'description': raw_standard_charge.get('description'),
+                'codes': codes,
+                'setting': standard_charge.get('setting'),
+                'drug_unit_of_measurement': (str(drug_information['unit'])
+                                             if drug_information.get('unit') is not None else None),
+                'drug_type_of_measurement': drug_information.get('type'),
+                'gross_charge': to_price(standard_charge.get('gross_charge'), 'gross_charge'),
+                'discounted_cash': to_price(standard_charge.get('discounted_cash'), 'discounted_cash'),
+                'min_charge': to_price(standard_charge.get('minimum'), 'min_charge'),
+                'max_charge': to_price(standard_charge.get('maximum'), 'max_charge'),
+                # multiple modifiers are separated by '|' as in CSV format.
+                'modifiers': '|'.join(standard_charge.get('modifier_code') or []) or None,
+                'additional_generic_notes': standard_charge.get('additional_generic_notes'),
+            }
+            payers_information = standard_charge.get('payers_information') or []
+            if not payers_information:
+                return_list.append((StandardCharge(**template), None))
+            for payer_information in payers_information:
+                payer_plan = PayerPlan(file_id=file_id, payer_name=payer_information.get('payer_name'),
+                                       plan_name=payer_information.get('plan_name'))
+                return_list.append((StandardCharge(
+                    plan_id=payer_plan.plan_id,
+                    negotiated_dollar=to_price(payer_information.get('standard_charge_dollar'), 'negotiated_dollar'),
+                    negotiated_percentage=to_price(payer_information.get('standard_charge_percentage'), 'negotiated_percentage'),
+                    negotiated_algorithm=payer_information.get('standard_charge_algorithm'),
+                    estimated_amount=to_price(payer_information.get('estimated_amount'), 'estimated_amount'),
+                    methodology=payer_information.get('methodology'),
+                    additional_payer_notes=payer_information.get('additional_payer_notes'),
+                    **template), payer_plan))
+        return return_list
+
+    @staticmethod
+    def create_standard_charge_block(block: List[Tuple[StandardCharge, Optional[PayerPlan]]], file_id: str) -> pa.Table:
+        """Creates a table of standard charges in `STANDARD_CHARGE_SCHEMA` from a block of standard charge instances."""
+        standard_charges = [standard_charge.model_dump(exclude=['file_id']) for standard_charge, _ in block]
+        columns = {name: to_string_array([sc[name] for sc in standard_charges])
+                   for name in StandardCharge.model_fields if name not in ('file_id', 'codes')}
+        columns['codes'] = pa.array([[{'code': code['code'], 'code_type': str(code['code_type'])} for code in sc['codes']]
+                                     for sc in standard_charges], pa.list_(CODE_INFORMATION_TYPE))
+        return create_standard_charge_table(columns, file_id)
+
+    @staticmethod
+    def count_standard_charges(raw_standard_charge: Dict[str, Any]) -> int:
+        """Returns the number of standard charges that `split_raw_standard_charge` makes of a valid item, without
+        validating it."""
+        return sum(max(len(standard_charge.get('payers_information') or []), 1)
+                   for standard_charge in raw_standard_charge.get('standard_charges') or []
+                   if isinstance(standard_charge, dict))
+
+    def read_standard_charges(self, raw_standard_charges: Iterator[Dict[str, Any]], file_id: str,
+                              stream: Optional[JsonObjectStream] = None
+                              ) -> Tuple[Iterator[List[Tuple[int, Dict[str, Any]]]], BlockTransform]:
+        """Reads items of standard charge information in blocks, and returns them with the function that validates
+        a block one item at a time and transforms it, so that a pipelined conversion validates a block while the next
+        one is read.
+
+        Args:
+            raw_standard_charges (Iterator[dict]): items of 'standard_charge_information' array.
+            file_id (str): unique id of input file.
+            stream (JsonObjectStream): If given, the stream of the items, whose bytes read are reported as progress.
+        Returns:
+            tuple: (raw blocks of (item number, item), function of a raw block to (standard charges in
+                `STANDARD_CHARGE_SCHEMA`, payer plans, number of input items))
+        """
+        validate_stage, transform_stage = self.meta_data.stage('validate'), self.meta_data.stage('transform')
+
+        def _read_blocks() -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+            items = []
+            standard_charge_count = 0
+            block_size = self.block_rows(STANDARD_CHARGE_BLOCK_SIZE, input_rows=False)
+            for item_num, raw_standard_charge in enumerate(iter_timed(raw_standard_charges, self.meta_data.stage('read')),
+                                                           start=1):
+                items.append((item_num, raw_standard_charge))
+                if isinstance(raw_standard_charge, dict):
+                    standard_charge_count += self.count_standard_charges(raw_standard_charge)
+                if standard_charge_count >= block_size:
+                    if stream:
+                        self.bytes_read = stream.bytes_read
+                    yield items
+                    items = []
+                    standard_charge_count = 0
+                    block_size = self.block_rows(STANDARD_CHARGE_BLOCK_SIZE, input_rows=False)
+            if items:
+                if stream:
+                    self.bytes_read = stream.bytes_read
+                yield items
+
+        def _transform(items: List[Tuple[int, Dict[str, Any]]]) -> Tuple[pa.Table, List[PayerPlan], int]:
+            block = []
+            for item_num, raw_standard_charge in items:
+                try:
+                    with validate_stage:
+                        block.extend(self.split_raw_standard_charge(raw_standard_charge, file_id))
+                except Exception as e:
+                    if not self.lenient:
+                        self.logger.error(f"Error processing standard charge information item {item_num}: {e}")
+                        raise
+                    # the line number of an item is its number in the array, and raw values are JSON.
+                    self.reject_row(item_num, {key: json.dumps(value, default=str)
+                                               for key, value in raw_standard_charge.items()}, str(e))
+            with transform_stage:
+                return self.create_standard_charge_block(block, file_id), [pp for _, pp in block if pp], len(items)
+
+        return _read_blocks(), _transform
+
+    def convert(self) -> FileMetaData:
+        """Converts the file in a single pass when general data elements precede standard charge information,
+        as in the CMS template. Otherwise general data elements are read in an extra pass first.
+        """
+        sc_file_path = self.output_file_path('standard_charges')
+        raw_elements = {}
+        payer_plans_map = None
+        stream = JsonObjectStream(self.json_file_path, {STANDARD_CHARGE_INFORMATION})
+        with self.measure():
+            for key, value in stream.items():
+                if key != STANDARD_CHARGE_INFORMATION:
+                    raw_elements[key] = value
+                    continue
+                file_id = get_file_id(raw_elements) or read_general_data_elements(self.json_file_path).file_id
+                raw_blocks, transform = self.read_standard_charges(value, file_id, stream)
+                payer_plans_map = self.write_standard_charges(raw_blocks, sc_file_path, transform)
+            self.bytes_read = stream.bytes_read
+
+            general_data_elements = create_general_data_elements(raw_elements)
+            self.logger.info(f"General Data Elements: {general_data_elements.model_dump()}")
+            if payer_plans_map is None:
+                raise ValueError(f"JSON file({self.json_file_path}) is missing {STANDARD_CHARGE_INFORMATION}.")
+
+            # write other files
+            self.write_general_data_elements(general_data_elements)
+            self.write_payer_plans(payer_plans_map)
+            if self.write_index:
+                self.write_standard_charge_index()
+        self.logger.info(f"Conversion completed. Output written to {self.out_dir_path}")
+        self.logger.info(f"File MetaData: {self.meta_data}")
+        return self.meta_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert HPT JSON to abstract schema in Parquet.")
+
+    parser.add_argument("input", type=str, help="Path to input JSON file.")
+    parser.add_argument("--output-folder", type=str, help="Path to output folder. Default is the folder where the input file is.")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"Number of rows per row group of standard charge file. Default is {DEFAULT_ROW_GROUP_SIZE}.")
+    parser.add_argument("--compact", action='store_true',
+                        help="Dictionary encode low-cardinality columns and refer to payer plans by int32 plan_key.")
+    parser.add_argument("--price-type", choices=[m.value for m in PriceType], default=PriceType.DECIMAL.value,
+                        help="Type of price columns(\"decimal\", \"float\" or \"cents\"). Default is \"decimal\".")
+    parser.add_argument("--write-codes", action='store_true',
+                        help="Also write codes to standard_charge_codes.parquet, one row per code.")
+    parser.add_argument("--progress", action='store_true', help="Show a progress bar with ETA.")
+    parser.add_argument("--lenient", action='store_true',
+                        help="Write invalid items to rejected_rows.parquet instead of aborting the conversion.")
+    parser.add_argument("--max-errors", type=int, help="Abort if more items than this are rejected in lenient mode.")
+    parser.add_argument("--max-error-ratio", type=float,
+                        help="Abort if more than this ratio of items are rejected in lenient mode, e.g. 0.01.")
+    parser.add_argument("--partition-by", type=str,
+                        help="Comma separated standard charge columns, e.g. \"setting,plan_id\", to write standard charges "
+                             "as a hive partitioned dataset in the standard_charges folder.")
+    parser.add_argument("--sort-by", type=str,
+                        help="Comma separated standard charge columns to sort the rows of each row group by.")
+    parser.add_argument("--write-page-index", action='store_true',
+                        help="Write page-level statistics of standard charges, so that readers can skip pages.")
+    parser.add_argument("--previous-output", type=str,
+                        help="Path to output folder of the previous version of the file, to write only the standard "
+                             "charges added, changed or removed since then to standard_charges_delta.parquet.")
+    parser.add_argument("--write-row-hashes", action='store_true',
+                        help="Write row hashes to standard_charge_hashes.parquet, for delta conversion of the next version.")
+    parser.add_argument("--pipeline", type=int, nargs='?', const=DEFAULT_PIPELINE_DEPTH, metavar='DEPTH',
+                        help="Read, transform and write blocks on separate threads, with up to DEPTH blocks queued "
+                             f"between them. Default DEPTH is {DEFAULT_PIPELINE_DEPTH}.")
+    parser.add_argument("--max-memory", type=parse_size,
+                        help="Memory budget of the data buffered by the conversion, e.g. 2G. Block and row group "
+                             "sizes are adapted to it. Default is no budget.")
+    parser.add_argument("--write-index", action='store_true',
+                        help="Write the index of codes, descriptions and plan ids looked up by hpt_converter.query.")
+    parser.add_argument("--output-format", choices=[m.value for m in OutputFormat], default=OutputFormat.PARQUET.value,
+                        help="Format of output files(\"parquet\", \"arrow\" IPC file or \"arrows\" IPC stream). "
+                             "Default is \"parquet\".")
+    parser.add_argument("--compression", type=str,
+                        help=f"Codec of output files. Default is {OUTPUT_CODECS[OutputFormat.PARQUET][0]} for parquet "
+                             f"and {OUTPUT_CODECS[OutputFormat.ARROW][0]} for arrow, \"none\" for no compression.")
+    parser.add_argument("--compression-level", type=int, help="Level of the codec of output files, e.g. 19 for zstd.")
+    args = parser.parse_args()
+
+    if not args.output_folder:
+        args.output_folder = os.path.dirname(args.input)
+        print(f"Set 'output-folder' to {args.output_folder}")
+    progress_bar = ProgressBar() if args.progress else None
+    try:
+        result = Json2Parquet(json_file_path=args.input,
+                              out_dir_path=args.output_folder,
+                              row_group_size=args.row_group_size,
+                              compact=args.compact,
+                              price_type=PriceType(args.price_type),
+                              write_codes=args.write_codes,
+                              progress=progress_bar,
+                              lenient=args.lenient,
+                              max_errors=args.max_errors,
+                              max_error_ratio=args.max_error_ratio,
+                              partition_by=args.partition_by.split(',') if args.partition_by else None,
+                              sort_by=args.sort_by.split(',') if args.sort_by else None,
+                              write_page_index=args.write_page_index,
+                              previous_dir_path=args.previous_output,
+                              write_row_hashes=args.write_row_hashes,
+                              pipeline_depth=args.pipeline,
+                              max_memory=args.max_memory,
+                              write_index=args.write_index,
+                              sink=OutputSink(OutputFormat(args.output_format), args.compression,
+                                              args.compression_level)).convert()
+        if progress_bar:
+            progress_bar.close()
+        print(f"Result: {asdict(result)}")
+        sys.exit(0)
+    except Exception as e:
+        print(f"Failed: {str(e)}")
+        sys.exit(-1)
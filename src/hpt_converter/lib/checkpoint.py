@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+CHECKPOINT_FILE_NAME = 'checkpoint.json'
+DEFAULT_CHECKPOINT_SIZE = 1 << 30   # bytes of input converted between checkpoints
+
+
+class CheckpointStore:
+    """Durable work folder of a conversion split into byte ranges, which records the result of each completed range
+    in checkpoint.json, so that a conversion interrupted at any point resumes from its completed ranges.
+    The checkpoint is replaced atomically, and a range is recorded only after its output files are closed, so the
+    output of a range that was being converted when the process stopped is never used.
+
+    Args:
+        dir_path (str): work folder, created if it doesn't exist.
+        input_info (dict): identity of the input and of the options that change the output of ranges. A checkpoint
+            is only resumed with the same values.
+        resume (bool): If True, the checkpoint in the folder is resumed if there is one. Otherwise the work folder of
+            a previous conversion is cleared.
+    Raises:
+        ValueError: If the checkpoint to resume was made for another input or other options, or the folder has other
+            files than a checkpoint and its ranges.
+    """
+    def __init__(self, dir_path: str, input_info: Dict[str, Any], resume: bool = False):
+        self.dir_path = dir_path
+        self.file_path = os.path.join(dir_path, CHECKPOINT_FILE_NAME)
+        self.input_info = input_info
+        self.byte_ranges: Optional[List[Tuple[int, int]]] = None
+        self.ranges: Dict[int, Dict[str, Any]] = {}   # results of completed ranges by range number
+        if resume and os.path.exists(self.file_path):
+            with open(self.file_path, encoding='utf-8') as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state['input'] != input_info:
+                raise ValueError(f"Checkpoint in {dir_path} is of another input or options: {state['input']}")
+            self.byte_ranges = [tuple(byte_range) for byte_range in state['byte_ranges']]
+            self.ranges = {int(i): result for i, result in state['ranges'].items()}
+        elif os.path.isdir(dir_path) and os.listdir(dir_path):
+            # only a work folder of a previous conversion is cleared, never a folder with other files.
+            if not os.path.exists(self.file_path):
+                raise ValueError(f"Checkpoint folder {dir_path} is not empty and has no {CHECKPOINT_FILE_NAME}")
+            shutil.rmtree(dir_path)
+        os.makedirs(dir_path, exist_ok=True)
+
+    @property
+    def resumed(self) -> bool:
+        return self.byte_ranges is not None
+
+    def start(self, byte_ranges: List[Tuple[int, int]]):
+        """Records the byte ranges of the conversion, which a resumed conversion keeps."""
+        self.byte_ranges = byte_ranges
+        self._save()
+
+    def complete(self, i: int, result: Dict[str, Any]):
+        """Records the result of a range, e.g. its counts and payer plans, after its output files are closed."""
+        self.ranges[i] = result
+        self._save()
+
+    def _save(self):
+        # the byte offset and the input rows up to the first range not completed, for monitoring.
+        byte_offset, row_count = None, 0
+        for i, (start, end) in enumerate(self.byte_ranges):
+            if i not in self.ranges:
+                byte_offset = start
+                break
+            row_count += self.ranges[i].get('input_row_count', 0)
+        state = {'input': self.input_info, 'byte_ranges': self.byte_ranges, 'byte_offset': byte_offset,
+                 'input_row_count': row_count, 'ranges': self.ranges}
+        tmp_file_path = self.file_path + '.tmp'
+        with open(tmp_file_path, mode='w', encoding='utf-8') as checkpoint_file:
+            json.dump(state, checkpoint_file, default=str)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(tmp_file_path, self.file_path)
+
+    def remove(self):
+        """Removes the work folder once the conversion is complete."""
+        shutil.rmtree(self.dir_path, ignore_errors=True)
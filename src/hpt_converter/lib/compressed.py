@@ -0,0 +1,195 @@
+import io
+import os
+import queue
+import threading
+import zipfile
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+import pyarrow as pa
+
+# codecs of compressed files, decompressed by pyarrow.
+COMPRESSION_CODECS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}
+ARCHIVE_SUFFIX = '.zip'
+# separates an archive from a file in it, e.g. `mrfs.zip!hospital_a.csv`.
+ARCHIVE_MEMBER_SEPARATOR = '!'
+READ_AHEAD_CHUNK_SIZE = 8 << 20
+READ_AHEAD_CHUNKS = 4
+
+
+def split_archive_path(path) -> Tuple[str, Optional[str]]:
+    """Splits `<archive>.zip!<member>` into the archive path and the member name. Other paths have no member."""
+    path = str(path)
+    archive_path, separator, member = path.partition(ARCHIVE_MEMBER_SEPARATOR)
+    if separator and archive_path.lower().endswith(ARCHIVE_SUFFIX):
+        return archive_path, member
+    return path, None
+
+
+def is_compressed(path) -> bool:
+    """Returns True if the file is compressed or in an archive, and can only be read sequentially."""
+    file_path, _ = split_archive_path(path)
+    suffix = os.path.splitext(file_path)[1].lower()
+    return suffix in COMPRESSION_CODECS or suffix == ARCHIVE_SUFFIX
+
+
+def list_archive_members(archive_path: str, suffix: str = '.csv') -> List[str]:
+    """Returns `<archive>!<member>` paths of the files in a zip archive with the suffix."""
+    with zipfile.ZipFile(archive_path) as archive:
+        return [f'{archive_path}{ARCHIVE_MEMBER_SEPARATOR}{info.filename}' for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(suffix)]
+
+
+def _get_archive_member(archive: zipfile.ZipFile, member: Optional[str], archive_path: str) -> zipfile.ZipInfo:
+    if member:
+        return archive.getinfo(member)
+    infos = [info for info in archive.infolist() if not info.is_dir()]
+    if len(infos) != 1:
+        raise ValueError(f"Archive({archive_path}) has {len(infos)} files, select one as "
+                         f"<archive>{ARCHIVE_MEMBER_SEPARATOR}<file>: {[info.filename for info in infos]}")
+    return infos[0]
+
+
+def get_input_size(path) -> int:
+    """Returns the size of an input file on disk, or the compressed size of a file in an archive."""
+    file_path, member = split_archive_path(path)
+    if os.path.splitext(file_path)[1].lower() != ARCHIVE_SUFFIX:
+        return os.path.getsize(file_path)
+    with zipfile.ZipFile(file_path) as archive:
+        return _get_archive_member(archive, member, file_path).compress_size
+
+
+def estimate_uncompressed_size(path, sample_size: int = READ_AHEAD_CHUNK_SIZE) -> int:
+    """Returns the size of the uncompressed content of an input file. It is exact for plain files and files in zip
+    archives, whose size is recorded in the archive, and estimated from the compression ratio of the first
+    `sample_size` bytes for other compressed files, whose size is only known once decompressed.
+
+    Args:
+        path (str): path to the file, or `<archive>.zip!<member>`.
+        sample_size (int): number of uncompressed bytes to read to estimate the compression ratio.
+    Returns:
+        int: number of bytes.
+    """
+    file_path, member = split_archive_path(path)
+    suffix = os.path.splitext(file_path)[1].lower()
+    if suffix == ARCHIVE_SUFFIX:
+        with zipfile.ZipFile(file_path) as archive:
+            return _get_archive_member(archive, member, file_path).file_size
+    if suffix not in COMPRESSION_CODECS:
+        return os.path.getsize(file_path)
+    with pa.OSFile(file_path) as raw:
+        stream = pa.CompressedInputStream(raw, COMPRESSION_CODECS[suffix])
+        size = len(stream.read(sample_size))
+        if size < sample_size:
+            return size
+        return int(size * os.path.getsize(file_path) / max(raw.tell(), 1))
+
+
+class ReadAheadFile(io.RawIOBase):
+    """Read-only binary stream that reads chunks of another stream on a background thread, so that decompression,
+    which releases the GIL, overlaps with parsing. At most `chunks` chunks are buffered.
+    `tell()` is the position in the input file of the data returned so far, as reported by `position`.
+    """
+    def __init__(self, stream: BinaryIO, position: Callable[[], int], chunk_size: int = READ_AHEAD_CHUNK_SIZE,
+                 chunks: int = READ_AHEAD_CHUNKS):
+        super().__init__()
+        self.stream = stream
+        self.queue = queue.Queue(maxsize=chunks)
+        self.closing = threading.Event()
+        self.chunk = memoryview(b'')
+        self.position = 0
+        self.eof = False
+        self.thread = threading.Thread(target=self._read_ahead, args=(position, chunk_size), daemon=True)
+        self.thread.start()
+
+    def _put(self, item) -> bool:
+        while not self.closing.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_ahead(self, position: Callable[[], int], chunk_size: int):
+        try:
+            while True:
+                data = self.stream.read(chunk_size)
+                if not self._put((data, position())) or not data:
+                    return
+        except Exception as e:
+            self._put((e, None))
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.chunk:
+            if self.eof:
+                return 0
+            data, position = self.queue.get()
+            if isinstance(data, Exception):
+                self.eof = True
+                raise data
+            if not data:
+                self.eof = True
+                return 0
+            self.chunk, self.position = memoryview(data), position
+        size = min(len(buffer), len(self.chunk))
+        buffer[:size] = self.chunk[:size]
+        self.chunk = self.chunk[size:]
+        return size
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.closing.set()
+            self.thread.join()
+            self.stream.close()
+        super().close()
+
+
+def skip_bytes(stream: BinaryIO, size: int):
+    """Moves a stream forward by `size` bytes, reading and discarding them if the stream can't seek."""
+    if stream.seekable():
+        stream.seek(size, io.SEEK_CUR)
+        return
+    while size > 0:
+        skipped = len(stream.read(min(size, READ_AHEAD_CHUNK_SIZE)))
+        if not skipped:
+            return
+        size -= skipped
+
+
+def open_input(path, read_ahead: bool = False) -> BinaryIO:
+    """Opens an input file for reading bytes, decompressing `.gz`, `.zst` and `.bz2` files and files in zip
+    archives as they are read. A zip archive can be given by itself if it has a single file.
+
+    Args:
+        path (str): path to the file, or `<archive>.zip!<member>`.
+        read_ahead (bool): If True, a compressed file is decompressed on a background thread(see `ReadAheadFile`),
+            and `tell()` is the position in the compressed file. Plain files are read directly.
+    Returns:
+        BinaryIO: binary stream of the uncompressed content.
+    Raises:
+        ValueError: If an archive without member has more than one file.
+    """
+    file_path, member = split_archive_path(path)
+    suffix = os.path.splitext(file_path)[1].lower()
+    if suffix in COMPRESSION_CODECS:
+        raw = pa.OSFile(file_path)
+        stream = pa.CompressedInputStream(raw, COMPRESSION_CODECS[suffix])
+        if not read_ahead:
+            return io.BufferedReader(stream)
+        return ReadAheadFile(stream, raw.tell)
+    if suffix == ARCHIVE_SUFFIX:
+        # the archive file stays open until the member is closed.
+        with zipfile.ZipFile(file_path) as archive:
+            info = _get_archive_member(archive, member, file_path)
+            stream = archive.open(info)
+        if not read_ahead:
+            return stream
+        # position in the compressed data, estimated from the position in the uncompressed data.
+        return ReadAheadFile(stream, lambda: info.compress_size * stream.tell() // max(info.file_size, 1))
+    return open(file_path, mode='rb')
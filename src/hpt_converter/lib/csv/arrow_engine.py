@@ -0,0 +1,442 @@
+import mmap
+from decimal import Decimal
+from typing import Annotated, Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from pydantic import BaseModel, TypeAdapter
+
+from hpt_converter.lib.compressed import (is_compressed, open_input,
+                                          skip_bytes)
+from hpt_converter.lib.csv.utils import (ByteRangeFile, CsvPrelude,
+                                         normalize_header_fields, read_prelude)
+from hpt_converter.lib.schema.abstract.v1 import PayerPlan, StandardCharge
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    CODE_INFORMATION_TYPE, PRICE_TYPE, STANDARD_CHARGE_SCHEMA)
+from hpt_converter.lib.schema.abstract.v1.standard_charge import (
+    CodeType, DrugTypeOfMeasument, Setting, StandardChargeMethod)
+from hpt_converter.lib.schema.csv import CsvType
+from hpt_converter.lib.schema.csv.v2.standard_charge import (
+    WidePayerPlanFields, get_code_columns, get_payer_plan_columns)
+
+DEFAULT_BLOCK_SIZE = 16 << 20   # bytes of CSV per record batch
+
+DECIMAL_FIELDS = [name for name, field in StandardCharge.model_fields.items() if field.annotation == Optional[Decimal]]
+ENUM_FIELDS = {
+    'setting': Setting,
+    'drug_type_of_measurement': DrugTypeOfMeasument,
+    'methodology': StandardChargeMethod
+}
+
+_CODE_TYPES = pa.array([member.value for member in CodeType])
+
+_PLAIN_DECIMAL_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)$'
+_DECIMAL_PARTS_PATTERN = r'^[+-]?(?P<integer>\d*)\.?(?P<fraction>\d*)$'
+
+
+def open_standard_charge_reader(csv_file_path, block_size: int = DEFAULT_BLOCK_SIZE,
+                                byte_range: Optional[Tuple[int, int]] = None,
+                                invalid_row_handler: Optional[Callable] = None,
+                                prelude: Optional[CsvPrelude] = None,
+                                mapping: Optional[mmap.mmap] = None) -> Tuple[List[str], pa_csv.CSVStreamingReader, pa.NativeFile]:
+    """Opens a streaming reader over the standard charge rows of a CSV file.
+    Every column is read as a non-nullable string so that the conversion rules of the raw model can be applied
+    by compute kernels afterwards.
+
+    Args:
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
+        block_size (int): Number of bytes to parse into each record batch.
+        byte_range (Tuple[int, int]): If given, only the rows in [start, end) byte range are read(see `split_byte_ranges`).
+        invalid_row_handler (Callable): If given, called with each row that doesn't have as many columns as the header,
+            and returns 'skip' or 'error'(see `pyarrow.csv.ParseOptions`).
+        prelude (CsvPrelude): prelude of the file, if already read.
+        mapping (mmap.mmap): If given, record batches are parsed from zero-copy buffers of this memory map of the file.
+    Returns:
+        Tuple[List[str], CSVStreamingReader, NativeFile]: The raw header fields, the record batch reader and its source,
+            whose `tell()` is the offset in the file read so far, including read-ahead. The offset of a compressed file
+            is in the compressed data.
+    """
+    prelude = prelude or read_prelude(csv_file_path, mapping)
+    if mapping is not None:
+        start, end = byte_range or (prelude.data_offset, len(mapping))
+        source = pa.BufferReader(pa.py_buffer(mapping).slice(0, end))
+        source.seek(start)
+    elif byte_range:
+        source = pa.PythonFile(ByteRangeFile(csv_file_path, *byte_range), mode='r')
+    elif is_compressed(csv_file_path):
+        input_file = open_input(csv_file_path, read_ahead=True)
+        skip_bytes(input_file, prelude.data_offset)
+        source = pa.PythonFile(input_file, mode='r')
+    else:
+        source = pa.OSFile(str(csv_file_path))
+        source.seek(prelude.data_offset)
+    header = prelude.header
+    reader = pa_csv.open_csv(source, **get_csv_options(header, block_size, invalid_row_handler))
+    return header, reader, source
+
+
+def get_csv_options(header: List[str], block_size: int = DEFAULT_BLOCK_SIZE,
+                    invalid_row_handler: Optional[Callable] = None) -> Dict[str, Any]:
+    """Returns the options of `pyarrow.csv` readers of standard charge rows, which read every column
+    as a non-nullable string(see `open_standard_charge_reader`)."""
+    return {
+        'read_options': pa_csv.ReadOptions(column_names=header, block_size=block_size),
+        'parse_options': pa_csv.ParseOptions(newlines_in_values=True, invalid_row_handler=invalid_row_handler),
+        'convert_options': pa_csv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                                 strings_can_be_null=False,
+                                                 quoted_strings_can_be_null=False),
+    }
+
+
+def _decimal_constraints(field_info) -> Tuple[Optional[int], Optional[int]]:
+    max_digits, decimal_places = None, None
+    for metadata in field_info.metadata:
+        max_digits = getattr(metadata, 'max_digits', None) or max_digits
+        decimal_places = getattr(metadata, 'decimal_places', None) or decimal_places
+    return max_digits, decimal_places
+
+
+def _decimal_parts(values: pa.Array) -> Tuple[pa.Array, pa.Array]:
+    parts = pc.extract_regex(values, _DECIMAL_PARTS_PATTERN)
+    return pc.struct_field(parts, 'integer'), pc.struct_field(parts, 'fraction')
+
+
+class RowErrors:
+    """Collects the first error of each invalid row of a block, instead of raising at the first invalid value.
+    Messages don't include line numbers, which are recorded along with them by the caller.
+    """
+    def __init__(self):
+        self.messages: Dict[int, str] = {}  # row index in the block -> error message
+
+    def __bool__(self) -> bool:
+        return bool(self.messages)
+
+    def add(self, row: int, message: str):
+        self.messages.setdefault(row, message)
+
+    def valid_mask(self, num_rows: int) -> pa.Array:
+        """Returns the boolean mask of rows without error."""
+        valid = np.ones(num_rows, dtype=bool)
+        valid[list(self.messages)] = False
+        return pa.array(valid)
+
+
+def raise_invalid(values: pa.Array, invalid: pa.Array, field_name: str, first_line: int,
+                  errors: Optional[RowErrors] = None):
+    """Raises ValueError for the first invalid value, or adds every invalid value to `errors` if given.
+
+    Args:
+        values (pa.Array): values of the field, one per row.
+        invalid (pa.Array): boolean mask of invalid values.
+        field_name (str): name of the field.
+        first_line (int): row number of the first value.
+        errors (RowErrors): If given, errors are collected instead of raised.
+    """
+    if errors is None:
+        index = pc.index(invalid, True).as_py()
+        raise ValueError(f"Invalid {field_name} value({values[index].as_py()!r}) at line {first_line + index}")
+    for index in np.flatnonzero(pc.fill_null(invalid, False).to_numpy(zero_copy_only=False)):
+        index = int(index)
+        errors.add(index, f"Invalid {field_name} value({values[index].as_py()!r})")
+
+
+def validate_enum(values: pa.Array, field_name: str, first_line: int, errors: Optional[RowErrors] = None) -> pa.Array:
+    """Validates the values of an enum field of `StandardCharge` the way its validators do.
+
+    Args:
+        values (pa.Array): string values of the field.
+        field_name (str): one of `ENUM_FIELDS`.
+        first_line (int): row number of the first value, used in the error message.
+        errors (RowErrors): If given, invalid values are collected in it instead of raised.
+    Returns:
+        pa.Array: validated values, with blank values as null.
+    Raises:
+        ValueError: If there is a value that is not a member of the enum.
+    """
+    if field_name == 'drug_type_of_measurement':
+        values = pc.utf8_lower(pc.if_else(pc.equal(values, ''), pa.scalar(None, pa.string()), values))
+    elif field_name == 'methodology':
+        values = pc.if_else(pc.equal(values, ''), pa.scalar(None, pa.string()), values)
+    value_set = pa.array([member.value for member in ENUM_FIELDS[field_name]])
+    invalid = pc.and_(pc.is_valid(values), pc.invert(pc.is_in(values, value_set=value_set)))
+    if pc.any(invalid).as_py():
+        raise_invalid(values, invalid, field_name, first_line, errors)
+    return values
+
+
+def to_string_array(values: List) -> pa.Array:
+    """Converts field values of pydantic models into the string representation used by transformed standard charges.
+
+    Args:
+        values (List): str, StrEnum, Decimal or None values.
+    Returns:
+        pa.Array: string array with decimals in plain notation.
+    """
+    return pa.array([format(value, 'f') if isinstance(value, Decimal) else value for value in values], pa.string())
+
+
+def create_codes_array(codes: List[Optional[pa.Array]], code_types: List[Optional[pa.Array]], num_rows: int,
+                       first_line: int, errors: Optional[RowErrors] = None) -> pa.Array:
+    """Combines "code|<n>" and "code|<n>|type" columns into a list of code information per row.
+    Pairs with a blank code are skipped.
+
+    Args:
+        codes (List[pa.Array]): string columns of codes in the order of <n>. A missing column is None.
+        code_types (List[pa.Array]): string columns of code types in the same order.
+        num_rows (int): number of rows.
+        first_line (int): row number of the first row, used in the error message.
+        errors (RowErrors): If given, invalid code types are collected in it instead of raised.
+    Returns:
+        pa.Array: list of `CODE_INFORMATION_TYPE` per row.
+    Raises:
+        ValueError: If the type of a code is not a member of `CodeType`.
+    """
+    pair_count = len(codes)
+    blank = pa.repeat(pa.scalar('', pa.string()), num_rows)
+    codes = pa.concat_arrays([pc.utf8_trim_whitespace(pc.fill_null(code if code is not None else blank, ''))
+                              for code in codes] or [pa.array([], pa.string())])
+    code_types = pa.concat_arrays([pc.fill_null(code_type if code_type is not None else blank, '')
+                                   for code_type in code_types] or [pa.array([], pa.string())])
+    # pair columns are concatenated, so the value of (row, pair) is at pair * num_rows + row.
+    pair_indices = (np.arange(pair_count)[np.newaxis, :] * num_rows + np.arange(num_rows)[:, np.newaxis]).ravel()
+    present = pc.not_equal(codes, '').to_numpy(zero_copy_only=False)[pair_indices]
+    indices = pa.array(pair_indices[present])
+    codes, code_types = codes.take(indices), code_types.take(indices)
+
+    invalid = pc.invert(pc.is_in(code_types, value_set=_CODE_TYPES))
+    if pc.any(invalid).as_py():
+        # code types of (row, pair) are in row order, so are the rows of invalid values.
+        rows = np.flatnonzero(present) // pair_count
+        for index in (np.flatnonzero(invalid.to_numpy(zero_copy_only=False)) if errors is not None
+                      else [pc.index(invalid, True).as_py()]):
+            row = int(rows[index])
+            message = f"Invalid code_type value({code_types[int(index)].as_py()!r})"
+            if errors is None:
+                raise ValueError(f"{message} at line {first_line + row}")
+            errors.add(row, message)
+    offsets = np.zeros(num_rows + 1, dtype=np.int32)
+    np.cumsum(present.reshape(num_rows, pair_count).sum(axis=1), out=offsets[1:])
+    return pa.ListArray.from_arrays(pa.array(offsets),
+                                    pa.StructArray.from_arrays([codes, code_types], fields=list(CODE_INFORMATION_TYPE)))
+
+
+def unpivot_payer_plans(base_columns: Dict[str, pa.Array], payer_plan_columns: Dict[str, List[pa.Array]],
+                        plan_ids: List[str], num_rows: int) -> Dict[str, pa.Array]:
+    """Unpivots a block of wide format rows into one row per (row, payer plan), in the order of rows then payer plans.
+
+    Args:
+        base_columns (dict): columns shared by all payer plans of a row, each of `num_rows` length.
+        payer_plan_columns (dict): for each payer plan specific field, one column per payer plan.
+        plan_ids (List[str]): plan ids in the same order as the columns in `payer_plan_columns`.
+        num_rows (int): number of rows in the block.
+    Returns:
+        dict: columns of `num_rows * len(plan_ids)` length, including 'plan_id'.
+    """
+    plan_count = len(plan_ids)
+    row_indices = pa.array(np.repeat(np.arange(num_rows), plan_count))
+    columns = {name: column.take(row_indices) for name, column in base_columns.items()}
+    # payer plan columns are concatenated, so the value of (row, plan) is at plan * num_rows + row.
+    plan_indices = pa.array((np.arange(plan_count)[np.newaxis, :] * num_rows + np.arange(num_rows)[:, np.newaxis]).ravel())
+    for name, per_plan in payer_plan_columns.items():
+        columns[name] = pa.concat_arrays(per_plan).take(plan_indices) if per_plan else pa.nulls(0, pa.string())
+    columns['plan_id'] = pa.array(plan_ids, pa.string()).take(pa.array(np.tile(np.arange(plan_count), num_rows)))
+    return columns
+
+
+def create_standard_charge_table(columns: Dict[str, pa.Array], file_id: str) -> pa.Table:
+    """Creates a table of standard charges in `STANDARD_CHARGE_SCHEMA`.
+
+    Args:
+        columns (dict): string columns keyed by `StandardCharge` field name, including 'plan_id',
+            with prices as plain decimal strings, and optionally a 'codes' column of `CODE_INFORMATION_TYPE` lists.
+            Missing fields are null, and missing codes are empty lists.
+        file_id (str): unique id of input file.
+    Returns:
+        pa.Table: standard charges.
+    Raises:
+        ValueError: If a column can't be cast to the type of its field.
+    """
+    num_rows = len(columns['plan_id'])
+    arrays = []
+    for field in STANDARD_CHARGE_SCHEMA:
+        if field.name == 'file_id':
+            arrays.append(pa.repeat(pa.scalar(file_id, pa.string()), num_rows))
+        elif field.name == 'codes' and 'codes' not in columns:
+            arrays.append(pa.ListArray.from_arrays(pa.array(np.zeros(num_rows + 1, dtype=np.int32)),
+                                                   pa.array([], CODE_INFORMATION_TYPE)))
+        elif field.name in columns:
+            try:
+                arrays.append(columns[field.name].cast(field.type))
+            except pa.ArrowInvalid as e:
+                # values are validated before, so this is a value that passed validation but doesn't fit the type.
+                raise ValueError(f"Invalid {field.name} values for {field.type}: {e}") from e
+        else:
+            arrays.append(pa.nulls(num_rows, field.type))
+    return pa.Table.from_arrays(arrays, schema=STANDARD_CHARGE_SCHEMA)
+
+
+class StandardChargeTransformer:
+    """Transforms record batches of raw standard charge rows into abstract `StandardCharge` rows with
+    compute kernels. The rules mirror `Csv2Parquet.split_raw_standard_charge` applied to instances of
+    the dynamic model, including which header fields contribute to the output.
+    """
+    def __init__(self, sc_model: BaseModel, header: List[str], csv_type: CsvType, file_id: str):
+        self.sc_model = sc_model
+        self.csv_type = csv_type
+        self.file_id = file_id
+        self.rows_seen = 0
+        # like csv.DictReader, the last column wins when a header field is repeated.
+        self.column_index = {name: index for index, name in enumerate(header)}
+        self.decimal_fields = {name: field_info for name, field_info in sc_model.model_fields.items()
+                               if name in self.column_index and field_info.annotation in (Decimal, Optional[Decimal])}
+
+        for name, field_info in sc_model.model_fields.items():
+            if field_info.is_required() and name not in self.column_index:
+                raise ValueError(f"Standard charge header is missing required field({name})")
+
+        # abstract field -> raw model field, populated by alias or by name.
+        self.field_sources = {}
+        for name, field_info in StandardCharge.model_fields.items():
+            if name in ('file_id', 'plan_id', 'codes'):
+                continue
+            if field_info.alias in sc_model.model_fields:
+                self.field_sources[name] = field_info.alias
+            elif name in sc_model.model_fields:
+                self.field_sources[name] = name
+
+        self.code_columns = get_code_columns(sc_model.model_fields)
+        self.payer_plan_columns = {}
+        self.payer_plans: List[PayerPlan] = []
+        if csv_type == CsvType.WIDE:
+            # in the order of this file's header, since files with reordered headers share a cached model.
+            self.payer_plan_columns = get_payer_plan_columns(normalize_header_fields(header))
+            self.payer_plans = [PayerPlan(file_id=file_id, payer_name=payer_name, plan_name=plan_name)
+                                for payer_name, plan_name in self.payer_plan_columns]
+            for name in WidePayerPlanFields:
+                self.field_sources.pop(name, None)
+
+    def _validate_decimal(self, column: pa.Array, field_name: str, field_info=None,
+                          errors: Optional[RowErrors] = None) -> pa.Array:
+        """Validates decimal strings and returns them as plain decimal strings, with blank values as null.
+        If `errors` is given, invalid values are collected in it and left as they are.
+        """
+        values = pc.utf8_trim_whitespace(pc.if_else(pc.equal(column, ''), pa.scalar(None, pa.string()), column))
+        plain = pc.match_substring_regex(values, _PLAIN_DECIMAL_PATTERN)
+        max_digits, decimal_places = _decimal_constraints(field_info) if field_info else (None, None)
+        # a price without constraints is still checked against the type it is cast to, so that it can't fail the cast.
+        max_digits = max_digits or PRICE_TYPE.precision
+        decimal_places = decimal_places if decimal_places is not None else PRICE_TYPE.scale
+        if not pc.all(plain).as_py():
+            # rare notations(e.g. exponent) are validated by pydantic and rewritten in plain notation.
+            metadata = field_info.metadata if field_info else []
+            adapter = TypeAdapter(Annotated[Decimal, *metadata] if metadata else Decimal)
+            rewritten = []
+            for index, (value, is_plain) in enumerate(zip(values.to_pylist(), plain.to_pylist())):
+                if value is not None and not is_plain:
+                    try:
+                        value = format(adapter.validate_python(value), 'f')
+                    except ValueError as e:
+                        if errors is None:
+                            raise ValueError(f"Invalid {field_name} value({value!r}) at line {self.rows_seen + index + 1}: {e}")
+                        errors.add(index, f"Invalid {field_name} value({value!r}): {e}")
+                rewritten.append(value)
+            values = pa.array(rewritten, pa.string())
+
+        # same checks as pydantic, which applies them to the normalized value.
+        integer, fraction = _decimal_parts(values)
+        fraction = pc.utf8_rtrim(fraction, '0')
+        decimals = pc.utf8_length(fraction)
+        digits = pc.if_else(pc.equal(decimals, 0),
+                            pc.max_element_wise(pc.utf8_length(pc.utf8_ltrim(integer, '0')), 1),
+                            pc.max_element_wise(pc.utf8_length(pc.utf8_ltrim(pc.binary_join_element_wise(integer, fraction, ''), '0')),
+                                                decimals))
+        invalid = pc.or_(pc.greater(digits, max_digits),
+                         pc.or_(pc.greater(decimals, decimal_places),
+                                pc.greater(pc.subtract(digits, decimals), max_digits - decimal_places)))
+        if pc.any(invalid).as_py():
+            raise_invalid(values, pc.fill_null(invalid, False), field_name, self.rows_seen + 1, errors)
+        return values
+
+    def _raw_columns(self, batch: pa.RecordBatch, errors: Optional[RowErrors]) -> Dict[str, pa.Array]:
+        columns = {}
+        for name in self.sc_model.model_fields:
+            index = self.column_index.get(name)
+            if index is None:
+                continue
+            column = batch.column(index)
+            if name in self.decimal_fields:
+                column = self._validate_decimal(column, name, self.decimal_fields[name], errors)
+            columns[name] = column
+        return columns
+
+    def _abstract_column(self, raw_columns: Dict[str, pa.Array], field_name: str, source: Optional[str], num_rows: int,
+                         errors: Optional[RowErrors]) -> pa.Array:
+        column = raw_columns.get(source) if source else None
+        if column is None:
+            return pa.nulls(num_rows, pa.string())
+        if field_name in ENUM_FIELDS:
+            return validate_enum(column, field_name, self.rows_seen + 1, errors)
+        if field_name in DECIMAL_FIELDS and source not in self.decimal_fields:
+            return self._validate_decimal(column, field_name, errors=errors)
+        return column
+
+    def _codes_column(self, raw_columns: Dict[str, pa.Array], num_rows: int, errors: Optional[RowErrors]) -> pa.Array:
+        return create_codes_array([raw_columns.get(code) for code, _ in self.code_columns],
+                                  [raw_columns.get(code_type) for _, code_type in self.code_columns],
+                                  num_rows, self.rows_seen + 1, errors)
+
+    def _transform_tall(self, raw_columns: Dict[str, pa.Array], num_rows: int,
+                        errors: Optional[RowErrors]) -> Tuple[Dict[str, pa.Array], List[PayerPlan]]:
+        payer_name, plan_name = raw_columns.get('payer_name'), raw_columns.get('plan_name')
+        if payer_name is None or plan_name is None:
+            raise ValueError("Tall standard charge requires both payer_name and plan_name columns")
+        # plan id is derived from "<payer>-<plan>", so rows sharing that key share a payer plan.
+        # dictionary indices are assigned in the order of appearance, so are the payer plans.
+        keys = pc.binary_join_element_wise(payer_name, plan_name, '-').dictionary_encode()
+        _, first_rows = np.unique(keys.indices.to_numpy(), return_index=True)
+        payer_plans = [PayerPlan(file_id=self.file_id, payer_name=payer_name[int(row)].as_py(), plan_name=plan_name[int(row)].as_py())
+                       for row in first_rows]
+        columns = {name: self._abstract_column(raw_columns, name, source, num_rows, errors)
+                   for name, source in self.field_sources.items()}
+        columns['codes'] = self._codes_column(raw_columns, num_rows, errors)
+        columns['plan_id'] = pa.array([pp.plan_id for pp in payer_plans], pa.string()).take(keys.indices)
+        return columns, payer_plans
+
+    def _transform_wide(self, raw_columns: Dict[str, pa.Array], num_rows: int,
+                        errors: Optional[RowErrors]) -> Tuple[Dict[str, pa.Array], List[PayerPlan]]:
+        base_columns = {name: self._abstract_column(raw_columns, name, source, num_rows, errors)
+                        for name, source in self.field_sources.items()}
+        base_columns['codes'] = self._codes_column(raw_columns, num_rows, errors)
+        payer_plan_columns = {name: [self._abstract_column(raw_columns, name, columns[name], num_rows, errors)
+                                     for columns in self.payer_plan_columns.values()]
+                              for name in WidePayerPlanFields}
+        columns = unpivot_payer_plans(base_columns, payer_plan_columns, [pp.plan_id for pp in self.payer_plans], num_rows)
+        return columns, self.payer_plans if num_rows else []
+
+    def _transform(self, batch: pa.RecordBatch, errors: Optional[RowErrors]) -> Tuple[Dict[str, pa.Array], List[PayerPlan]]:
+        raw_columns = self._raw_columns(batch, errors)
+        if self.csv_type == CsvType.TALL:
+            return self._transform_tall(raw_columns, batch.num_rows, errors)
+        return self._transform_wide(raw_columns, batch.num_rows, errors)
+
+    def transform(self, batch: pa.RecordBatch, errors: Optional[RowErrors] = None) -> Tuple[pa.Table, List[PayerPlan]]:
+        """Transforms a record batch of raw standard charge rows.
+
+        Args:
+            batch (pa.RecordBatch): raw rows read by `open_standard_charge_reader`.
+            errors (RowErrors): If given, rows with invalid values are collected in it and left out of the output,
+                instead of raising ValueError. Only a batch with invalid rows is transformed again without them.
+        Returns:
+            Tuple[pa.Table, List[PayerPlan]]: standard charges in `STANDARD_CHARGE_SCHEMA`,
+                and the payer plans found in the batch.
+        Raises:
+            ValueError: If a row has an invalid value.
+        """
+        num_rows = batch.num_rows
+        columns, payer_plans = self._transform(batch, errors)
+        if errors:
+            columns, payer_plans = self._transform(batch.filter(errors.valid_mask(num_rows)), None)
+        self.rows_seen += num_rows
+        return create_standard_charge_table(columns, self.file_id), payer_plans
@@ -0,0 +1,148 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from hpt_converter.lib.compressed import (estimate_uncompressed_size,
+                                          get_input_size, is_compressed)
+from hpt_converter.lib.csv.arrow_engine import (DEFAULT_BLOCK_SIZE, RowErrors,
+                                                StandardChargeTransformer,
+                                                get_csv_options)
+from hpt_converter.lib.csv.utils import read_prelude, read_samples
+from hpt_converter.lib.schema.csv import CsvType
+from hpt_converter.lib.schema.csv.v2.standard_charge import (
+    StandardChargeModelCache, create_standard_charge_model)
+from hpt_converter.lib.writer import DEFAULT_ROW_GROUP_SIZE
+
+DEFAULT_SAMPLES = 8
+DEFAULT_SAMPLE_SIZE = 1 << 20
+
+
+@dataclass
+class CsvProfile:
+    """Profile of a CSV file estimated from samples of its rows(see `inspect_csv`). Estimates are for a conversion
+    with the arrow engine, the default row group size and one worker."""
+    csv_type: CsvType
+    compressed: bool
+    input_bytes: int                        # size on disk, compressed size of a compressed file
+    data_bytes: int                         # uncompressed bytes of standard charge rows, estimated if compressed
+    sample_count: int
+    sampled_bytes: int
+    sampled_row_count: int
+    invalid_row_ratio: float                # sampled rows rejected by the parser or the conversion rules
+    estimated_row_count: int
+    standard_charges_per_row: float
+    estimated_standard_charge_count: int
+    plan_count: int
+    plan_count_exact: bool                  # False if plans are counted in samples of a tall file
+    estimated_output_bytes: int             # standard_charges.parquet with SNAPPY compression
+    estimated_buffered_bytes: int           # data held by a conversion(see `MemoryBudget`)
+    estimated_seconds: float
+    inspect_seconds: float = 0.0
+    blank_ratios: Dict[str, float] = field(default_factory=dict)   # blank values of each column in sampled rows
+
+
+def _read_sample(sample: bytes, header: List[str]) -> Tuple[pa.RecordBatch, int]:
+    """Parses the rows of a sample into a record batch, skipping rows without as many columns as the header.
+    Returns the record batch and the number of rows skipped."""
+    skipped_rows = []
+
+    def _skip_invalid_row(row) -> str:
+        skipped_rows.append(row)
+        return 'skip'
+
+    table = pa_csv.read_csv(pa.BufferReader(sample), **get_csv_options(header, DEFAULT_BLOCK_SIZE, _skip_invalid_row))
+    return pa.RecordBatch.from_struct_array(table.to_struct_array().combine_chunks()), len(skipped_rows)
+
+
+def inspect_csv(csv_file_path, num_samples: int = DEFAULT_SAMPLES, sample_size: int = DEFAULT_SAMPLE_SIZE,
+                model_cache: Optional[StandardChargeModelCache] = None) -> CsvProfile:
+    """Profiles a CSV file in seconds, however large it is, by reading its prelude and samples of its rows
+    (see `read_samples`). Samples are parsed, transformed and written to parquet in memory the way the arrow engine
+    converts blocks, and the counts, sizes and time are scaled from the sampled bytes to the whole file.
+
+    Args:
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
+        num_samples (int): number of samples spread across a plain file.
+        sample_size (int): maximum number of bytes of a sample.
+        model_cache (StandardChargeModelCache): cache of models. Default is `MODEL_CACHE`.
+    Returns:
+        CsvProfile: profile of the file.
+    Raises:
+        ValueError: If the prelude or the header of the file is invalid.
+    """
+    started = time.perf_counter()
+    prelude = read_prelude(csv_file_path)
+    csv_type = prelude.csv_type
+    header = prelude.header
+    compressed = is_compressed(csv_file_path)
+    data_bytes = max(0, estimate_uncompressed_size(csv_file_path) - prelude.data_offset)
+    samples = read_samples(csv_file_path, prelude.data_offset, num_samples, sample_size)
+
+    sc_model = create_standard_charge_model(csv_file_path, model_cache, header)
+    transformer = StandardChargeTransformer(sc_model, header, csv_type, '')
+    blank_counts = [0] * len(header)
+    sampled_bytes = row_count = valid_count = standard_charge_count = 0
+    plan_ids = set()
+    tables = []
+    arrow_bytes = 0
+    transform_seconds = 0.0
+    for sample in samples:
+        transform_started = time.perf_counter()
+        batch, skipped_count = _read_sample(sample, header)
+        errors = RowErrors()
+        table, _ = transformer.transform(batch, errors)
+        transform_seconds += time.perf_counter() - transform_started
+        sampled_bytes += len(sample)
+        row_count += batch.num_rows + skipped_count
+        valid_count += batch.num_rows - len(errors.messages)
+        standard_charge_count += table.num_rows
+        arrow_bytes += batch.nbytes + table.nbytes
+        for i, column in enumerate(batch.columns):
+            blank_counts[i] += pc.sum(pc.equal(pc.utf8_trim_whitespace(column), '')).as_py() or 0
+        plan_ids.update(pc.unique(table['plan_id']).drop_null().to_pylist())
+        tables.append(table)
+
+    output_bytes = 0
+    if tables and standard_charge_count:
+        write_started = time.perf_counter()
+        sink = pa.BufferOutputStream()
+        pq.write_table(pa.concat_tables(tables), sink, compression='SNAPPY')
+        output_bytes = sink.tell()
+        transform_seconds += time.perf_counter() - write_started
+
+    scale = data_bytes / sampled_bytes if sampled_bytes else 0.0
+    estimated_row_count = int(row_count * scale)
+    standard_charges_per_row = standard_charge_count / valid_count if valid_count else 0.0
+    estimated_standard_charge_count = int(standard_charge_count * scale)
+    if csv_type == CsvType.WIDE:
+        plan_count, plan_count_exact = len(transformer.payer_plans), True
+    else:
+        plan_count, plan_count_exact = len(plan_ids), False
+    bytes_per_standard_charge = arrow_bytes / standard_charge_count if standard_charge_count else 0.0
+    # a block being parsed and transformed, and the standard charges buffered until a row group is written.
+    block_bytes = arrow_bytes / sampled_bytes * min(DEFAULT_BLOCK_SIZE, data_bytes) if sampled_bytes else 0
+    row_group_bytes = bytes_per_standard_charge * min(DEFAULT_ROW_GROUP_SIZE, estimated_standard_charge_count)
+    return CsvProfile(
+        csv_type=csv_type,
+        compressed=compressed,
+        input_bytes=get_input_size(csv_file_path),
+        data_bytes=data_bytes,
+        sample_count=len(samples),
+        sampled_bytes=sampled_bytes,
+        sampled_row_count=row_count,
+        invalid_row_ratio=1 - valid_count / row_count if row_count else 0.0,
+        estimated_row_count=estimated_row_count,
+        standard_charges_per_row=standard_charges_per_row,
+        estimated_standard_charge_count=estimated_standard_charge_count,
+        plan_count=plan_count,
+        plan_count_exact=plan_count_exact,
+        estimated_output_bytes=int(output_bytes * scale),
+        estimated_buffered_bytes=int(block_bytes + row_group_bytes),
+        estimated_seconds=transform_seconds * scale,
+        inspect_seconds=time.perf_counter() - started,
+        blank_ratios={name: count / row_count if row_count else 0.0 for name, count in zip(header, blank_counts)})
@@ -1,10 +1,17 @@
 import csv
+import io
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Set, Tuple
 
-from typing import Optional, Set
-
+from hpt_converter.lib.compressed import is_compressed, open_input, skip_bytes
 from hpt_converter.lib.schema.abstract.v1.general_data_elements import GeneralDataElements
 from hpt_converter.lib.schema.csv import CsvType
 
+READ_CHUNK_SIZE = 8 << 20
+
 
 def normalize_header(header: Set[str]) -> Set[str]:
     """Normalizes the header fields:
@@ -17,7 +24,18 @@ def normalize_header(header: Set[str]) -> Set[str]:
     Returns:
         Set[str]: Normalized set of header fields.
     """
-    return {x.lower().strip().replace(' | ', '|') for x in header}
+    return set(normalize_header_fields(header))
+
+
+def normalize_header_fields(header: Iterable[str]) -> List[str]:
+    """Normalizes the header fields like `normalize_header`, keeping the order of first appearance.
+
+    Args:
+        header (Iterable[str]): header fields from the CSV file.
+    Returns:
+        List[str]: Normalized header fields without duplicates.
+    """
+    return list(dict.fromkeys(x.lower().strip().replace(' | ', '|') for x in header))
 
 
 def get_csv_type(header: set[str]) -> CsvType:
@@ -38,50 +56,264 @@ def get_csv_type(header: set[str]) -> CsvType:
 
 
 
+@dataclass
+class CsvPrelude:
+    """The records that precede standard charge rows: the general data element header and values and the standard
+    charge header, with the byte offset of the first standard charge row in the uncompressed content.
+    It is read once per file(see `read_prelude`) and shared by the steps of a conversion.
+    """
+    general_header: List[str]
+    general_values: List[str]
+    header: List[str]
+    data_offset: int
+
+    @property
+    def csv_type(self) -> CsvType:
+        return get_csv_type(self.header)
+
+    @property
+    def general_data_elements(self) -> GeneralDataElements:
+        return create_general_data_elements(self.general_header, self.general_values)
+
+
+def read_prelude(csv_file_path, mapping: Optional[mmap.mmap] = None) -> CsvPrelude:
+    """Reads the first 3 records of a CSV file. The two general data element lines may contain quoted line breaks,
+    so the offset of standard charge rows is found by parsing the records rather than by counting lines.
+
+    Args:
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
+        mapping (mmap.mmap): If given, the records are read from this memory map of the file instead.
+    Returns:
+        CsvPrelude: the prelude of the file.
+    Raises:
+        ValueError: If the CSV file is missing standard charge header line.
+    """
+    offset = 0
+
+    def _lines(readline: Callable[[], bytes]):
+        nonlocal offset
+        for line in iter(readline, b''):
+            offset += len(line)
+            yield line.decode('utf-8')
+
+    def _read_records(readline: Callable[[], bytes]) -> List[Optional[List[str]]]:
+        csv_reader = csv.reader(_lines(readline))
+        return [next(csv_reader, None) for _ in range(3)]
+
+    if mapping is not None:
+        mapping.seek(0)
+        records = _read_records(mapping.readline)
+    else:
+        with open_input(csv_file_path) as csv_file:
+            records = _read_records(csv_file.readline)
+    general_header, general_values, header = records
+    if not header:
+        raise ValueError(f"CSV file({csv_file_path}) is missing standard charge header line.")
+    return CsvPrelude(general_header, general_values or [], header, offset)
+
+
+def open_memory_map(csv_file_path) -> mmap.mmap:
+    """Maps a plain CSV file into memory read-only. The mapping stays valid after the file is closed."""
+    with open(csv_file_path, mode='rb') as csv_file:
+        return mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
 def infer_csv_type(csv_file_path) -> Optional[CsvType]:
     """Infers the type of CSV file (tall or wide) based on its header line.
 
     Args:
-        csv_file_path (str): Path to the CSV file.
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
     Returns:
         CsvType: The inferred type of the CSV file.
     Raises:
         ValueError: If the CSV file is missing or has an invalid standard charge header line.
     """
-    standard_charge_header = []
-    with open(csv_file_path, mode='r', newline='', encoding='utf-8') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        for _ in range(3):
-            standard_charge_header = next(csv_reader, None)
+    return read_prelude(csv_file_path).csv_type
 
-    if not standard_charge_header:
-        raise ValueError(f"CSV file({csv_file_path}) is missing standard charge header line.")
 
-    return get_csv_type(standard_charge_header)
+def read_standard_charge_header(csv_file_path) -> Tuple[List[str], int]:
+    """Reads the raw standard charge header line and locates the first standard charge row(see `read_prelude`).
+
+    Args:
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
+    Returns:
+        Tuple[List[str], int]: The raw header fields and the byte offset of the first standard charge row
+            in the uncompressed content.
+    Raises:
+        ValueError: If the CSV file is missing standard charge header line.
+    """
+    prelude = read_prelude(csv_file_path)
+    return prelude.header, prelude.data_offset
+
+
+def create_general_data_elements(general_header: List[str], general_values: List[str]) -> GeneralDataElements:
+    """Creates a GeneralDataElements instance from the first two records of a CSV file.
+
+    Args:
+        general_header (List[str]): general data element header fields.
+        general_values (List[str]): general data element values.
+    Returns:
+        GeneralDataElements: An instance of GeneralDataElements populated with data from the CSV file."""
+    header = [x for x in general_header if x != '']
+    elements = [x for x in general_values if x != '']
+    dict_elements = dict(zip(header, elements))
+
+    for key in list(dict_elements.keys()):
+        # rename affimation_statement key.
+        if key.lower().startswith('to the best of its knowledge and belief'):
+            dict_elements['affirmation_statement'] = dict_elements[key]
+            del dict_elements[key]
+        # transform license_number|<state> keys into a tuple
+        if key.lower().startswith('license_number|'):
+            state = key.split('|')[1].strip()
+            dict_elements['license_number'] = (dict_elements[key], state)
+            del dict_elements[key]
+
+    return GeneralDataElements(**dict_elements)
+
 
-        
 def read_general_data_elements(csv_file_path) -> GeneralDataElements:
     """Reads a CSV file and returns a GeneralDataElements instance.    
     Args:
-        csv_file_path (str): Path to the CSV file.
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
 
     Returns:
         GeneralDataElements: An instance of GeneralDataElements populated with data from the CSV file."""
-    with open(csv_file_path, mode='r', newline='', encoding='utf-8') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        header = [x for x in next(csv_reader, []) if x != '']
-        elements = [x for x in next(csv_reader, []) if x != '']
-        dict_elements = dict(zip(header, elements))
-
-        for key in list(dict_elements.keys()):
-            # rename affimation_statement key.
-            if key.lower().startswith('to the best of its knowledge and belief'):
-                dict_elements['affirmation_statement'] = dict_elements[key]
-                del dict_elements[key]
-            # transform license_number|<state> keys into a tuple
-            if key.lower().startswith('license_number|'):
-                state = key.split('|')[1].strip()
-                dict_elements['license_number'] = (dict_elements[key], state)
-                del dict_elements[key]
-
-        return GeneralDataElements(**dict_elements)
+    return read_prelude(csv_file_path).general_data_elements
+
+
+class ByteRangeFile(io.RawIOBase):
+    """Read-only binary file limited to [start, end) byte range of a file."""
+    def __init__(self, file_path, start: int, end: int):
+        super().__init__()
+        self.file = open(file_path, mode='rb')
+        self.file.seek(start)
+        self.position = start
+        self.remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        """Returns the offset of the next byte to read in the whole file."""
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        read = self.file.readinto(memoryview(buffer)[:size])
+        self.position += read
+        self.remaining -= read
+        return read
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def count_quotes(csv_file_path, start: int, end: int) -> int:
+    """Counts quote characters in [start, end) byte range of a file.
+
+    Args:
+        csv_file_path (str): Path to the CSV file.
+        start (int): byte offset of the range.
+        end (int): byte offset after the range.
+    Returns:
+        int: number of '"' in the range.
+    """
+    count = 0
+    with ByteRangeFile(csv_file_path, start, end) as range_file:
+        for chunk in iter(lambda: range_file.read(READ_CHUNK_SIZE), b''):
+            count += chunk.count(b'"')
+    return count
+
+
+def _find_record_start(csv_file_path, offset: int, end: int, in_quotes: bool) -> int:
+    """Returns the offset after the first line break at or after `offset` that is not inside a quoted field."""
+    with ByteRangeFile(csv_file_path, offset, end) as range_file:
+        position = offset
+        for chunk in iter(lambda: range_file.read(READ_CHUNK_SIZE), b''):
+            for match in re.finditer(b'["\n]', chunk):
+                if match.group() == b'"':
+                    in_quotes = not in_quotes
+                elif not in_quotes:
+                    return position + match.end()
+            position += len(chunk)
+    return end
+
+
+def split_byte_ranges(csv_file_path, start: int, end: int, num_ranges: int,
+                      map_function: Callable = map) -> List[Tuple[int, int]]:
+    """Splits [start, end) byte range of a CSV file into ranges of about the same size that begin and end at record
+    boundaries. A line break is a record boundary if it is preceded by an even number of quotes since `start`
+    (an escaped quote is a pair of quotes), so quoted fields with line breaks are never split.
+
+    Args:
+        csv_file_path (str): Path to the CSV file.
+        start (int): byte offset of the first record.
+        end (int): byte offset after the last record.
+        num_ranges (int): maximum number of ranges.
+        map_function (Callable): map-like function used to count quotes of each range, e.g. `Executor.map`.
+    Returns:
+        List[Tuple[int, int]]: non-empty byte ranges in file order.
+    """
+    size = end - start
+    num_ranges = max(1, min(num_ranges, size))
+    offsets = [start + size * i // num_ranges for i in range(num_ranges + 1)]
+    quote_counts = list(map_function(count_quotes, [csv_file_path] * num_ranges, offsets[:-1], offsets[1:]))
+
+    boundaries = [start]
+    quotes_before = 0
+    for offset, quote_count in zip(offsets[1:-1], quote_counts):
+        quotes_before += quote_count
+        boundaries.append(max(boundaries[-1], _find_record_start(csv_file_path, offset, end, quotes_before % 2 == 1)))
+    boundaries.append(end)
+    return [(range_start, range_end) for range_start, range_end in zip(boundaries[:-1], boundaries[1:])
+            if range_start < range_end]
+
+
+def read_samples(csv_file_path, data_offset: int, num_samples: int, sample_size: int) -> List[bytes]:
+    """Reads samples of the standard charge rows of a CSV file, each of whole records of at most `sample_size` bytes.
+    Samples of a plain file are spread evenly across [data_offset, end), and each but the first starts after a line
+    break, which is assumed to be outside quoted fields, so a sample may start with a partial record. A compressed
+    file can't be read at an offset, so its sample is the first `num_samples * sample_size` bytes of rows.
+
+    Args:
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
+        data_offset (int): byte offset of the first standard charge row(see `CsvPrelude`).
+        num_samples (int): number of samples of a plain file.
+        sample_size (int): maximum number of bytes of a sample.
+    Returns:
+        List[bytes]: non-empty samples in file order.
+    """
+    if is_compressed(csv_file_path):
+        with open_input(csv_file_path) as input_file:
+            skip_bytes(input_file, data_offset)
+            size = num_samples * sample_size
+            sample = input_file.read(size)
+            if len(sample) == size:
+                sample = sample[:sample.rfind(b'\n') + 1]
+        return [sample] if sample else []
+    end = os.path.getsize(csv_file_path)
+    num_samples = max(1, min(num_samples, (end - data_offset) // max(sample_size, 1)))
+    # the first sample starts at the first row and the last one ends at the end of the file.
+    span = max(0, end - data_offset - sample_size)
+    offsets = [data_offset + span * i // max(1, num_samples - 1) for i in range(num_samples)]
+    samples = []
+    previous_end = data_offset
+    for offset in offsets:
+        start = max(previous_end, offset)
+        with ByteRangeFile(csv_file_path, start, min(end, start + sample_size)) as range_file:
+            sample = range_file.read()
+        if start != previous_end:
+            # the quote state at an arbitrary offset is unknown, so quotes aren't counted as `split_byte_ranges` does.
+            skipped = sample.find(b'\n') + 1 or len(sample)
+            sample = sample[skipped:]
+            start += skipped
+        if start + len(sample) < end:
+            sample = sample[:sample.rfind(b'\n') + 1]
+        if sample:
+            samples.append(sample)
+            previous_end = start + len(sample)
+    return samples
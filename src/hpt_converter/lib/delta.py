@@ -0,0 +1,163 @@
+import os
+from enum import StrEnum
+from hashlib import blake2b
+from typing import List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    ROW_HASH_SCHEMA, STANDARD_CHARGE_SCHEMA)
+
+ROW_HASH_FILE_NAME = 'standard_charge_hashes.parquet'
+# columns that identify a standard charge across versions of a file. A row with the same key and different content
+# is a changed standard charge.
+KEY_FIELDS = ['description', 'codes', 'setting', 'modifiers', 'drug_unit_of_measurement', 'drug_type_of_measurement',
+              'plan_id']
+# file_id changes with last_updated_on, so it is left out of the content of a row.
+CONTENT_FIELDS = [name for name in STANDARD_CHARGE_SCHEMA.names if name != 'file_id']
+_FIELD_SEPARATOR, _CODE_SEPARATOR, _CODE_TYPE_SEPARATOR, _NULL = '\x1f', '\x1d', '\x1e', '\x00'
+
+
+def _to_string_array(array: pa.ChunkedArray) -> pa.ChunkedArray:
+    if not pa.types.is_list(array.type):
+        return array.cast(pa.string())
+    # codes: '<code>\x1e<code type>' joined by '\x1d'
+    chunks = []
+    for chunk in array.chunks:
+        values = chunk.flatten()
+        codes = pc.binary_join_element_wise(pc.struct_field(values, 'code'), pc.struct_field(values, 'code_type'),
+                                            _CODE_TYPE_SEPARATOR, null_handling='replace', null_replacement=_NULL)
+        offsets = pc.subtract(chunk.offsets, chunk.offsets[0])
+        lists = pa.ListArray.from_arrays(offsets, codes, mask=chunk.is_null())
+        chunks.append(pc.binary_join(lists, _CODE_SEPARATOR))
+    return pa.chunked_array(chunks, pa.string())
+
+
+def hash_rows(table: pa.Table, names: List[str]) -> pa.Array:
+    """Returns a 64-bit BLAKE2b hash of the values of the given columns of each row. Hashes are stable across runs,
+    processes and platforms, and distinguish null from empty values.
+
+    Args:
+        table (pa.Table): standard charges in `STANDARD_CHARGE_SCHEMA`.
+        names (List[str]): columns to hash.
+    Returns:
+        pa.Array: uint64 hash of each row.
+    """
+    if table.num_rows == 0:
+        return pa.array([], pa.uint64())
+    columns = [_to_string_array(table[name]) for name in names]
+    joined = pc.binary_join_element_wise(*columns, _FIELD_SEPARATOR, null_handling='replace',
+                                         null_replacement=_NULL).cast(pa.large_string()).combine_chunks()
+    offsets = np.frombuffer(joined.buffers()[1], dtype=np.int64)[joined.offset:joined.offset + len(joined) + 1]
+    data = memoryview(joined.buffers()[2] or b'')
+    digests = b''.join(blake2b(data[start:end], digest_size=8).digest()
+                       for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()))
+    return pa.array(np.frombuffer(digests, dtype='<u8'))
+
+
+def hash_standard_charges(table: pa.Table) -> pa.Table:
+    """Returns the content and key hashes of standard charges in `ROW_HASH_SCHEMA`."""
+    return pa.Table.from_arrays([hash_rows(table, CONTENT_FIELDS), hash_rows(table, KEY_FIELDS)],
+                                schema=ROW_HASH_SCHEMA)
+
+
+def read_row_hashes(dir_path: str, batch_size: int = 64 * 1024) -> pa.Table:
+    """Reads the row hashes of a previous conversion. If it didn't write them, they are computed from its
+    standard_charges.parquet, which must be in the default layout(not compact, decimal prices, not partitioned).
+
+    Args:
+        dir_path (str): output folder of the previous conversion.
+        batch_size (int): number of standard charges hashed at a time.
+    Returns:
+        pa.Table: hashes in `ROW_HASH_SCHEMA`.
+    Raises:
+        ValueError: If the folder has neither row hashes nor standard charges in the default layout.
+    """
+    hash_file_path = os.path.join(dir_path, ROW_HASH_FILE_NAME)
+    if os.path.exists(hash_file_path):
+        return pq.read_table(hash_file_path, schema=ROW_HASH_SCHEMA)
+    sc_file_path = os.path.join(dir_path, 'standard_charges.parquet')
+    if not os.path.isfile(sc_file_path):
+        raise ValueError(f"No row hashes or standard charges in previous output folder: {dir_path}")
+    parquet_file = pq.ParquetFile(sc_file_path)
+    if not parquet_file.schema_arrow.equals(STANDARD_CHARGE_SCHEMA):
+        raise ValueError(f"Row hashes can't be computed from standard charges that are not in the default layout: "
+                         f"{sc_file_path}")
+    tables = [hash_standard_charges(pa.Table.from_batches([batch], schema=STANDARD_CHARGE_SCHEMA))
+              for batch in parquet_file.iter_batches(batch_size=batch_size)]
+    return pa.concat_tables(tables) if tables else ROW_HASH_SCHEMA.empty_table()
+
+
+class ChangeType(StrEnum):
+    ADDED = 'added'         # neither the content nor the key of the row is in the previous version.
+    CHANGED = 'changed'     # the key of the row is in the previous version with different content.
+    REMOVED = 'removed'     # the content and the key of a row of the previous version are not in the new version.
+
+
+class RowHashDelta:
+    """Compares standard charges of a new version of a file with the row hashes of the previous version.
+    Hashes of the previous version are kept in sorted numpy arrays, so that memory is 16 bytes per row and
+    lookups of a block don't rebuild a hash table. A row whose content is in the previous version is unchanged.
+    Duplicate rows are compared as a set.
+    """
+    def __init__(self, previous_hashes: pa.Table):
+        row_hashes = previous_hashes['row_hash'].to_numpy()
+        order = np.argsort(row_hashes, kind='stable')
+        self.row_hashes = row_hashes[order]
+        self.key_hashes = previous_hashes['key_hash'].to_numpy()[order]
+        self.sorted_key_hashes = np.sort(self.key_hashes)
+        self.seen = np.zeros(len(self.row_hashes), dtype=bool)
+        self.new_key_hashes: List[np.ndarray] = []
+        self.added_count = 0
+        self.changed_count = 0
+        self.removed_count = 0
+
+    @staticmethod
+    def _lookup(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Returns the positions of values in sorted values, and -1 for values that are not found."""
+        positions = np.searchsorted(sorted_values, values)
+        found = positions < len(sorted_values)
+        found[found] = sorted_values[positions[found]] == values[found]
+        return np.where(found, positions, -1)
+
+    def compare(self, hashes: pa.Table) -> pa.Array:
+        """Compares rows of the new version with the previous version.
+
+        Args:
+            hashes (pa.Table): hashes of a block of standard charges in `ROW_HASH_SCHEMA`.
+        Returns:
+            pa.Array: `ChangeType` of each row, or null if the row is unchanged.
+        """
+        row_hashes, key_hashes = hashes['row_hash'].to_numpy(), hashes['key_hash'].to_numpy()
+        self.new_key_hashes.append(key_hashes)
+        positions = self._lookup(self.row_hashes, row_hashes)
+        unchanged = positions >= 0
+        self.seen[positions[unchanged]] = True
+        changed = ~unchanged & (self._lookup(self.sorted_key_hashes, key_hashes) >= 0)
+        added = ~unchanged & ~changed
+        self.changed_count += int(changed.sum())
+        self.added_count += int(added.sum())
+        changes = np.where(changed, ChangeType.CHANGED.value, np.where(added, ChangeType.ADDED.value, None))
+        return pa.array(changes, pa.string())
+
+    def removed(self) -> pa.Table:
+        """Returns the hashes of rows of the previous version that are not in the new version and whose key is not
+        in it either. Call it after every block is compared.
+
+        Returns:
+            pa.Table: hashes of removed rows in `ROW_HASH_SCHEMA`.
+        """
+        new_key_hashes = np.sort(np.concatenate(self.new_key_hashes)) if self.new_key_hashes else np.array([], np.uint64)
+        missing = ~self.seen
+        # rows with a duplicate of a seen row are seen as well.
+        missing &= self._lookup(self.row_hashes[self.seen], self.row_hashes) < 0
+        removed = missing & (self._lookup(new_key_hashes, self.key_hashes) < 0)
+        row_hashes, key_hashes = self.row_hashes[removed], self.key_hashes[removed]
+        if len(row_hashes):
+            row_hashes, key_hashes = np.unique(np.stack([row_hashes, key_hashes]), axis=1)
+        self.removed_count = len(row_hashes)
+        return pa.Table.from_arrays([pa.array(row_hashes, pa.uint64()), pa.array(key_hashes, pa.uint64())],
+                                    schema=ROW_HASH_SCHEMA)
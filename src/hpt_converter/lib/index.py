@@ -0,0 +1,91 @@
+import os
+from enum import StrEnum
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import \
+    STANDARD_CHARGE_INDEX_SCHEMA
+
+INDEX_FILE_NAME = 'standard_charge_index.parquet'
+
+
+class IndexKeyType(StrEnum):
+    CODE = 'code'                   # a code of `codes`, with its code type.
+    DESCRIPTION = 'description'     # lower case description.
+    PLAN_ID = 'plan_id'
+
+
+def normalize_description(description: str) -> str:
+    return description.strip().lower()
+
+
+def _index_keys(key_type: IndexKeyType, keys: pa.Array, row_numbers: pa.Array,
+                code_types: Optional[pa.Array] = None) -> pa.Table:
+    mask = keys.is_valid()
+    keys, row_numbers = keys.filter(mask), row_numbers.filter(mask)
+    code_types = code_types.filter(mask) if code_types is not None else pa.nulls(len(keys), pa.string())
+    return pa.table({'key_type': pa.array([key_type.value] * len(keys), pa.string()), 'key': keys,
+                     'code_type': code_types, 'row_number': row_numbers})
+
+
+def _index_row_group(table: pa.Table, row_group: int, first_row_number: int,
+                     plan_ids: Optional[pa.Array] = None) -> pa.Table:
+    """Returns the index entries of the rows of a row group in `STANDARD_CHARGE_INDEX_SCHEMA`."""
+    row_numbers = pa.array(range(first_row_number, first_row_number + table.num_rows), pa.int64())
+    codes = table['codes'].combine_chunks()
+    values = pc.list_flatten(codes)
+    code_rows = pc.add(pc.list_parent_indices(codes).cast(pa.int64()), first_row_number)
+    if 'plan_key' in table.column_names:
+        plans = plan_ids.take(table['plan_key'].combine_chunks())
+    else:
+        plans = table['plan_id'].combine_chunks()
+    descriptions = pc.utf8_lower(pc.utf8_trim_whitespace(table['description'].combine_chunks()))
+    keys = pa.concat_tables([
+        _index_keys(IndexKeyType.CODE, pc.struct_field(values, 'code'), code_rows, pc.struct_field(values, 'code_type')),
+        _index_keys(IndexKeyType.DESCRIPTION, descriptions, row_numbers),
+        _index_keys(IndexKeyType.PLAN_ID, plans.cast(pa.string()), row_numbers),
+    ])
+    entries = keys.group_by(['key_type', 'key', 'code_type'], use_threads=False).aggregate(
+        [('row_number', 'min'), ('row_number', 'max'), ('row_number', 'count')])
+    return pa.Table.from_arrays([entries['key_type'], entries['key'], entries['code_type'],
+                                 pa.array([row_group] * entries.num_rows, pa.int32()),
+                                 entries['row_number_min'], entries['row_number_max'], entries['row_number_count']],
+                                schema=STANDARD_CHARGE_INDEX_SCHEMA)
+
+
+def build_index(dir_path: str) -> str:
+    """Builds the sidecar index of the standard charges in an output folder, reading one row group at a time and only
+    the indexed columns. Entries are sorted by key type and key, so the index is small compared to standard charges:
+    one row per distinct key of each row group.
+
+    Args:
+        dir_path (str): output folder with standard_charges.parquet, and payer_plans.parquet if it is compact.
+    Returns:
+        str: path to the index file.
+    Raises:
+        ValueError: If the folder has no standard_charges.parquet, e.g. it is partitioned or a delta.
+    """
+    sc_file_path = os.path.join(dir_path, 'standard_charges.parquet')
+    if not os.path.isfile(sc_file_path):
+        raise ValueError(f"No standard_charges.parquet to index in {dir_path}")
+    parquet_file = pq.ParquetFile(sc_file_path)
+    plan_column = 'plan_key' if 'plan_key' in parquet_file.schema_arrow.names else 'plan_id'
+    plan_ids = None
+    if plan_column == 'plan_key':
+        # compact standard charges refer to payer plans by row number.
+        plan_ids = pq.read_table(os.path.join(dir_path, 'payer_plans.parquet'), columns=['plan_id'])['plan_id']
+        plan_ids = plan_ids.combine_chunks()
+    tables: List[pa.Table] = []
+    first_row_number = 0
+    for row_group in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(row_group, columns=['codes', 'description', plan_column])
+        tables.append(_index_row_group(table, row_group, first_row_number, plan_ids))
+        first_row_number += table.num_rows
+    index = pa.concat_tables(tables) if tables else STANDARD_CHARGE_INDEX_SCHEMA.empty_table()
+    index = index.sort_by([('key_type', 'ascending'), ('key', 'ascending'), ('row_group', 'ascending')])
+    index_file_path = os.path.join(dir_path, INDEX_FILE_NAME)
+    pq.write_table(index, index_file_path, compression='SNAPPY')
+    return index_file_path
@@ -0,0 +1,155 @@
+import codecs
+import json
+from decimal import Decimal
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from hpt_converter.lib.schema.abstract.v1.general_data_elements import GeneralDataElements
+
+READ_CHUNK_SIZE = 8 << 20
+STANDARD_CHARGE_INFORMATION = 'standard_charge_information'
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789.eE+-'
+
+
+class JsonObjectStream:
+    """Incremental reader of a JSON document whose root is an object.
+    Values of the root object are decoded one at a time, and the items of the arrays named in `stream_keys`
+    are decoded one at a time, so memory use is bounded by the largest single item rather than the document.
+    Numbers with a fraction are decoded as `Decimal`.
+    """
+    def __init__(self, json_file_path, stream_keys: Set[str], chunk_size: int = READ_CHUNK_SIZE):
+        self.json_file_path = json_file_path
+        self.stream_keys = stream_keys
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder(parse_float=Decimal)
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _read(self, json_file, text_decoder) -> bool:
+        if self.eof:
+            return False
+        # read at least as much as buffered, so that a large value is decoded in a logarithmic number of attempts.
+        chunk = json_file.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        self.bytes_read += len(chunk)
+        self.buffer = self.buffer[self.pos:] + text_decoder.decode(chunk, final=not chunk)
+        self.pos = 0
+        self.eof = not chunk
+        return True
+
+    def _peek(self, json_file, text_decoder) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read(json_file, text_decoder):
+                raise ValueError(f"Unexpected end of JSON file({self.json_file_path})")
+
+    def _expect(self, json_file, text_decoder, chars: str) -> str:
+        char = self._peek(json_file, text_decoder)
+        if char not in chars:
+            raise ValueError(f"Invalid JSON file({self.json_file_path}): expected {chars!r} but found {char!r}")
+        self.pos += 1
+        return char
+
+    def _decode(self, json_file, text_decoder) -> Any:
+        self._peek(json_file, text_decoder)
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may continue in the next chunk.
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in _NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read(json_file, text_decoder)
+
+    def _iter_array(self, json_file, text_decoder) -> Iterator[Any]:
+        self._expect(json_file, text_decoder, '[')
+        if self._peek(json_file, text_decoder) == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._decode(json_file, text_decoder)
+            if self._expect(json_file, text_decoder, ',]') == ']':
+                return
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Yields the (key, value) pairs of the root object in document order.
+        The value of a key in `stream_keys` is an iterator over the items of the array, which is drained
+        when the next pair is requested.
+
+        Yields:
+            tuple: (key, decoded value or iterator of decoded array items)
+        """
+        self.buffer, self.pos, self.eof, self.bytes_read = '', 0, False, 0
+        text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        with open(self.json_file_path, mode='rb') as json_file:
+            self._expect(json_file, text_decoder, '{')
+            if self._peek(json_file, text_decoder) == '}':
+                return
+            while True:
+                key = self._decode(json_file, text_decoder)
+                self._expect(json_file, text_decoder, ':')
+                if key in self.stream_keys and self._peek(json_file, text_decoder) == '[':
+                    array_items = self._iter_array(json_file, text_decoder)
+                    yield key, array_items
+                    for _ in array_items:
+                        pass
+                else:
+                    yield key, self._decode(json_file, text_decoder)
+                if self._expect(json_file, text_decoder, ',}') == '}':
+                    return
+
+
+def create_general_data_elements(raw_elements: Dict[str, Any]) -> GeneralDataElements:
+    """Creates a GeneralDataElements instance from the root elements of a JSON file.
+
+    Args:
+        raw_elements (dict): root elements of the JSON file except standard charge information.
+    Returns:
+        GeneralDataElements: An instance of GeneralDataElements populated with data from the JSON file.
+    """
+    def _join(value: Any) -> Any:
+        # multiple locations and addresses are separated by '|' as in CSV format.
+        return '|'.join(value) if isinstance(value, list) else value
+
+    license_information = raw_elements.get('license_information') or {}
+    affirmation = raw_elements.get('affirmation') or {}
+    elements = {
+        'hospital_name': raw_elements.get('hospital_name'),
+        'last_updated_on': raw_elements.get('last_updated_on'),
+        'version': raw_elements.get('version'),
+        'hospital_location': _join(raw_elements.get('hospital_location')),
+        'hospital_address': _join(raw_elements.get('hospital_address')),
+        'license_number': (license_information.get('license_number'), license_information.get('state')),
+        'affirmation_statement': affirmation.get('confirm_affirmation'),
+        'financial_aid_policy': raw_elements.get('financial_aid_policy'),
+        'general_contract_provisions': raw_elements.get('general_contract_provisions'),
+    }
+    return GeneralDataElements(**{name: value for name, value in elements.items() if value is not None})
+
+
+def read_general_data_elements(json_file_path) -> GeneralDataElements:
+    """Reads the root elements of a JSON file, skipping standard charge information item by item.
+
+    Args:
+        json_file_path (str): Path to the JSON file.
+    Returns:
+        GeneralDataElements: An instance of GeneralDataElements populated with data from the JSON file.
+    """
+    raw_elements = {key: value for key, value in JsonObjectStream(json_file_path, {STANDARD_CHARGE_INFORMATION}).items()
+                    if key != STANDARD_CHARGE_INFORMATION}
+    return create_general_data_elements(raw_elements)
+
+
+def get_file_id(raw_elements: Dict[str, Any]) -> Optional[str]:
+    """Returns the file id if the root elements read so far are enough to create general data elements."""
+    try:
+        return create_general_data_elements(raw_elements).file_id
+    except ValueError:
+        return None
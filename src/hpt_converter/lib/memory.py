@@ -0,0 +1,96 @@
+from typing import Optional
+
+import pyarrow as pa
+
+# shares of the memory budget
+WRITER_SHARE = 0.5      # rows buffered by parquet writers until a row group is written
+BLOCK_SHARE = 0.25      # blocks being read, transformed or queued, split evenly between them
+# the rest is left to the interpreter, models, payer plans and parquet encoding buffers.
+
+PYTHON_OBJECT_FACTOR = 10   # approximate bytes of validated Python objects per byte of their Arrow table
+ARROW_EXPANSION = 4         # approximate bytes of parsed and transformed Arrow tables per byte of CSV
+MIN_BLOCK_ROWS = 100
+MIN_BLOCK_BYTES = 1 << 20
+_SIZE_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(size: str) -> int:
+    """Parses a number of bytes with an optional K, M, G or T suffix, e.g. '512M' or '2G'.
+
+    Raises:
+        ValueError: If the size is not a positive number.
+    """
+    text = size.strip().upper().removesuffix('B')
+    try:
+        value = float(text[:-1]) * _SIZE_UNITS[text[-1]] if text and text[-1] in _SIZE_UNITS else float(text)
+    except ValueError:
+        raise ValueError(f"Invalid size: {size!r}")
+    if value <= 0:
+        raise ValueError(f"Invalid size: {size!r}")
+    return int(value)
+
+
+class MemoryBudget:
+    """Splits a memory budget between the buffers of a conversion and adapts their sizes to the observed size of rows.
+    Buffered bytes are approximated by the size of Arrow tables, so the budget bounds the data held by a conversion,
+    not the resident size of the process, which also includes the interpreter and libraries.
+
+    Args:
+        max_memory (int): memory budget in bytes.
+        blocks_in_flight (int): number of blocks held at a time, e.g. the blocks queued in a pipeline.
+    """
+    def __init__(self, max_memory: int, blocks_in_flight: int = 2):
+        if max_memory <= 0:
+            raise ValueError(f"Invalid memory budget: {max_memory}")
+        self.max_memory = max_memory
+        self.blocks_in_flight = max(1, blocks_in_flight)
+        self.bytes_per_input_row: Optional[float] = None
+        self.bytes_per_row: Optional[float] = None
+        self.peak_buffered_bytes = 0
+
+    @property
+    def writer_bytes(self) -> int:
+        """Bytes of rows a parquet writer may buffer before it writes a row group."""
+        return int(self.max_memory * WRITER_SHARE)
+
+    @property
+    def block_bytes(self) -> int:
+        """Bytes of a block of standard charges."""
+        return int(self.max_memory * BLOCK_SHARE / self.blocks_in_flight)
+
+    @staticmethod
+    def _update(current: Optional[float], observed: float) -> float:
+        # a larger size is taken at once, so that blocks shrink quickly, and a smaller one gradually.
+        return observed if current is None or observed > current else (current + observed) / 2
+
+    def observe(self, table: pa.Table, input_row_count: int):
+        """Records the size of a block of standard charges converted from a number of input rows."""
+        if input_row_count > 0:
+            self.bytes_per_input_row = self._update(self.bytes_per_input_row, table.nbytes / input_row_count)
+        if table.num_rows > 0:
+            self.bytes_per_row = self._update(self.bytes_per_row, table.nbytes / table.num_rows)
+
+    def add_buffered_bytes(self, size: int):
+        """Records the bytes buffered at a point of conversion, to report the peak."""
+        self.peak_buffered_bytes = max(self.peak_buffered_bytes, size)
+
+    def block_rows(self, default: int, factor: float = PYTHON_OBJECT_FACTOR, input_rows: bool = True) -> int:
+        """Returns the number of rows of the next block, at most `default`. Until a block is observed,
+        blocks are of `10 * MIN_BLOCK_ROWS` rows.
+
+        Args:
+            default (int): number of rows of a block without a budget.
+            factor (float): bytes held while a block is built per byte of its Arrow table.
+            input_rows (bool): If True, the block is counted in input rows, otherwise in standard charges.
+        Returns:
+            int: number of rows, at least `MIN_BLOCK_ROWS`.
+        """
+        bytes_per_row = self.bytes_per_input_row if input_rows else self.bytes_per_row
+        if not bytes_per_row:
+            return min(default, MIN_BLOCK_ROWS * 10)
+        rows = int(self.block_bytes / (bytes_per_row * factor))
+        return max(MIN_BLOCK_ROWS, min(default, rows))
+
+    def csv_block_size(self, default: int) -> int:
+        """Returns the bytes of CSV parsed into each record batch, at most `default` and at least `MIN_BLOCK_BYTES`."""
+        return max(MIN_BLOCK_BYTES, min(default, int(self.block_bytes / ARROW_EXPANSION)))
@@ -0,0 +1,194 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Set, TextIO, TypeVar
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+T = TypeVar('T')
+
+# called with (bytes read, total bytes of input, input rows converted)
+ProgressCallback = Callable[[int, int, int], None]
+_LOCK = threading.Lock()
+# on Linux, the peak resident set size(VmHWM) of a process is reset by writing 5 to clear_refs.
+_PROC_STATUS_PATH = '/proc/self/status'
+_PROC_CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+
+@dataclass
+class StageMetrics:
+    """Wall and CPU time spent in a stage of conversion, and the bytes and rows it processed.
+    An instance is a context manager that adds the time spent in its block. CPU time is of the current thread.
+    Blocks may run on several threads at once, e.g. in a `Pipeline`, and their times are summed.
+    """
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    bytes: int = 0
+    rows: int = 0
+
+    def __enter__(self) -> 'StageMetrics':
+        # start times are kept per thread, outside of the dataclass fields.
+        self.__dict__.setdefault('_started', {})[threading.get_ident()] = (time.perf_counter(), time.thread_time())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall, cpu = self._started.pop(threading.get_ident())
+        with _LOCK:
+            self.wall_seconds += time.perf_counter() - wall
+            self.cpu_seconds += time.thread_time() - cpu
+
+    def add(self, other: 'StageMetrics'):
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.bytes += other.bytes
+        self.rows += other.rows
+
+
+@dataclass
+class PipelineStageMetrics:
+    """Time a stage of a `Pipeline` spent working and waiting for its input and output queues, and the depth of its
+    input queue, sampled when an item is put. `utilization` is the ratio of busy time, so the stage with the highest
+    utilization is the bottleneck, and full input queues(mean depth close to the queue size) are in front of it.
+    """
+    busy_seconds: float = 0.0
+    input_wait_seconds: float = 0.0
+    output_wait_seconds: float = 0.0
+    items: int = 0
+    utilization: float = 0.0
+    mean_queue_depth: float = 0.0
+    max_queue_depth: int = 0
+    queue_depth_samples: int = 0
+
+    def add_queue_depth(self, depth: int):
+        self.mean_queue_depth += (depth - self.mean_queue_depth) / (self.queue_depth_samples + 1)
+        self.queue_depth_samples += 1
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def add(self, other: 'PipelineStageMetrics'):
+        """Adds the metrics of the same stage of another pipeline, e.g. of a worker process."""
+        samples = self.queue_depth_samples + other.queue_depth_samples
+        if samples:
+            self.mean_queue_depth = (self.mean_queue_depth * self.queue_depth_samples
+                                     + other.mean_queue_depth * other.queue_depth_samples) / samples
+        self.queue_depth_samples = samples
+        self.max_queue_depth = max(self.max_queue_depth, other.max_queue_depth)
+        self.busy_seconds += other.busy_seconds
+        self.input_wait_seconds += other.input_wait_seconds
+        self.output_wait_seconds += other.output_wait_seconds
+        self.items += other.items
+        self.finish()
+
+    def finish(self):
+        total = self.busy_seconds + self.input_wait_seconds + self.output_wait_seconds
+        self.utilization = self.busy_seconds / total if total else 0.0
+
+
+def iter_timed(iterable: Iterable[T], stage: StageMetrics) -> Iterator[T]:
+    """Yields the items of an iterable, adding the time spent producing each item to the stage."""
+    iterator = iter(iterable)
+    while True:
+        with stage:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _read_peak_rss() -> Optional[int]:
+    """Returns VmHWM of the current process in bytes, or None if it is not available."""
+    try:
+        with open(_PROC_STATUS_PATH, encoding='ascii') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_peak_memory() -> int:
+    """Returns the peak resident set size of the current process in bytes, since it was last reset by `PeakMemory`
+    on Linux, or 0 if it is not available."""
+    peak = _read_peak_rss()
+    if peak is not None:
+        return peak
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PeakMemory:
+    """Measures the peak resident set size of the current process while its block runs, e.g. a conversion.
+    On Linux, the peak of the process is reset when a block starts, and the peak so far is carried over to the blocks
+    still running, e.g. on other threads or interleaved generators, so that each block reports the largest resident
+    set size of the process since it started, including memory used by the other blocks meanwhile. Where the peak
+    can't be reset, e.g. on macOS, it is the peak since the process started, so an upper bound.
+    """
+    _running: Set['PeakMemory'] = set()
+
+    def __init__(self):
+        self.peak_bytes = 0
+
+    def __enter__(self) -> 'PeakMemory':
+        with _LOCK:
+            peak = get_peak_memory()
+            for running in PeakMemory._running:
+                running.peak_bytes = max(running.peak_bytes, peak)
+            try:
+                with open(_PROC_CLEAR_REFS_PATH, mode='w', encoding='ascii') as clear_refs_file:
+                    clear_refs_file.write('5')
+            except OSError:
+                pass
+            PeakMemory._running.add(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with _LOCK:
+            PeakMemory._running.discard(self)
+            self.peak_bytes = max(self.peak_bytes, get_peak_memory())
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+class ProgressBar:
+    """Progress callback that renders a progress bar with ETA on a terminal.
+    The bar is redrawn at most every `interval` seconds.
+    """
+    def __init__(self, file: Optional[TextIO] = None, width: int = 30, interval: float = 0.5):
+        self.file = file or sys.stderr
+        self.width = width
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.drawn = 0.0
+
+    def __call__(self, bytes_read: int, total_bytes: int, rows: int):
+        now = time.perf_counter()
+        if now - self.drawn < self.interval and bytes_read < total_bytes:
+            return
+        self.drawn = now
+        ratio = min(bytes_read / total_bytes, 1.0) if total_bytes else 0.0
+        elapsed = now - self.started
+        eta = elapsed * (1 - ratio) / ratio if ratio else None
+        filled = int(self.width * ratio)
+        self.file.write(f"\r[{'#' * filled}{'.' * (self.width - filled)}] {ratio:6.1%} "
+                        f"{format_bytes(bytes_read)}/{format_bytes(total_bytes)} {rows:,} rows "
+                        f"{rows / elapsed if elapsed else 0:,.0f} rows/s "
+                        f"ETA {time.strftime('%H:%M:%S', time.gmtime(eta)) if eta is not None else '--:--:--'}")
+        self.file.flush()
+
+    def close(self):
+        self.file.write('\n')
+        self.file.flush()
@@ -0,0 +1,136 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from hpt_converter.lib.metrics import PipelineStageMetrics
+
+DEFAULT_PIPELINE_DEPTH = 4
+_END = object()
+
+
+class _Error:
+    """An exception raised by a stage, passed downstream in place of an item."""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class Pipeline:
+    """Runs the stages of a conversion on separate threads connected by bounded queues, so that reading,
+    transforming and writing overlap. Arrow compute kernels, parquet writing and compression release the GIL.
+    The source stage iterates `source`, each following stage maps the items of the previous stage with its function,
+    and the caller consumes the items of the last queue as the sink stage. Items keep their order.
+    An exception of a stage is raised to the caller, and the caller stopping early stops every stage.
+
+    Args:
+        source (Iterable): items of the source stage.
+        stages (List[Tuple[str, Callable]]): names and functions of the stages between the source and the sink.
+        source_name (str): name of the source stage.
+        sink_name (str): name of the sink stage.
+        depth (int): maximum number of items in each queue.
+    """
+    def __init__(self, source: Iterable, stages: List[Tuple[str, Callable[[Any], Any]]], source_name: str = 'read',
+                 sink_name: str = 'write', depth: int = DEFAULT_PIPELINE_DEPTH):
+        if depth <= 0:
+            raise ValueError(f"Invalid pipeline depth: {depth}")
+        self.source = source
+        self.stages = stages
+        self.depth = depth
+        self.names = [source_name, *(name for name, _ in stages), sink_name]
+        self.metrics: Dict[str, PipelineStageMetrics] = {name: PipelineStageMetrics() for name in self.names}
+        self.stopping = threading.Event()
+
+    def _put(self, output: queue.Queue, item, metrics: PipelineStageMetrics, next_metrics: PipelineStageMetrics) -> bool:
+        """Puts an item into the output queue of a stage, waiting while it is full. Returns False if stopping."""
+        started = time.perf_counter()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    output.put(item, timeout=0.1)
+                    next_metrics.add_queue_depth(output.qsize())
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            metrics.output_wait_seconds += time.perf_counter() - started
+
+    @staticmethod
+    def _get(input: queue.Queue, metrics: PipelineStageMetrics):
+        started = time.perf_counter()
+        item = input.get()
+        metrics.input_wait_seconds += time.perf_counter() - started
+        return item
+
+    def _run_source(self, output: queue.Queue, metrics: PipelineStageMetrics, next_metrics: PipelineStageMetrics):
+        iterator = iter(self.source)
+        try:
+            while not self.stopping.is_set():
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    metrics.busy_seconds += time.perf_counter() - started
+                metrics.items += 1
+                if not self._put(output, item, metrics, next_metrics):
+                    return
+            self._put(output, _END, metrics, next_metrics)
+        except BaseException as e:
+            self._put(output, _Error(e), metrics, next_metrics)
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()
+
+    def _run_stage(self, function: Callable, input: queue.Queue, output: queue.Queue,
+                   metrics: PipelineStageMetrics, next_metrics: PipelineStageMetrics):
+        while True:
+            item = self._get(input, metrics)
+            if item is not _END and not isinstance(item, _Error):
+                started = time.perf_counter()
+                try:
+                    item = function(item)
+                except BaseException as e:
+                    item = _Error(e)
+                metrics.busy_seconds += time.perf_counter() - started
+                metrics.items += 1
+            if not self._put(output, item, metrics, next_metrics) or item is _END or isinstance(item, _Error):
+                return
+
+    def __iter__(self) -> Iterator:
+        queues = [queue.Queue(maxsize=self.depth) for _ in range(len(self.stages) + 1)]
+        metrics = [self.metrics[name] for name in self.names]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0], metrics[0], metrics[1]),
+                                    name=f'pipeline-{self.names[0]}', daemon=True)]
+        for i, (name, function) in enumerate(self.stages, start=1):
+            threads.append(threading.Thread(target=self._run_stage,
+                                            args=(function, queues[i - 1], queues[i], metrics[i], metrics[i + 1]),
+                                            name=f'pipeline-{name}', daemon=True))
+        for thread in threads:
+            thread.start()
+        sink_metrics = metrics[-1]
+        try:
+            while True:
+                item = self._get(queues[-1], sink_metrics)
+                if item is _END:
+                    return
+                if isinstance(item, _Error):
+                    raise item.error
+                started = time.perf_counter()
+                yield item
+                sink_metrics.busy_seconds += time.perf_counter() - started
+                sink_metrics.items += 1
+        finally:
+            self.stopping.set()
+            # unblock stages waiting for input after the caller stopped early.
+            for input in queues[:-1]:
+                try:
+                    input.put_nowait(_END)
+                except queue.Full:
+                    pass
+            for thread in threads:
+                thread.join()
+            for stage_metrics in metrics:
+                stage_metrics.finish()
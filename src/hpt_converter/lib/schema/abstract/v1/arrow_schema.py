@@ -0,0 +1,181 @@
+from decimal import Decimal
+from enum import StrEnum
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .standard_charge import CodeInformation, StandardCharge
+
+# prices are validated to 16 digits with 2 decimal places in CSV v2 schema.
+PRICE_TYPE = pa.decimal128(16, 2)
+CODE_INFORMATION_TYPE = pa.struct([pa.field('code', pa.string()),
+                                   pa.field('code_type', pa.string())])
+
+
+def _get_arrow_type(annotation) -> pa.DataType:
+    if annotation == Optional[Decimal]:
+        return PRICE_TYPE
+    if annotation == List[CodeInformation]:
+        return pa.list_(CODE_INFORMATION_TYPE)
+    # str and StrEnum fields
+    return pa.string()
+
+
+# fixed schema of standard_charges.parquet, so that every batch has identical types.
+STANDARD_CHARGE_SCHEMA = pa.schema([pa.field(name, _get_arrow_type(field_info.annotation))
+                                    for name, field_info in StandardCharge.model_fields.items()])
+
+# compact layout: low-cardinality strings are dictionary encoded, and plan_id of standard charges is replaced
+# with plan_key, the int32 row number of the payer plan in payer_plans.parquet.
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+DICTIONARY_FIELDS = ['file_id', 'setting', 'drug_type_of_measurement', 'methodology']
+PLAN_KEY_FIELD = pa.field('plan_key', pa.int32())
+COMPACT_STANDARD_CHARGE_SCHEMA = pa.schema([
+    PLAN_KEY_FIELD if field.name == 'plan_id' else
+    pa.field(field.name, DICTIONARY_TYPE) if field.name in DICTIONARY_FIELDS else field
+    for field in STANDARD_CHARGE_SCHEMA])
+COMPACT_PAYER_PLAN_SCHEMA = pa.schema([PLAN_KEY_FIELD,
+                                       pa.field('file_id', DICTIONARY_TYPE),
+                                       pa.field('plan_id', pa.string()),
+                                       pa.field('payer_name', DICTIONARY_TYPE),
+                                       pa.field('plan_name', pa.string())])
+
+
+def to_compact_standard_charges(table: pa.Table, plan_ids: pa.Array) -> pa.Table:
+    """Converts standard charges in `STANDARD_CHARGE_SCHEMA` to `COMPACT_STANDARD_CHARGE_SCHEMA`.
+
+    Args:
+        table (pa.Table): standard charges.
+        plan_ids (pa.Array): plan ids in the order of payer_plans.parquet, including every plan id of the table.
+    Returns:
+        pa.Table: standard charges in compact layout.
+    """
+    arrays = []
+    for field in COMPACT_STANDARD_CHARGE_SCHEMA:
+        if field.name == PLAN_KEY_FIELD.name:
+            arrays.append(pc.index_in(table['plan_id'], value_set=plan_ids).cast(pa.int32()))
+        else:
+            arrays.append(table[field.name].cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=COMPACT_STANDARD_CHARGE_SCHEMA)
+
+
+def from_compact_standard_charges(table: pa.Table, plan_ids: pa.Array) -> pa.Table:
+    """Converts standard charges in `COMPACT_STANDARD_CHARGE_SCHEMA`, with any price type, back to the default layout.
+
+    Args:
+        table (pa.Table): standard charges in compact layout.
+        plan_ids (pa.Array): plan ids in the order of payer_plans.parquet.
+    Returns:
+        pa.Table: standard charges with `plan_id` and plain string columns.
+    """
+    arrays = []
+    for field in table.schema:
+        if field.name == PLAN_KEY_FIELD.name:
+            arrays.append(plan_ids.take(table[field.name]))
+        else:
+            arrays.append(table[field.name].cast(STANDARD_CHARGE_SCHEMA.field(field.name).type)
+                          if field.name in DICTIONARY_FIELDS else table[field.name])
+    names = ['plan_id' if name == PLAN_KEY_FIELD.name else name for name in table.column_names]
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+# flattened codes of standard charges, keyed by the row number in standard_charges.parquet.
+STANDARD_CHARGE_CODE_SCHEMA = pa.schema([pa.field('row_number', pa.int64()),
+                                         pa.field('code', pa.string()),
+                                         pa.field('code_type', pa.string())])
+
+
+# sidecar index of standard_charges.parquet: the row groups and row ranges of the rows with each code, description
+# and plan_id. code_type is null for other keys, and descriptions are lower case.
+STANDARD_CHARGE_INDEX_SCHEMA = pa.schema([pa.field('key_type', pa.string()),
+                                          pa.field('key', pa.string()),
+                                          pa.field('code_type', pa.string()),
+                                          pa.field('row_group', pa.int32()),
+                                          pa.field('first_row', pa.int64()),
+                                          pa.field('last_row', pa.int64()),
+                                          pa.field('row_count', pa.int64())])
+
+
+# rows rejected by lenient conversion. line_number is null if the row couldn't be parsed into fields.
+REJECTED_ROW_SCHEMA = pa.schema([pa.field('line_number', pa.int64()),
+                                 pa.field('raw_values', pa.map_(pa.string(), pa.string())),
+                                 pa.field('error', pa.string())])
+
+
+# hashes of standard charges compared by delta conversion. row_hash is of every column but file_id, and key_hash is of
+# the columns that identify a standard charge across versions of a file.
+ROW_HASH_SCHEMA = pa.schema([pa.field('row_hash', pa.uint64()),
+                             pa.field('key_hash', pa.uint64())])
+CHANGE_FIELD = pa.field('change', pa.string())
+
+
+def get_delta_schema(standard_charge_schema: pa.Schema) -> pa.Schema:
+    """Returns the schema of standard_charges_delta.parquet: the change type and hashes of each row followed by
+    the standard charge columns, which are null for removed rows."""
+    return pa.schema([CHANGE_FIELD, *ROW_HASH_SCHEMA, *standard_charge_schema])
+
+
+def flatten_codes(codes: pa.ChunkedArray, first_row_number: int) -> pa.Table:
+    """Flattens the codes column of standard charges into one row per code.
+
+    Args:
+        codes (pa.ChunkedArray): codes column of standard charges.
+        first_row_number (int): row number of the first standard charge in standard_charges.parquet.
+    Returns:
+        pa.Table: codes in `STANDARD_CHARGE_CODE_SCHEMA`.
+    """
+    codes = codes.combine_chunks() if codes.num_chunks else pa.array([], codes.type)
+    row_numbers = pc.add(pc.list_parent_indices(codes).cast(pa.int64()), first_row_number)
+    values = pc.list_flatten(codes)
+    return pa.Table.from_arrays([row_numbers, pc.struct_field(values, 'code'), pc.struct_field(values, 'code_type')],
+                                schema=STANDARD_CHARGE_CODE_SCHEMA)
+
+class PriceType(StrEnum):
+    DECIMAL = 'decimal'     # decimal128(16, 2), exact.
+    FLOAT = 'float'         # float64.
+    CENTS = 'cents'         # int64 number of cents(percentages in hundredths of a percent), exact.
+
+
+PRICE_TYPES = {
+    PriceType.DECIMAL: PRICE_TYPE,
+    PriceType.FLOAT: pa.float64(),
+    PriceType.CENTS: pa.int64(),
+}
+PRICE_FIELDS = [field.name for field in STANDARD_CHARGE_SCHEMA if field.type == PRICE_TYPE]
+_HUNDRED = pa.scalar(Decimal(100), pa.decimal128(3, 0))
+
+
+def get_standard_charge_schema(compact: bool = False, price_type: PriceType = PriceType.DECIMAL) -> pa.Schema:
+    """Returns the schema of standard_charges.parquet for the output options.
+
+    Args:
+        compact (bool): If True, the compact layout(see `COMPACT_STANDARD_CHARGE_SCHEMA`).
+        price_type (PriceType): type of price columns.
+    Returns:
+        pa.Schema: schema of standard charges.
+    """
+    schema = COMPACT_STANDARD_CHARGE_SCHEMA if compact else STANDARD_CHARGE_SCHEMA
+    if price_type == PriceType.DECIMAL:
+        return schema
+    return pa.schema([pa.field(field.name, PRICE_TYPES[price_type]) if field.name in PRICE_FIELDS else field
+                      for field in schema])
+
+
+def to_price_type(table: pa.Table, price_type: PriceType) -> pa.Table:
+    """Converts decimal128(16, 2) price columns of standard charges to `price_type`.
+
+    Args:
+        table (pa.Table): standard charges with decimal prices.
+        price_type (PriceType): type of price columns.
+    Returns:
+        pa.Table: standard charges with prices in `price_type`.
+    """
+    if price_type == PriceType.DECIMAL:
+        return table
+    for name in PRICE_FIELDS:
+        column = table[name]
+        if price_type == PriceType.CENTS:
+            column = pc.multiply(column, _HUNDRED)
+        table = table.set_column(table.schema.get_field_index(name), name, column.cast(PRICE_TYPES[price_type]))
+    return table
@@ -1,10 +1,16 @@
-import csv
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from pydantic import BaseModel, Field, create_model, field_validator
 
-from hpt_converter.lib.csv.utils import get_csv_type, normalize_header
+from hpt_converter.lib.csv.utils import (get_csv_type, normalize_header_fields,
+                                         read_prelude)
 from hpt_converter.lib.schema.csv import CsvType
 
 StandardChargeBaseFields = {
@@ -20,6 +26,20 @@ StandardChargeBaseFields = {
     'additional_generic_notes': (str, None)   
 }
 
+DEFAULT_MODEL_CACHE_SIZE = 32
+_CODE_FIELD_PATTERN = re.compile(r'^code\|(\d+)(\|type)?$')
+
+# abstract standard charge fields that are taken from payer plan specific fields in wide format.
+# '{}' is replaced with '<payer>|<plan>'.
+WidePayerPlanFields = {
+    'negotiated_dollar': 'standard_charge|{}|negotiated_dollar',
+    'negotiated_percentage': 'standard_charge|{}|negotiated_percentage',
+    'negotiated_algorithm': 'standard_charge|{}|negotiated_algorithm',
+    'estimated_amount': 'estimated_amount|{}',
+    'methodology': 'standard_charge|{}|methodology',
+    'additional_payer_notes': 'additional_payer_notes|{}'
+}
+
 
 def get_standard_charge_base_fields(csv_type: CsvType) -> dict:
     """Returns the base fields for StandardCharge based on the CSV type.
@@ -46,12 +66,86 @@ def get_standard_charge_base_fields(csv_type: CsvType) -> dict:
 
 
 
-def create_standard_charge_model(csv_file_path: str) -> BaseModel:
-    """Creates and returns the appropriate StandardCharge model class based on the CSV type.
+def get_payer_plan_columns(field_names: Iterable[str]) -> Dict[Tuple[str, str], Dict[str, str]]:
+    """Groups the payer plan specific fields of a wide format header by payer plan.
+    Payer plans are identified by the presence of "standard_charge|<payer>|<plan>|negotiated_dollar" fields.
+
+    Args:
+        field_names (Iterable[str]): (normalized) field names of the standard charge header.
+    Returns:
+        dict: {(payer name, plan name): {abstract field name: raw field name}} in the order of field names.
+    Raises:
+        ValueError: If a negotiated dollar field name has unexpected format.
+    """
+    payer_plan_columns = {}
+    for field_name in field_names:
+        if field_name.startswith('standard_charge|') and field_name.endswith('|negotiated_dollar'):
+            tokens = field_name.split('|')
+            if len(tokens) != 4:
+                raise ValueError(f"Unexpected field name format: {field_name}")
+            payer_plan_key = tokens[1] + '|' + tokens[2]
+            payer_plan_columns[(tokens[1], tokens[2])] = {name: template.format(payer_plan_key)
+                                                          for name, template in WidePayerPlanFields.items()}
+    return payer_plan_columns
+
+
+def get_code_columns(field_names: Iterable[str]) -> List[Tuple[str, str]]:
+    """Finds the code fields of a standard charge header, "code|<n>" and "code|<n>|type".
 
     Args:
-        csv_file_path (str): Path to the CSV file.
+        field_names (Iterable[str]): (normalized) field names of the standard charge header.
+    Returns:
+        list: (code field name, code type field name) in the order of <n>.
+    """
+    numbers = {match.group(1) for match in map(_CODE_FIELD_PATTERN.match, field_names) if match}
+    return [(f'code|{number}', f'code|{number}|type') for number in sorted(numbers, key=int)]
+
+
+def get_dynamic_fields(standard_charge_header: Iterable[str], csv_type: CsvType) -> Dict[str, str]:
+    """Returns the placeholder fields of a header that are not base fields.
 
+    Args:
+        standard_charge_header (Iterable[str]): normalized standard charge header.
+        csv_type (CsvType): The type of the CSV file (tall or wide).
+    Returns:
+        dict: {field name: 'decimal' or 'str'}
+    """
+    base_fields = get_standard_charge_base_fields(csv_type)
+    dynamic_fields = {}
+    for field_name in (x for x in standard_charge_header if x not in base_fields):
+        if (field_name.endswith('negotiated_dollar') or
+                field_name.endswith('negotiated_percentage') or
+                field_name.startswith('estimated_amount|')):
+            dynamic_fields[field_name] = 'decimal'
+        else:
+            dynamic_fields[field_name] = 'str'
+    return dynamic_fields
+
+
+def get_payer_plan_price_field(field_name: str) -> Tuple:
+    """Returns the type and field of a payer plan specific price of a wide header, which is validated like
+    the corresponding price of a tall header, e.g. "standard_charge|<payer>|<plan>|negotiated_dollar" like
+    "standard_charge|negotiated_dollar".
+
+    Args:
+        field_name (str): placeholder price field(see `get_dynamic_fields`).
+    Returns:
+        tuple: (type, field) of the price.
+    """
+    tall_fields = get_standard_charge_base_fields(CsvType.TALL)
+    if field_name.endswith('negotiated_dollar'):
+        return tall_fields['standard_charge|negotiated_dollar']
+    if field_name.endswith('negotiated_percentage'):
+        return tall_fields['standard_charge|negotiated_percentage']
+    return tall_fields['estimated_amount']
+
+
+def build_standard_charge_model(csv_type: CsvType, dynamic_fields: Dict[str, str]) -> BaseModel:
+    """Builds the StandardCharge model class of base fields and placeholder fields.
+
+    Args:
+        csv_type (CsvType): The type of the CSV file (tall or wide).
+        dynamic_fields (dict): placeholder fields(see `get_dynamic_fields`).
     Returns:
         BaseModel: The corresponding StandardCharge model class."""
 
@@ -63,26 +157,114 @@ def create_standard_charge_model(csv_file_path: str) -> BaseModel:
         
         return validators
 
-    standard_charge_header = []
-    with open(csv_file_path, mode='r', newline='', encoding='utf-8') as csv_file:
-        csv_reader = csv.reader(csv_file)
-        for _ in range(3):
-            standard_charge_header = next(csv_reader, None)
-
-    if not standard_charge_header:
-        raise ValueError(f"CSV file({csv_file_path}) is missing standard chage header line.")
-
-    standard_charge_header = normalize_header(standard_charge_header)
-    csv_type = get_csv_type(standard_charge_header)
     fields = get_standard_charge_base_fields(csv_type)
-    # dynamically add placeholder fields.
-    for field_name in {x for x in standard_charge_header if x not in fields}:
-        if (field_name.endswith('negotiated_dollar') or
-                field_name.endswith('negotiated_percentage') or 
-                field_name.startswith('estimated_amount|')):
-            fields[field_name] = (Decimal, None)
-        else:
-            fields[field_name] = (str, None)
-    
+    # dynamically add placeholder fields. blank prices are None, like those of base fields.
+    for field_name, field_type in dynamic_fields.items():
+        fields[field_name] = get_payer_plan_price_field(field_name) if field_type == 'decimal' else (str, None)
+
     return create_model('StandardChargeDynamicModel', **fields,
                         __validators__=_create_validator(fields))
+
+
+def get_header_key(standard_charge_header: Iterable[str], csv_type: CsvType) -> str:
+    """Returns the hash of a normalized standard charge header and CSV type, independent of column order.
+    Files with reordered headers share a model, so anything ordered by columns, e.g. payer plans, is taken from
+    the header of each file rather than from the fields of the model."""
+    return hashlib.sha256('\n'.join([csv_type.value, *sorted(standard_charge_header)]).encode('utf-8')).hexdigest()
+
+
+class StandardChargeModelCache:
+    """LRU cache of StandardCharge model classes keyed by `get_header_key`, so that files with the same header
+    share one model. If `cache_dir` is set, the placeholder fields of each header are persisted there as JSON;
+    model classes can't be pickled, so a model loaded from disk is still built once per process.
+    """
+    def __init__(self, max_size: int = DEFAULT_MODEL_CACHE_SIZE, cache_dir: Optional[str] = None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.models: OrderedDict[str, BaseModel] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.lock = threading.Lock()
+
+    def _load_dynamic_fields(self, key: str) -> Optional[Dict[str, str]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, f'{key}.json'), mode='r', encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_dynamic_fields(self, key: str, dynamic_fields: Dict[str, str]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file_path = os.path.join(self.cache_dir, f'{key}.json')
+        # write to a temporary file first, so that concurrent processes never read a partial file.
+        tmp_file_path = f'{cache_file_path}.{os.getpid()}.tmp'
+        with open(tmp_file_path, mode='w', encoding='utf-8') as cache_file:
+            json.dump(dynamic_fields, cache_file)
+        os.replace(tmp_file_path, cache_file_path)
+
+    def get(self, standard_charge_header: Iterable[str]) -> BaseModel:
+        """Returns the model of a standard charge header, building it on a cache miss.
+
+        Args:
+            standard_charge_header (Iterable[str]): raw standard charge header.
+        Returns:
+            BaseModel: The corresponding StandardCharge model class.
+        Raises:
+            ValueError: If the header is missing required fields.
+        """
+        standard_charge_header = normalize_header_fields(standard_charge_header)
+        csv_type = get_csv_type(standard_charge_header)
+        key = get_header_key(standard_charge_header, csv_type)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                self.hits += 1
+                return self.models[key]
+            self.misses += 1
+
+            dynamic_fields = self._load_dynamic_fields(key)
+            if dynamic_fields is None:
+                dynamic_fields = get_dynamic_fields(standard_charge_header, csv_type)
+                if self.cache_dir:
+                    self._save_dynamic_fields(key, dynamic_fields)
+            else:
+                self.disk_hits += 1
+            model = build_standard_charge_model(csv_type, dynamic_fields)
+            self.models[key] = model
+            if len(self.models) > self.max_size:
+                self.models.popitem(last=False)
+            return model
+
+    def info(self) -> Dict[str, int]:
+        """Returns the counters of the cache."""
+        return {'hits': self.hits, 'misses': self.misses, 'disk_hits': self.disk_hits,
+                'size': len(self.models), 'max_size': self.max_size}
+
+    def clear(self):
+        """Removes in-process models and resets the counters. Persisted files are kept."""
+        with self.lock:
+            self.models.clear()
+            self.hits = self.misses = self.disk_hits = 0
+
+
+# models shared by all conversions in a process.
+MODEL_CACHE = StandardChargeModelCache()
+
+
+def create_standard_charge_model(csv_file_path: str, cache: Optional[StandardChargeModelCache] = None,
+                                 header: Optional[List[str]] = None) -> BaseModel:
+    """Returns the appropriate StandardCharge model class based on the CSV type.
+
+    Args:
+        csv_file_path (str): Path to the CSV file, which may be compressed(see `open_input`).
+        cache (StandardChargeModelCache): cache of models. Default is `MODEL_CACHE`.
+        header (List[str]): raw standard charge header of the file, if already read(see `CsvPrelude`).
+
+    Returns:
+        BaseModel: The corresponding StandardCharge model class."""
+    if header is None:
+        header = read_prelude(csv_file_path).header
+    return (cache or MODEL_CACHE).get(header)
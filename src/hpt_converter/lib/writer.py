@@ -0,0 +1,318 @@
+import os
+import shutil
+from collections import OrderedDict
+from enum import StrEnum
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+DEFAULT_ROW_GROUP_SIZE = 1024 * 1024
+DEFAULT_MAX_OPEN_FILES = 256
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+_KEY_SEPARATOR = '\x1f'
+
+
+class OutputFormat(StrEnum):
+    PARQUET = 'parquet'
+    ARROW = 'arrow'             # Arrow IPC file(Feather V2), which can be memory mapped and read without copying.
+    ARROW_STREAM = 'arrows'     # Arrow IPC stream, which is read sequentially.
+
+
+# codecs of each format, the first of which is the default. 'none' writes uncompressed files.
+OUTPUT_CODECS = {
+    OutputFormat.PARQUET: ['snappy', 'zstd', 'gzip', 'brotli', 'lz4', 'none'],
+    OutputFormat.ARROW: ['lz4', 'zstd', 'none'],
+    OutputFormat.ARROW_STREAM: ['lz4', 'zstd', 'none'],
+}
+
+
+class _IpcWriter:
+    """Writes tables to an Arrow IPC file or stream with the methods of `pq.ParquetWriter` used by `RowGroupWriter`.
+    A row group is written as a record batch."""
+    def __init__(self, file_path: str, schema: pa.Schema, stream: bool, compression: Optional[str],
+                 compression_level: Optional[int]):
+        self.sink = pa.OSFile(file_path, mode='wb')
+        codec = pa.Codec(compression, compression_level) if compression else None
+        options = pa.ipc.IpcWriteOptions(compression=codec)
+        self.writer = (pa.ipc.new_stream if stream else pa.ipc.new_file)(self.sink, schema, options=options)
+
+    def write_table(self, table: pa.Table, row_group_size: int):
+        # chunks of buffered tables are combined so that each row group is a single record batch.
+        self.writer.write_table(table.combine_chunks(), max_chunksize=row_group_size)
+
+    def close(self):
+        self.writer.close()
+        self.sink.close()
+
+
+class OutputSink:
+    """Format and compression of output files: Parquet with any of its codecs, or Arrow IPC files or streams, which
+    a reader in Arrow loads with little or no decoding. Files are named with the suffix of the format.
+
+    Args:
+        format (OutputFormat): file format.
+        compression (str): codec of the format(see `OUTPUT_CODECS`), or 'none'. Default is the first codec of the format.
+        compression_level (int): level of the codec, if it has levels. Default is the default level of the codec.
+    Raises:
+        ValueError: If the codec or the level isn't supported by the format.
+    """
+    def __init__(self, format: OutputFormat = OutputFormat.PARQUET, compression: Optional[str] = None,
+                 compression_level: Optional[int] = None):
+        self.format = OutputFormat(format)
+        codecs = OUTPUT_CODECS[self.format]
+        self.compression = compression.lower() if compression else codecs[0]
+        if self.compression not in codecs:
+            raise ValueError(f"Invalid {self.format.value} compression: {compression}, expected one of {codecs}")
+        if compression_level is not None:
+            if self.compression == 'none' or not pa.Codec.supports_compression_level(self.compression):
+                raise ValueError(f"Compression {self.compression} doesn't support a compression level")
+            low = pa.Codec.minimum_compression_level(self.compression)
+            high = pa.Codec.maximum_compression_level(self.compression)
+            if not low <= compression_level <= high:
+                raise ValueError(f"Invalid {self.compression} compression level: {compression_level}, "
+                                 f"expected {low} to {high}")
+        self.compression_level = compression_level
+
+    def __str__(self) -> str:
+        level = f':{self.compression_level}' if self.compression_level is not None else ''
+        return f'{self.format.value}({self.compression}{level})'
+
+    @property
+    def suffix(self) -> str:
+        return f'.{self.format.value}'
+
+    def open_writer(self, file_path: str, schema: pa.Schema, sorting_columns: Optional[List[pq.SortingColumn]] = None,
+                    write_page_index: bool = False):
+        """Opens a writer of the file, with `write_table(table, row_group_size)` and `close()`.
+
+        Raises:
+            ValueError: If a page index is requested for Arrow IPC, which only Parquet has.
+        """
+        compression = self.compression if self.compression != 'none' else None
+        if self.format == OutputFormat.PARQUET:
+            return pq.ParquetWriter(file_path, schema, compression=compression or 'NONE',
+                                    compression_level=self.compression_level, sorting_columns=sorting_columns,
+                                    write_page_index=write_page_index)
+        if write_page_index:
+            raise ValueError(f"Page index can't be written to {self.format.value} files, only to parquet")
+        return _IpcWriter(file_path, schema, self.format == OutputFormat.ARROW_STREAM, compression,
+                          self.compression_level)
+
+    def write_table(self, table: pa.Table, file_path: str):
+        """Writes a table to a file in row groups of `DEFAULT_ROW_GROUP_SIZE` rows."""
+        writer = self.open_writer(file_path, table.schema)
+        try:
+            writer.write_table(table, row_group_size=DEFAULT_ROW_GROUP_SIZE)
+        finally:
+            writer.close()
+
+    def read_table(self, file_path: str) -> pa.Table:
+        """Reads a file written by this sink. An Arrow IPC file is memory mapped."""
+        if self.format == OutputFormat.PARQUET:
+            return pq.read_table(file_path)
+        if self.format == OutputFormat.ARROW:
+            with pa.memory_map(file_path) as source:
+                return pa.ipc.open_file(source).read_all()
+        with pa.OSFile(file_path) as source:
+            return pa.ipc.open_stream(source).read_all()
+
+    def iter_batches(self, file_path: str, batch_size: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+        """Reads a file written by this sink in record batches of at most `batch_size` rows, one row group at a time.
+        An Arrow IPC file is memory mapped, so uncompressed batches are read without copying."""
+        if self.format == OutputFormat.PARQUET:
+            yield from pq.ParquetFile(file_path).iter_batches(batch_size=batch_size or DEFAULT_ROW_GROUP_SIZE)
+            return
+        if self.format == OutputFormat.ARROW:
+            source = pa.memory_map(file_path)
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            source = pa.OSFile(file_path)
+            batches = pa.ipc.open_stream(source)
+        with source:
+            for batch in batches:
+                for offset in range(0, batch.num_rows, batch_size or max(batch.num_rows, 1)):
+                    yield batch.slice(offset, batch_size)
+
+
+class RowGroupWriter:
+    """Streams tables of any size into a single parquet file as row groups of `row_group_size` rows.
+    At most one row group is buffered in memory. If the writer exits with an exception, the partial file is removed.
+    If `sort_by` is given, the rows of each row group are sorted by those columns, and the file metadata declares it.
+    If `write_page_index` is True, page-level statistics are written so that readers can skip pages.
+    If `max_buffer_bytes` is given, buffered rows are also written when their Arrow size reaches it, in a smaller row group.
+    `sink` selects the format and compression of the file(see `OutputSink`); a row group of an Arrow IPC file is a
+    record batch. Default is Parquet with SNAPPY compression.
+    """
+    def __init__(self, file_path: str, schema: pa.Schema, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 sink: Optional[OutputSink] = None, sort_by: Optional[List[str]] = None, write_page_index: bool = False,
+                 max_buffer_bytes: Optional[int] = None):
+        if row_group_size <= 0:
+            raise ValueError(f"Invalid row group size: {row_group_size}")
+        self.file_path = file_path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.sort_keys = [(name, 'ascending') for name in sort_by or []]
+        sorting_columns = pq.SortingColumn.from_ordering(schema, self.sort_keys, null_placement='at_end') if sort_by else None
+        self.writer = (sink or OutputSink()).open_writer(file_path, schema, sorting_columns, write_page_index)
+        self.buffer: List[pa.Table] = []
+        self.buffered_rows = 0
+        self.buffered_bytes = 0
+        self.max_buffer_bytes = max_buffer_bytes
+        self.row_count = 0
+
+    def __enter__(self) -> 'RowGroupWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.remove(self.file_path)
+
+    def _flush(self, final: bool = False):
+        table = pa.concat_tables(self.buffer)
+        if self.sort_keys:
+            table = table.sort_by(self.sort_keys)
+        offset = 0
+        while table.num_rows - offset >= self.row_group_size or (final and offset < table.num_rows):
+            self.writer.write_table(table.slice(offset, self.row_group_size), row_group_size=self.row_group_size)
+            offset += self.row_group_size
+        remainder = table.slice(offset) if offset < table.num_rows else None
+        self.buffer = [remainder] if remainder is not None else []
+        self.buffered_rows = remainder.num_rows if remainder is not None else 0
+        self.buffered_bytes = remainder.nbytes if remainder is not None else 0
+
+    def write(self, table: pa.Table):
+        """Buffers the table and writes every full row group.
+
+        Args:
+            table (pa.Table): rows in the schema of the writer.
+        """
+        if table.num_rows == 0:
+            return
+        self.buffer.append(table)
+        self.buffered_rows += table.num_rows
+        self.buffered_bytes += table.nbytes
+        self.row_count += table.num_rows
+        if self.max_buffer_bytes is not None and self.buffered_bytes >= self.max_buffer_bytes:
+            self._flush(final=True)
+        elif self.buffered_rows >= self.row_group_size:
+            self._flush()
+
+    def flush(self):
+        """Writes the buffered rows, the last of them in a row group smaller than `row_group_size`."""
+        if self.buffered_rows:
+            self._flush(final=True)
+
+    def close(self):
+        """Writes the remaining rows and the file footer."""
+        if self.writer is None:
+            return
+        if self.buffered_rows:
+            self._flush(final=True)
+        self.writer.close()
+        self.writer = None
+
+
+class PartitionedWriter:
+    """Streams tables of any size into a hive partitioned dataset, e.g. `<dir>/setting=inpatient/part-0.parquet`.
+    Rows are written by a `RowGroupWriter` per partition, without the partition columns, in files of the format of `sink`. At most `max_open_files`
+    partitions are open at a time; the least recently written one is closed when another is opened, and a closed
+    partition continues in a new part file. If the writer exits with an exception, the dataset folder is removed.
+    An existing dataset folder is replaced. If `max_buffer_bytes` is given, the partition with the most buffered rows
+    is written whenever the rows buffered by all partitions reach it.
+    """
+    def __init__(self, dir_path: str, schema: pa.Schema, partition_by: List[str],
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE, sink: Optional[OutputSink] = None,
+                 sort_by: Optional[List[str]] = None, write_page_index: bool = False,
+                 max_open_files: int = DEFAULT_MAX_OPEN_FILES, max_buffer_bytes: Optional[int] = None):
+        if not partition_by:
+            raise ValueError("Partitioned dataset requires partition columns")
+        self.dir_path = dir_path
+        self.partition_by = partition_by
+        self.file_schema = pa.schema([field for field in schema if field.name not in partition_by])
+        self.sink = sink or OutputSink()
+        self.writer_options = {'row_group_size': row_group_size, 'sink': self.sink, 'sort_by': sort_by,
+                               'write_page_index': write_page_index}
+        self.max_open_files = max_open_files
+        self.max_buffer_bytes = max_buffer_bytes
+        self.writers: Dict[Tuple, RowGroupWriter] = OrderedDict()
+        self.part_counts: Dict[Tuple, int] = {}
+        self.row_count = 0
+        shutil.rmtree(dir_path, ignore_errors=True)
+        os.makedirs(dir_path)
+
+    def __enter__(self) -> 'PartitionedWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            for writer in self.writers.values():
+                writer.__exit__(exc_type, exc_value, traceback)
+            self.writers.clear()
+            shutil.rmtree(self.dir_path, ignore_errors=True)
+
+    def _partition_path(self, key: Tuple) -> str:
+        names = [f"{name}={quote(str(value), safe='') if value is not None else HIVE_NULL_PARTITION}"
+                 for name, value in zip(self.partition_by, key)]
+        return os.path.join(self.dir_path, *names)
+
+    def _get_writer(self, key: Tuple) -> RowGroupWriter:
+        writer = self.writers.get(key)
+        if writer is not None:
+            self.writers.move_to_end(key)
+            return writer
+        if len(self.writers) >= self.max_open_files:
+            _, oldest = self.writers.popitem(last=False)
+            oldest.close()
+        part_path = self._partition_path(key)
+        os.makedirs(part_path, exist_ok=True)
+        part = self.part_counts.get(key, 0)
+        self.part_counts[key] = part + 1
+        writer = RowGroupWriter(os.path.join(part_path, f'part-{part}{self.sink.suffix}'), self.file_schema, **self.writer_options)
+        self.writers[key] = writer
+        return writer
+
+    def write(self, table: pa.Table):
+        """Splits the table by partition, keeping the order of rows in each partition, and writes the partitions.
+
+        Args:
+            table (pa.Table): rows in the schema of the writer.
+        """
+        if table.num_rows == 0:
+            return
+        keys = pc.binary_join_element_wise(
+            *[pc.fill_null(table[name].cast(pa.string()), HIVE_NULL_PARTITION) for name in self.partition_by],
+            _KEY_SEPARATOR).combine_chunks().dictionary_encode()
+        indices = keys.indices.to_numpy()
+        order = np.argsort(indices, kind='stable')
+        _, starts = np.unique(indices[order], return_index=True)
+        table = table.take(pa.array(order))
+        ends = list(starts[1:]) + [table.num_rows]
+        for start, end in zip(starts, ends):
+            part = table.slice(int(start), int(end - start))
+            key = tuple(part[name][0].as_py() for name in self.partition_by)
+            self._get_writer(key).write(part.drop_columns(self.partition_by))
+        self.row_count += table.num_rows
+        if self.max_buffer_bytes is not None:
+            while self.writers and self.buffered_bytes >= self.max_buffer_bytes:
+                max(self.writers.values(), key=lambda writer: writer.buffered_bytes).flush()
+
+    @property
+    def buffered_bytes(self) -> int:
+        return sum(writer.buffered_bytes for writer in self.writers.values())
+
+    def close(self):
+        """Writes the remaining rows and the footers of open files."""
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
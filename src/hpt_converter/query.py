@@ -0,0 +1,172 @@
+import argparse
+import bisect
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from hpt_converter.lib.index import (INDEX_FILE_NAME, IndexKeyType,
+                                     build_index, normalize_description)
+
+# columns of general data elements added to every standard charge found.
+GENERAL_DATA_ELEMENT_COLUMNS = ['hospital_name', 'hospital_location', 'last_updated_on']
+
+
+class StandardChargeIndex:
+    """Looks up standard charges in the output folder of a conversion by code, description and plan id with the
+    sidecar index(see `build_index`). Only the row groups that have rows with every key are read, and only the row
+    range of those rows in each row group is filtered, so a point query reads a fraction of the file. Entries of a key
+    are found by binary search, as the index is sorted by key type and key.
+    Results are joined with the payer plan and general data elements of each standard charge.
+
+    Args:
+        dir_path (str): output folder of a conversion.
+        build (bool): If True, the index is built if the folder doesn't have one.
+    Raises:
+        ValueError: If the folder has no index and `build` is False.
+    """
+    def __init__(self, dir_path: str, build: bool = False):
+        index_file_path = os.path.join(dir_path, INDEX_FILE_NAME)
+        if not os.path.exists(index_file_path):
+            if not build:
+                raise ValueError(f"No standard charge index in {dir_path}, convert with write_index=True or build it")
+            build_index(dir_path)
+        self.dir_path = dir_path
+        self.index = pq.read_table(index_file_path)
+        self.key_types = self.index['key_type'].combine_chunks()
+        self.keys = self.index['key'].combine_chunks()
+        self.parquet_file = pq.ParquetFile(os.path.join(dir_path, 'standard_charges.parquet'))
+        metadata = self.parquet_file.metadata
+        self.row_group_offsets = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        self.compact = 'plan_key' in self.parquet_file.schema_arrow.names
+        self.payer_plans = pq.read_table(os.path.join(dir_path, 'payer_plans.parquet'))
+        general_data_elements = pq.read_table(os.path.join(dir_path, 'general_data_elements.parquet'),
+                                              columns=GENERAL_DATA_ELEMENT_COLUMNS)
+        self.general_data_elements = general_data_elements.slice(0, 1).to_pylist()[0]
+
+    def _find(self, key_type: IndexKeyType, key: str, code_type: Optional[str] = None) -> Dict[int, Tuple[int, int]]:
+        """Returns the first and last row numbers of the rows with the key, by row group."""
+        # strings are sorted by UTF-8 bytes in the index, which is the order of code points in python.
+        def sort_key(i: int) -> Tuple[str, str]:
+            return self.key_types[i].as_py(), self.keys[i].as_py()
+        start = bisect.bisect_left(range(len(self.keys)), (key_type.value, key), key=sort_key)
+        end = bisect.bisect_right(range(len(self.keys)), (key_type.value, key), lo=start, key=sort_key)
+        entries = self.index.slice(start, end - start)
+        if code_type:
+            entries = entries.filter(pc.equal(entries['code_type'], code_type))
+        ranges = {}
+        for entry in entries.select(['row_group', 'first_row', 'last_row']).to_pylist():
+            first, last = ranges.get(entry['row_group'], (entry['first_row'], entry['last_row']))
+            ranges[entry['row_group']] = (min(first, entry['first_row']), max(last, entry['last_row']))
+        return ranges
+
+    def _plan_key(self, plan_id: str) -> int:
+        plan_keys = pc.index(self.payer_plans['plan_id'], plan_id).as_py()
+        return self.payer_plans['plan_key'][plan_keys].as_py() if plan_keys >= 0 else -1
+
+    def _match(self, table: pa.Table, code: Optional[str], code_type: Optional[str], description: Optional[str],
+               plan_id: Optional[str]) -> pa.Array:
+        """Returns the mask of the rows of a table that match every given key."""
+        mask = np.ones(table.num_rows, dtype=bool)
+        if code:
+            codes = table['codes'].combine_chunks()
+            values = pc.list_flatten(codes)
+            matches = pc.equal(pc.struct_field(values, 'code'), code)
+            if code_type:
+                matches = pc.and_(matches, pc.equal(pc.struct_field(values, 'code_type'), code_type))
+            code_mask = np.zeros(table.num_rows, dtype=bool)
+            code_mask[pc.list_parent_indices(codes).filter(pc.fill_null(matches, False)).to_numpy()] = True
+            mask &= code_mask
+        if description:
+            descriptions = pc.utf8_lower(pc.utf8_trim_whitespace(table['description']))
+            mask &= pc.fill_null(pc.equal(descriptions, normalize_description(description)), False).to_numpy()
+        if plan_id:
+            plans = pc.equal(table['plan_key'], self._plan_key(plan_id)) if self.compact else pc.equal(table['plan_id'], plan_id)
+            mask &= pc.fill_null(plans, False).to_numpy()
+        return pa.array(mask)
+
+    def _join(self, table: pa.Table) -> pa.Table:
+        """Adds the payer plan and general data elements of each standard charge."""
+        plan_column = 'plan_key' if self.compact else 'plan_id'
+        positions = pc.index_in(table[plan_column], self.payer_plans[plan_column])
+        for name in self.payer_plans.column_names:
+            if name not in table.column_names and name != 'file_id':
+                table = table.append_column(name, self.payer_plans[name].take(positions))
+        for name, value in self.general_data_elements.items():
+            table = table.append_column(name, pa.array([value] * table.num_rows, pa.string()))
+        return table
+
+    def lookup(self, code: Optional[str] = None, code_type: Optional[str] = None, description: Optional[str] = None,
+               plan_id: Optional[str] = None, columns: Optional[List[str]] = None) -> pa.Table:
+        """Returns the standard charges with every given key, in file order.
+
+        Args:
+            code (str): a code of the standard charge, e.g. '70553'.
+            code_type (str): type of the code, e.g. 'CPT'. Any type if not given.
+            description (str): description of the standard charge, compared ignoring case.
+            plan_id (str): id of the payer plan of the standard charge.
+            columns (List[str]): standard charge columns to return. Default is all columns.
+        Returns:
+            pa.Table: `row_number` in standard_charges.parquet, the standard charge columns, the payer plan columns
+                and `GENERAL_DATA_ELEMENT_COLUMNS` of each standard charge found.
+        Raises:
+            ValueError: If no code, description or plan id is given.
+        """
+        keys = []
+        if code:
+            keys.append(self._find(IndexKeyType.CODE, code, code_type))
+        if description:
+            keys.append(self._find(IndexKeyType.DESCRIPTION, normalize_description(description)))
+        if plan_id:
+            keys.append(self._find(IndexKeyType.PLAN_ID, plan_id))
+        if not keys:
+            raise ValueError("Look up standard charges by at least one of code, description or plan_id")
+        columns = columns or self.parquet_file.schema_arrow.names
+        plan_column = 'plan_key' if self.compact else 'plan_id'
+        read_columns = list(dict.fromkeys(columns + ['codes', 'description', plan_column]))
+        tables = []
+        for row_group in sorted(set.intersection(*(set(ranges) for ranges in keys))):
+            first = max(ranges[row_group][0] for ranges in keys)
+            last = min(ranges[row_group][1] for ranges in keys)
+            if first > last:
+                continue
+            offset = int(self.row_group_offsets[row_group])
+            table = self.parquet_file.read_row_group(row_group, columns=read_columns).slice(first - offset, last - first + 1)
+            table = table.add_column(0, 'row_number', pa.array(range(first, last + 1), pa.int64()))
+            tables.append(table.filter(self._match(table, code, code_type, description, plan_id)))
+        if tables:
+            table = pa.concat_tables(tables)
+        else:
+            schema = self.parquet_file.schema_arrow
+            table = pa.schema([pa.field('row_number', pa.int64()), *(schema.field(name) for name in read_columns)]).empty_table()
+        return self._join(table.select(['row_number', *dict.fromkeys(columns + [plan_column])]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up standard charges in converted output with its index.")
+
+    parser.add_argument("output_folders", type=str, nargs='+', help="Paths to output folders of conversions.")
+    parser.add_argument("--code", type=str, help="Code of standard charges, e.g. 70553.")
+    parser.add_argument("--code-type", type=str, help="Type of the code, e.g. CPT. Default is any type.")
+    parser.add_argument("--description", type=str, help="Description of standard charges, compared ignoring case.")
+    parser.add_argument("--plan-id", type=str, help="Id of the payer plan of standard charges.")
+    parser.add_argument("--columns", type=str, help="Comma separated standard charge columns. Default is all columns.")
+    parser.add_argument("--build-index", action='store_true', help="Build the index of folders that don't have one.")
+    args = parser.parse_args()
+
+    try:
+        for output_folder in args.output_folders:
+            result = StandardChargeIndex(output_folder, build=args.build_index).lookup(
+                code=args.code, code_type=args.code_type, description=args.description, plan_id=args.plan_id,
+                columns=args.columns.split(',') if args.columns else None)
+            for row in result.to_pylist():
+                print(json.dumps(row, default=str))
+        sys.exit(0)
+    except Exception as e:
+        print(f"Failed: {str(e)}")
+        sys.exit(-1)
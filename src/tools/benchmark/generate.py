@@ -0,0 +1,157 @@
+import argparse
+import csv
+import os
+import random
+from typing import List, Optional
+
+from hpt_converter.lib.schema.abstract.v1.standard_charge import (
+    CodeType, DrugTypeOfMeasument, Setting, StandardChargeMethod)
+from hpt_converter.lib.schema.csv import CsvType
+
+AFFIRMATION = ("To the best of its knowledge and belief, the hospital has included all applicable standard charge "
+               "information in accordance with the requirements of 45 CFR 180.50, and the information encoded is true, "
+               "accurate, and complete as of the date indicated.")
+GENERAL_DATA_ELEMENTS = {
+    'hospital_name': 'Synthetic Hospital',
+    'last_updated_on': '2024-07-01',
+    'version': '2.0.0',
+    'hospital_location': 'Synthetic Hospital|Synthetic Surgical Center',
+    'hospital_address': '1 Main Street, Fullerton, CA 92832|2 Ocean Ave, San Jose, CA 94088',
+    'license_number|CA': '50056',
+    AFFIRMATION: 'TRUE',
+}
+WIDE_PAYER_PLAN_TEMPLATES = ['standard_charge|{}|negotiated_dollar', 'standard_charge|{}|negotiated_percentage',
+                             'standard_charge|{}|negotiated_algorithm', 'estimated_amount|{}',
+                             'standard_charge|{}|methodology', 'additional_payer_notes|{}']
+ROWS_PER_WRITE = 10000
+# part of the names of generated files, changed whenever the content of generated files changes so that
+# files cached by the benchmark runner are generated again.
+GENERATOR_VERSION = 2
+
+
+def get_payer_plans(payer_plan_count: int) -> List[str]:
+    """Returns '<payer>|<plan>' names, with 4 plans per payer. Names are in lower case, as the converters match
+    payer plan columns against the normalized header."""
+    return [f'payer_{i // 4}|plan_{i % 4}' for i in range(payer_plan_count)]
+
+
+def get_header(csv_type: CsvType, payer_plan_count: int, code_count: int) -> List[str]:
+    header = ['description']
+    for n in range(1, code_count + 1):
+        header += [f'code|{n}', f'code|{n}|type']
+    header += ['modifiers', 'setting', 'drug_unit_of_measurement', 'drug_type_of_measurement',
+               'standard_charge|gross', 'standard_charge|discounted_cash']
+    if csv_type == CsvType.TALL:
+        header += ['payer_name', 'plan_name', 'standard_charge|negotiated_dollar', 'standard_charge|negotiated_percentage',
+                   'standard_charge|negotiated_algorithm', 'estimated_amount', 'standard_charge|methodology',
+                   'additional_payer_notes']
+    else:
+        for payer_plan in get_payer_plans(payer_plan_count):
+            header += [template.format(payer_plan) for template in WIDE_PAYER_PLAN_TEMPLATES]
+    return header + ['standard_charge|min', 'standard_charge|max', 'additional_generic_notes']
+
+
+class RowGenerator:
+    """Generates random standard charge rows that are valid for the CSV v2 schema."""
+    def __init__(self, csv_type: CsvType, payer_plan_count: int, code_count: int, null_density: float, seed: int):
+        self.csv_type = csv_type
+        self.payer_plans = get_payer_plans(payer_plan_count)
+        self.code_count = code_count
+        self.null_density = null_density
+        self.random = random.Random(seed)
+        self.code_types = [member.value for member in CodeType]
+        self.settings = [member.value for member in Setting]
+        self.drug_types = [member.value.upper() for member in DrugTypeOfMeasument]
+        self.methodologies = [member.value for member in StandardChargeMethod]
+
+    def _optional(self, value: str) -> str:
+        return '' if self.random.random() < self.null_density else value
+
+    def _price(self, max_value: int = 100000) -> str:
+        return self._optional(f'{self.random.uniform(1, max_value):.2f}')
+
+    def _payer_plan_values(self) -> List[str]:
+        return [self._price(), self._optional(f'{self.random.uniform(1, 100):.2f}'), self._optional('algorithm'),
+                self._price(), self._optional(self.random.choice(self.methodologies)), self._optional('payer note')]
+
+    def _base_values(self, item: int) -> List[str]:
+        values = [f'Synthetic item or service {item}']
+        for _ in range(self.code_count):
+            values += [f'{self.random.randrange(10000, 99999)}', self.random.choice(self.code_types)]
+        is_drug = self.random.random() < 0.2
+        values += [self._optional('50'), self.random.choice(self.settings),
+                   self.random.choice(['1', '2.5', '10']) if is_drug else '',
+                   self.random.choice(self.drug_types) if is_drug else '',
+                   self._price(), self._price()]
+        return values
+
+    def rows(self, item: int) -> List[List[str]]:
+        """Returns the rows of an item: one row per payer plan in tall format, a single row in wide format."""
+        base_values = self._base_values(item)
+        tail_values = [self._price(), self._price(), self._optional('generic note')]
+        if self.csv_type == CsvType.WIDE:
+            values = list(base_values)
+            for _ in self.payer_plans:
+                values += self._payer_plan_values()
+            return [values + tail_values]
+        return [base_values + payer_plan.split('|') + self._payer_plan_values() + tail_values
+                for payer_plan in self.payer_plans]
+
+
+def generate_csv(csv_file_path: str, csv_type: CsvType, rows: int, payer_plan_count: int = 8, code_count: int = 2,
+                 null_density: float = 0.1, seed: int = 0, size: Optional[int] = None) -> int:
+    """Writes a synthetic CMS v2 CSV file.
+
+    Args:
+        csv_file_path (str): Path to output CSV file.
+        csv_type (CsvType): The type of the CSV file (tall or wide).
+        rows (int): Number of standard charge rows. Ignored if `size` is given.
+        payer_plan_count (int): Number of payer plans. In tall format, every item has a row per payer plan.
+        code_count (int): Number of code|<n> column pairs.
+        null_density (float): Ratio of blank optional values.
+        seed (int): Seed of random values, so that the same arguments produce the same file.
+        size (int): If given, rows are written until the file reaches this many bytes.
+    Returns:
+        int: Number of standard charge rows written.
+    """
+    generator = RowGenerator(csv_type, payer_plan_count, code_count, null_density, seed)
+    written = 0
+    item = 0
+    with open(csv_file_path, mode='w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(GENERAL_DATA_ELEMENTS.keys())
+        writer.writerow(GENERAL_DATA_ELEMENTS.values())
+        writer.writerow(get_header(csv_type, payer_plan_count, code_count))
+        while (csv_file.tell() < size) if size else (written < rows):
+            block = []
+            while len(block) < ROWS_PER_WRITE:
+                block.extend(generator.rows(item))
+                item += 1
+            if not size:
+                block = block[:rows - written]
+            writer.writerows(block)
+            written += len(block)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic CMS v2 HPT CSV file.")
+
+    parser.add_argument("output", type=str, help="Path to output CSV file.")
+    parser.add_argument("--csv-type", choices=[m.value for m in CsvType], default=CsvType.TALL.value,
+                        help="Type of CSV file(\"wide\" or \"tall\"). Default is \"tall\".")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of standard charge rows. Default is 100000.")
+    parser.add_argument("--size", type=str, help="Target file size, e.g. 500M or 20G. Overrides --rows.")
+    parser.add_argument("--payer-plans", type=int, default=8, help="Number of payer plans. Default is 8.")
+    parser.add_argument("--codes", type=int, default=2, help="Number of code|<n> column pairs. Default is 2.")
+    parser.add_argument("--null-density", type=float, default=0.1, help="Ratio of blank optional values. Default is 0.1.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of random values. Default is 0.")
+    args = parser.parse_args()
+
+    size = None
+    if args.size:
+        units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+        size = int(float(args.size[:-1]) * units[args.size[-1].upper()]) if args.size[-1].upper() in units else int(args.size)
+    written = generate_csv(args.output, CsvType(args.csv_type), args.rows, args.payer_plans, args.codes,
+                           args.null_density, args.seed, size)
+    print(f"Wrote {written} rows({os.path.getsize(args.output)} bytes) to {args.output}")
@@ -0,0 +1,239 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from queue import Empty
+from typing import Dict, List, Optional
+
+import pyarrow.parquet as pq
+
+from hpt_converter.csv2parquet import Csv2Parquet, Engine
+from hpt_converter.lib.schema.csv import CsvType
+from tools.benchmark.generate import GENERATOR_VERSION, generate_csv
+
+DEFAULT_WORK_DIR = '.benchmark'
+DEFAULT_TOLERANCE = 0.2
+# standard charge fields taken from the payer plan columns of wide files, which every wide case must convert.
+PAYER_PLAN_FIELDS = ['negotiated_dollar', 'negotiated_percentage', 'estimated_amount', 'methodology']
+
+
+@dataclass
+class BenchmarkCase:
+    csv_type: CsvType
+    engine: Engine
+    rows: int
+    payer_plan_count: int = 8
+    code_count: int = 2
+    null_density: float = 0.1
+    workers: int = 1
+
+    @property
+    def name(self) -> str:
+        name = f'{self.csv_type}-{self.engine}-{self.rows}x{self.payer_plan_count}'
+        return name if self.workers == 1 else f'{name}-w{self.workers}'
+
+    @property
+    def input_file_name(self) -> str:
+        return (f'{self.csv_type}_{self.rows}_{self.payer_plan_count}_{self.code_count}_'
+                f'{self.null_density}_v{GENERATOR_VERSION}.csv')
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    input_bytes: int
+    output_bytes: int
+    input_row_count: int
+    standard_charge_count: int
+    elapsed_seconds: float
+    rows_per_second: float
+    mb_per_second: float
+    peak_rss_mb: float
+
+
+def get_cases(rows: int, payer_plan_count: int, engines: List[Engine], workers: int) -> List[BenchmarkCase]:
+    """Returns a case for every combination of CSV type and engine. In wide format, a row holds every payer plan,
+    so wide files have `rows // payer_plan_count` rows to produce as many standard charges as tall files."""
+    cases = []
+    for csv_type in CsvType:
+        case_rows = rows if csv_type == CsvType.TALL else max(rows // payer_plan_count, 1)
+        for engine in engines:
+            cases.append(BenchmarkCase(csv_type, engine, case_rows, payer_plan_count))
+            if workers > 1:
+                cases.append(BenchmarkCase(csv_type, engine, case_rows, payer_plan_count, workers=workers))
+    return cases
+
+
+def get_dir_size(dir_path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, file_name))
+               for root, _, file_names in os.walk(dir_path) for file_name in file_names)
+
+
+def check_payer_plan_fields(sc_file_path: str):
+    """Checks that payer plan columns of a wide input were converted, from the statistics of the standard charge file.
+
+    Args:
+        sc_file_path (str): Path to standard_charges.parquet of a case.
+    Raises:
+        RuntimeError: If a field taken from payer plan columns is null in every row.
+    """
+    metadata = pq.ParquetFile(sc_file_path).metadata
+    schema = metadata.schema.to_arrow_schema()
+    for name in PAYER_PLAN_FIELDS:
+        index = schema.get_field_index(name)
+        null_count = sum(metadata.row_group(i).column(index).statistics.null_count
+                         for i in range(metadata.num_row_groups))
+        if metadata.num_rows and null_count == metadata.num_rows:
+            raise RuntimeError(f"{name} of {sc_file_path} is null in every row, payer plan columns weren't converted")
+
+
+def _convert(case: BenchmarkCase, input_path: str, output_path: str, queue: multiprocessing.Queue):
+    start = time.perf_counter()
+    meta_data = Csv2Parquet(input_path, output_path, csv_type=case.csv_type, engine=case.engine,
+                            workers=case.workers).convert()
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    peak_rss_mb = peak_rss / (1 << 20) if sys.platform == 'darwin' else peak_rss / (1 << 10)
+    queue.put((asdict(meta_data), elapsed, peak_rss_mb))
+
+
+def run_case(case: BenchmarkCase, work_dir: str) -> BenchmarkResult:
+    """Converts the input file of a case in a fresh process, so that peak RSS isn't shared between cases.
+    Input files are generated once and reused across runs.
+
+    Args:
+        case (BenchmarkCase): the case to run.
+        work_dir (str): folder of generated input files and outputs.
+    Returns:
+        BenchmarkResult: measurements of the case.
+    Raises:
+        RuntimeError: If the conversion fails, or payer plan columns of a wide input weren't converted.
+    """
+    input_path = os.path.join(work_dir, 'inputs', case.input_file_name)
+    if not os.path.exists(input_path):
+        os.makedirs(os.path.dirname(input_path), exist_ok=True)
+        generate_csv(input_path + '.tmp', case.csv_type, case.rows, case.payer_plan_count, case.code_count,
+                     case.null_density)
+        os.replace(input_path + '.tmp', input_path)
+    output_path = os.path.join(work_dir, 'outputs', case.name)
+    shutil.rmtree(output_path, ignore_errors=True)
+    os.makedirs(output_path)
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_convert, args=(case, input_path, output_path, queue))
+    process.start()
+    # the result is taken before joining, since a process doesn't exit until what it put in a queue is read.
+    result = None
+    while result is None and (process.is_alive() or not queue.empty()):
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            pass
+    process.join()
+    if process.exitcode != 0 or result is None:
+        raise RuntimeError(f"Benchmark case {case.name} failed with exit code {process.exitcode}")
+    meta_data, elapsed, peak_rss_mb = result
+    if case.csv_type == CsvType.WIDE:
+        check_payer_plan_fields(os.path.join(output_path, 'standard_charges.parquet'))
+
+    input_bytes = os.path.getsize(input_path)
+    return BenchmarkResult(name=case.name, input_bytes=input_bytes, output_bytes=get_dir_size(output_path),
+                           input_row_count=meta_data['input_row_count'],
+                           standard_charge_count=meta_data['standard_charge_count'],
+                           elapsed_seconds=round(elapsed, 3),
+                           rows_per_second=round(meta_data['input_row_count'] / elapsed, 1),
+                           mb_per_second=round(input_bytes / (1 << 20) / elapsed, 3),
+                           peak_rss_mb=round(peak_rss_mb, 1))
+
+
+def compare_results(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Compares results against a baseline.
+
+    Args:
+        results (dict): results keyed by case name.
+        baseline (dict): baseline results keyed by case name. Cases missing from either side are ignored.
+        tolerance (float): allowed ratio of slowdown in rows/sec and of growth in peak RSS and output size.
+    Returns:
+        List[str]: descriptions of regressions, empty if there is none.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['rows_per_second'] < base['rows_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: rows/sec {result['rows_per_second']} < baseline {base['rows_per_second']}")
+        for key in ('peak_rss_mb', 'output_bytes'):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {result[key]} > baseline {base[key]}")
+    return regressions
+
+
+def run(cases: List[BenchmarkCase], work_dir: str, output: str, baseline_path: Optional[str] = None,
+        tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Runs benchmark cases and writes their results to a JSON file.
+
+    Args:
+        cases (List[BenchmarkCase]): cases to run.
+        work_dir (str): folder of generated input files and outputs.
+        output (str): path to the JSON results file.
+        baseline_path (str): If given, results are compared against this JSON results file.
+        tolerance (float): allowed ratio of regression(see `compare_results`).
+    Returns:
+        List[str]: descriptions of regressions, empty if there is none or no baseline.
+    """
+    results = {}
+    for case in cases:
+        result = run_case(case, work_dir)
+        print(f"{result.name}: {result.rows_per_second} rows/sec, {result.mb_per_second} MB/sec, "
+              f"peak RSS {result.peak_rss_mb} MB, output {result.output_bytes} bytes")
+        results[result.name] = asdict(result)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, mode='w', encoding='utf-8') as output_file:
+        json.dump({'created_at': datetime.now(timezone.utc).isoformat(),
+                   'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'results': results}, output_file, indent=2)
+
+    if not baseline_path:
+        return []
+    with open(baseline_path, mode='r', encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    return compare_results(results, baseline, tolerance)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HPT converters on synthetic CSV files.")
+
+    parser.add_argument("--rows", type=int, default=200000,
+                        help="Number of standard charges per case. Default is 200000.")
+    parser.add_argument("--payer-plans", type=int, default=8, help="Number of payer plans. Default is 8.")
+    parser.add_argument("--engine", choices=[m.value for m in Engine], action='append',
+                        help="Engine to benchmark. Can be repeated. Default is all engines.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="If greater than 1, also benchmark parallel conversion with this many workers.")
+    parser.add_argument("--work-dir", type=str, default=DEFAULT_WORK_DIR,
+                        help=f"Path to folder of generated inputs and outputs. Default is {DEFAULT_WORK_DIR}.")
+    parser.add_argument("--output", type=str, help="Path to JSON results file. Default is results.json in the work dir.")
+    parser.add_argument("--baseline", type=str, help="Path to baseline JSON results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed ratio of regression against the baseline. Default is {DEFAULT_TOLERANCE}.")
+    args = parser.parse_args()
+
+    engines = [Engine(engine) for engine in args.engine] if args.engine else list(Engine)
+    regressions = run(get_cases(args.rows, args.payer_plans, engines, args.workers), args.work_dir,
+                      args.output or os.path.join(args.work_dir, 'results.json'), args.baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    sys.exit(-1 if regressions else 0)
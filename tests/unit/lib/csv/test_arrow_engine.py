@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+import pyarrow as pa
+import pytest
+
+from hpt_converter.lib.csv.arrow_engine import (StandardChargeTransformer,
+                                                create_codes_array)
+from hpt_converter.lib.csv.utils import CsvType
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import \
+    STANDARD_CHARGE_SCHEMA
+from hpt_converter.lib.schema.csv.v2.standard_charge import \
+    get_standard_charge_base_fields
+from pydantic import create_model
+
+
+def _create_transformer(csv_type: CsvType, header: list) -> StandardChargeTransformer:
+    fields = get_standard_charge_base_fields(csv_type)
+    for field_name in header:
+        if field_name not in fields:
+            fields[field_name] = (Decimal, None) if field_name.endswith('negotiated_dollar') else (str, None)
+    sc_model = create_model('StandardChargeDynamicModel', **fields)
+    return StandardChargeTransformer(sc_model, header, csv_type, 'file123')
+
+
+def _create_batch(header: list, rows: list) -> pa.RecordBatch:
+    return pa.RecordBatch.from_arrays([pa.array(column, pa.string()) for column in zip(*rows)], names=header)
+
+
+def test_transform_tall():
+    # Arrange
+    header = ['description', 'setting', 'payer_name', 'plan_name', 'standard_charge|gross', 'drug_type_of_measurement']
+    transformer = _create_transformer(CsvType.TALL, header)
+    batch = _create_batch(header, [['item 1', 'inpatient', 'payer A', 'plan A1', '100.00', 'GM'],
+                                   ['item 2', 'outpatient', 'payer B', 'plan B1', '', ''],
+                                   ['item 3', 'both', 'payer A', 'plan A1', '1e2', '']])
+
+    # Act
+    table, payer_plans = transformer.transform(batch)
+
+    # Assert
+    assert [(pp.payer_name, pp.plan_name) for pp in payer_plans] == [('payer A', 'plan A1'), ('payer B', 'plan B1')]
+    assert table.column('plan_id').to_pylist() == [payer_plans[0].plan_id, payer_plans[1].plan_id, payer_plans[0].plan_id]
+    assert table.schema == STANDARD_CHARGE_SCHEMA
+    assert table.column('gross_charge').to_pylist() == [Decimal('100.00'), None, Decimal('100.00')]
+    assert table.column('drug_type_of_measurement').to_pylist() == ['gm', None, None]
+    assert table.column('file_id').to_pylist() == ['file123'] * 3
+
+
+def test_transform_wide():
+    # Arrange
+    header = ['description', 'setting',
+              'standard_charge|payer a|plan a1|negotiated_dollar', 'standard_charge|payer b|plan b1|negotiated_dollar']
+    transformer = _create_transformer(CsvType.WIDE, header)
+    batch = _create_batch(header, [['item 1', 'inpatient', '10', '20'],
+                                   ['item 2', 'outpatient', '', '40']])
+
+    # Act
+    table, payer_plans = transformer.transform(batch)
+
+    # Assert
+    assert len(payer_plans) == 2
+    assert table.column('description').to_pylist() == ['item 1', 'item 1', 'item 2', 'item 2']
+    plan_ids = {pp.plan_id: pp.payer_name for pp in payer_plans}
+    assert {(plan_ids[plan_id], value) for plan_id, value in zip(table.column('plan_id').to_pylist(),
+                                                                 table.column('negotiated_dollar').to_pylist())} == \
+        {('payer a', Decimal('10')), ('payer b', Decimal('20')), ('payer a', None), ('payer b', Decimal('40'))}
+
+
+def test_transform_codes():
+    # Arrange
+    header = ['description', 'setting', 'code|1', 'code|1|type', 'code|2', 'code|2|type',
+              'standard_charge|payer a|plan a1|negotiated_dollar', 'standard_charge|payer b|plan b1|negotiated_dollar']
+    transformer = _create_transformer(CsvType.WIDE, header)
+    batch = _create_batch(header, [['item 1', 'inpatient', '470', 'MS-DRG', '', '', '10', '20'],
+                                   ['item 2', 'outpatient', '', '', ' 92626 ', 'CPT', '30', '40'],
+                                   ['item 3', 'outpatient', '', '', '', '', '50', '60']])
+
+    # Act
+    table, _ = transformer.transform(batch)
+
+    # Assert
+    assert table.column('codes').to_pylist() == [[{'code': '470', 'code_type': 'MS-DRG'}]] * 2 + \
+        [[{'code': '92626', 'code_type': 'CPT'}]] * 2 + [[]] * 2
+
+
+def test_create_codes_array():
+    # Arrange
+    codes = [pa.array(['1', None, '', '4']), None, pa.array(['', '2', '3', '5'])]
+    code_types = [pa.array(['CPT', None, '', 'RC']), pa.array(['', '', 'NDC', '']), pa.array(['', 'HCPCS', 'LOCAL', 'CDM'])]
+
+    # Act
+    actual = create_codes_array(codes, code_types, 4, first_line=1)
+
+    # Assert
+    assert [[(x['code'], x['code_type']) for x in row] for row in actual.to_pylist()] == \
+        [[('1', 'CPT')], [('2', 'HCPCS')], [('3', 'LOCAL')], [('4', 'RC'), ('5', 'CDM')]]
+    with pytest.raises(ValueError, match=r"Invalid code_type value\('cpt'\) at line 12"):
+        create_codes_array([pa.array(['1', '2'])], [pa.array(['CPT', 'cpt'])], 2, first_line=11)
+    with pytest.raises(ValueError, match=r"Invalid code_type value\(''\) at line 1"):
+        create_codes_array([pa.array(['1'])], [pa.array([''])], 1, first_line=1)
+
+
+@pytest.mark.parametrize("column,value", [('setting', 'invalid_setting'),
+                                          ('standard_charge|gross', '$1,234'),
+                                          ('standard_charge|gross', '123456789012345'),
+                                          ('standard_charge|gross', '1.234')])
+def test_transform_invalid_value(column: str, value: str):
+    # Arrange
+    header = ['description', 'setting', 'payer_name', 'plan_name', 'standard_charge|gross']
+    transformer = _create_transformer(CsvType.TALL, header)
+    rows = [['item 1', 'inpatient', 'payer A', 'plan A1', '100.00'],
+            ['item 2', 'inpatient', 'payer A', 'plan A1', '100.00']]
+    rows[1][header.index(column)] = value
+
+    # Act & Assert
+    with pytest.raises(ValueError, match="at line 2"):
+        transformer.transform(_create_batch(header, rows))
+
+
+@pytest.mark.parametrize("value", ['33.333', '20000.125', '123456789012345'])
+def test_transform_wide_price_without_constraints(value: str):
+    # Arrange
+    header = ['description', 'setting', 'standard_charge|payer a|plan a1|negotiated_dollar']
+    transformer = _create_transformer(CsvType.WIDE, header)
+    batch = _create_batch(header, [['item 1', 'inpatient', '10.50'],
+                                   ['item 2', 'outpatient', value]])
+
+    # Act & Assert
+    # prices of fields without constraints are checked against the price type they are cast to.
+    with pytest.raises(ValueError, match="at line 2"):
+        transformer.transform(batch)
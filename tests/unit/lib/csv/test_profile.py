@@ -0,0 +1,52 @@
+import gzip
+import shutil
+from pathlib import Path
+
+import pytest
+
+from hpt_converter.lib.csv.profile import inspect_csv
+from hpt_converter.lib.schema.csv import CsvType
+
+
+@pytest.mark.parametrize('file_name, csv_type, row_count, plan_count_exact', [
+    ('tall_v2.csv', CsvType.TALL, 31, False),
+    ('wide_v2.csv', CsvType.WIDE, 20, True),
+])
+def test_inspect_csv(data_root: Path, file_name: str, csv_type: CsvType, row_count: int, plan_count_exact: bool):
+    # Arrange
+    file_path = data_root.joinpath('csv', file_name)
+
+    # Act
+    profile = inspect_csv(file_path)
+
+    # Assert
+    # a small file is sampled whole, so its estimates are the counts of the file.
+    assert profile.csv_type == csv_type
+    assert profile.sample_count == 1
+    assert profile.sampled_bytes == profile.data_bytes
+    assert profile.estimated_row_count == profile.sampled_row_count == row_count
+    assert profile.invalid_row_ratio == 0
+    assert profile.plan_count == 2 and profile.plan_count_exact == plan_count_exact
+    assert profile.estimated_standard_charge_count == profile.sampled_row_count * profile.standard_charges_per_row
+    assert profile.estimated_output_bytes > 0 and profile.estimated_buffered_bytes > 0
+    assert profile.blank_ratios['description'] == 0
+
+
+def test_inspect_csv_sampled(data_root: Path, tmp_path: Path):
+    # Arrange
+    file_path = data_root.joinpath('csv', 'jm_10000.csv')
+    gz_file_path = tmp_path.joinpath('jm_10000.csv.gz')
+    with open(file_path, 'rb') as input_file, gzip.open(gz_file_path, 'wb') as output_file:
+        shutil.copyfileobj(input_file, output_file)
+
+    # Act
+    profile = inspect_csv(file_path, num_samples=8, sample_size=64 << 10)
+    gz_profile = inspect_csv(gz_file_path, num_samples=2, sample_size=64 << 10)
+
+    # Assert
+    assert profile.sample_count == 8
+    assert profile.sampled_bytes < profile.data_bytes / 4
+    assert 8000 < profile.estimated_row_count < 12000
+    assert gz_profile.compressed and gz_profile.input_bytes < profile.input_bytes
+    assert gz_profile.sample_count == 1
+    assert 8000 < gz_profile.estimated_row_count < 12000
@@ -1,10 +1,14 @@
+import csv
+import gzip
+import io
 from pathlib import Path
 
 import pytest
 
 import hpt_converter.lib.csv.utils as utils
-from hpt_converter.lib.schema.csv.v2.standard_charge import \
-    create_standard_charge_model
+from hpt_converter.lib.schema.csv.v2.standard_charge import (
+    StandardChargeModelCache, create_standard_charge_model, get_code_columns,
+    get_payer_plan_columns)
 
 
 def test_normalize_header():
@@ -73,6 +77,87 @@ def test_infer_csv_type(data_root: Path):
             utils.infer_csv_type(test_root.joinpath('data', bad_file))
 
 
+def test_read_standard_charge_header(data_root: Path, tmp_path: Path):
+    # Arrange
+    csv_file = tmp_path.joinpath('multiline.csv')
+    csv_file.write_text('hospital_name,general_contract_provisions\n'
+                        'Test Hospital,"line 1\nline 2"\n'
+                        'description,setting\n'
+                        'item,inpatient\n', newline='')
+
+    # Act
+    header, offset = utils.read_standard_charge_header(csv_file)
+
+    # Assert
+    assert header == ['description', 'setting']
+    assert csv_file.read_bytes()[offset:] == b'item,inpatient\n'
+    with pytest.raises(ValueError, match="missing standard charge header line"):
+        utils.read_standard_charge_header(Path(__file__).parent.joinpath('data', 'empty.csv'))
+
+
+def test_read_prelude(tmp_path: Path):
+    # Arrange
+    csv_file = tmp_path.joinpath('multiline.csv')
+    csv_file.write_text('hospital_name,last_updated_on,version,hospital_location,hospital_address,license_number|CA,'
+                        '"To the best of its knowledge and belief"\n'
+                        'Test Hospital,2024-07-01,2.0.0,"Main\nCampus",1 Main Street,50056,TRUE\n'
+                        'description,setting,payer_name\n'
+                        'item,inpatient,payer\n', newline='')
+
+    # Act
+    prelude = utils.read_prelude(csv_file)
+    mapped_prelude = utils.read_prelude(csv_file, utils.open_memory_map(csv_file))
+
+    # Assert
+    assert mapped_prelude == prelude
+    assert prelude.header == ['description', 'setting', 'payer_name']
+    assert prelude.csv_type == utils.CsvType.TALL
+    assert prelude.general_data_elements.hospital_location == 'Main\nCampus'
+    assert csv_file.read_bytes()[prelude.data_offset:] == b'item,inpatient,payer\n'
+
+
+def test_split_byte_ranges(tmp_path: Path):
+    # Arrange
+    rows = [f'item {i},"note\n""{i}""\nend",{i}\n' for i in range(50)]
+    csv_file = tmp_path.joinpath('multiline.csv')
+    csv_file.write_text(''.join(rows), newline='')
+    size = csv_file.stat().st_size
+
+    # Act
+    byte_ranges = utils.split_byte_ranges(csv_file, 0, size, 7)
+
+    # Assert
+    assert 1 < len(byte_ranges) <= 7
+    assert byte_ranges[0][0] == 0 and byte_ranges[-1][1] == size
+    content = csv_file.read_bytes()
+    parsed = []
+    for start, end in byte_ranges:
+        parsed.extend(list(csv.reader(io.StringIO(content[start:end].decode('utf-8'), newline=''))))
+    assert parsed == list(csv.reader(io.StringIO(''.join(rows), newline='')))
+
+
+@pytest.mark.parametrize('suffix', ['', '.gz'])
+def test_read_samples(suffix: str, tmp_path: Path):
+    # Arrange
+    prelude = 'header\n'
+    rows = [f'item {i},{i}\n' for i in range(1000)]
+    csv_file = tmp_path.joinpath(f'rows.csv{suffix}')
+    with (gzip.open(csv_file, 'wt', newline='') if suffix else open(csv_file, 'w', newline='')) as output:
+        output.write(prelude + ''.join(rows))
+
+    # Act
+    samples = utils.read_samples(csv_file, len(prelude), 4, 1000)
+
+    # Assert
+    # samples are of whole rows, spread across a plain file and at the head of a compressed one.
+    assert len(samples) == (4 if not suffix else 1)
+    assert all(len(sample) <= 1000 * (1 if not suffix else 4) for sample in samples)
+    sampled_rows = [row.decode() + '\n' for sample in samples for row in sample.split(b'\n')[:-1]]
+    assert sampled_rows[0] == rows[0]
+    assert all(row in rows for row in sampled_rows)
+    assert (rows[-1] in sampled_rows) == (not suffix)
+
+
 def test_read_general_data_elements(data_root: Path):
  
     # Act & Assert
@@ -108,3 +193,68 @@ def test_create_standard_charge_model(data_root: Path):
     assert 'plan_name' not in wide_model_fields
     assert 'standard_charge|negotiated_dollar' not in wide_model_fields
     assert 'estimated_amount' not in wide_model_fields
+
+
+def test_standard_charge_model_cache(tmp_path: Path):
+    # Arrange
+    cache = StandardChargeModelCache(max_size=2)
+    tall_header = ['Description', 'setting', 'payer_name', 'plan_name']
+    wide_header = ['description', 'setting', 'standard_charge|payer a|plan 1|negotiated_dollar']
+
+    # Act
+    tall_model = cache.get(tall_header)
+    same_model = cache.get([' DESCRIPTION ', 'plan_name', 'payer_name', 'setting'])
+    wide_model = cache.get(wide_header)
+    cache.get(['description', 'setting'])     # evicts tall model
+    cache.get(tall_header)
+
+    # Assert
+    assert same_model is tall_model
+    assert wide_model is not tall_model
+    assert cache.info() == {'hits': 1, 'misses': 4, 'disk_hits': 0, 'size': 2, 'max_size': 2}
+
+
+def test_standard_charge_model_cache_dir(tmp_path: Path):
+    # Arrange
+    header = ['description', 'setting', 'standard_charge|payer a|plan 1|negotiated_dollar']
+    model = StandardChargeModelCache(cache_dir=str(tmp_path)).get(header)
+    cache = StandardChargeModelCache(cache_dir=str(tmp_path))
+
+    # Act
+    loaded_model = cache.get(header)
+
+    # Assert
+    assert len(list(tmp_path.glob('*.json'))) == 1
+    assert cache.info()['disk_hits'] == 1
+    assert list(loaded_model.model_fields) == list(model.model_fields)
+    assert loaded_model.model_fields['standard_charge|payer a|plan 1|negotiated_dollar'].annotation == \
+        model.model_fields['standard_charge|payer a|plan 1|negotiated_dollar'].annotation
+
+
+def test_get_payer_plan_columns():
+    # Arrange
+    field_names = ['description',
+                   'standard_charge|payer a|plan 1|negotiated_dollar',
+                   'estimated_amount|payer a|plan 1',
+                   'standard_charge|payer b|plan 2|negotiated_dollar']
+
+    # Act
+    payer_plan_columns = get_payer_plan_columns(field_names)
+
+    # Assert
+    assert list(payer_plan_columns) == [('payer a', 'plan 1'), ('payer b', 'plan 2')]
+    assert payer_plan_columns[('payer a', 'plan 1')]['estimated_amount'] == 'estimated_amount|payer a|plan 1'
+    assert payer_plan_columns[('payer b', 'plan 2')]['methodology'] == 'standard_charge|payer b|plan 2|methodology'
+    with pytest.raises(ValueError, match="Unexpected field name format"):
+        get_payer_plan_columns(['standard_charge|payer a|negotiated_dollar'])
+
+
+def test_get_code_columns():
+    # Arrange
+    field_names = ['description', 'code|10', 'code|10|type', 'code|2|type', 'code|2', 'code|1', 'code|x', 'codes|3']
+
+    # Act
+    code_columns = get_code_columns(field_names)
+
+    # Assert
+    assert code_columns == [('code|1', 'code|1|type'), ('code|2', 'code|2|type'), ('code|10', 'code|10|type')]
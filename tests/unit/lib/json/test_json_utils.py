@@ -0,0 +1,59 @@
+import json
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from hpt_converter.lib.json.utils import (STANDARD_CHARGE_INFORMATION,
+                                          JsonObjectStream,
+                                          read_general_data_elements)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_json_object_stream(data_root: Path, chunk_size: int):
+    # Arrange
+    json_file_path = data_root.joinpath('json', 'v2.json')
+    with open(json_file_path, encoding='utf-8') as json_file:
+        expected = json.load(json_file, parse_float=Decimal)
+
+    # Act
+    actual = {}
+    for key, value in JsonObjectStream(json_file_path, {STANDARD_CHARGE_INFORMATION}, chunk_size=chunk_size).items():
+        actual[key] = list(value) if key == STANDARD_CHARGE_INFORMATION else value
+
+    # Assert
+    assert actual == expected
+
+
+def test_json_object_stream_skips_unread_items(tmp_path: Path):
+    # Arrange
+    json_file_path = tmp_path.joinpath('test.json')
+    json_file_path.write_text('{"items": [{"a": 1}, 2, [3]], "empty": [], "name": "test", "value": 12.50}')
+
+    # Act
+    keys = [key for key, _ in JsonObjectStream(json_file_path, {'items', 'empty'}, chunk_size=4).items()]
+
+    # Assert
+    assert keys == ['items', 'empty', 'name', 'value']
+
+
+def test_json_object_stream_invalid(tmp_path: Path):
+    # Arrange
+    json_file_path = tmp_path.joinpath('test.json')
+    json_file_path.write_text('{"items": [{"a": 1} {"a": 2}]}')
+
+    # Act & Assert
+    with pytest.raises(ValueError, match="expected ',]'"):
+        for _, value in JsonObjectStream(json_file_path, {'items'}).items():
+            list(value)
+
+
+def test_read_general_data_elements(data_root: Path):
+    # Act
+    general_data_elements = read_general_data_elements(data_root.joinpath('json', 'v2.json'))
+
+    # Assert
+    assert general_data_elements.hospital_location == 'West Mercy Hospital|West Mercy Surgical Center'
+    assert general_data_elements.license_number == ('50056', 'CA')
+    assert general_data_elements.affirmation_statement is True
+    assert general_data_elements.financial_aid_policy == 'https://www.westmercy.com/financial-aid'
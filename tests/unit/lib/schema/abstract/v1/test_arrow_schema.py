@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+import pyarrow as pa
+import pytest
+
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    PRICE_FIELDS, STANDARD_CHARGE_SCHEMA, PriceType,
+    get_standard_charge_schema, to_price_type)
+
+
+@pytest.mark.parametrize('price_type, expected', [
+    (PriceType.DECIMAL, [Decimal('12.34'), None, Decimal('99999999999999.99')]),
+    (PriceType.FLOAT, [12.34, None, 99999999999999.99]),
+    (PriceType.CENTS, [1234, None, 9999999999999999]),
+])
+def test_to_price_type(price_type: PriceType, expected: list):
+    # Arrange
+    prices = [Decimal('12.34'), None, Decimal('99999999999999.99')]
+    table = pa.Table.from_pylist([{name: price for name in PRICE_FIELDS} for price in prices],
+                                 schema=pa.schema([STANDARD_CHARGE_SCHEMA.field(name) for name in PRICE_FIELDS]))
+
+    # Act
+    actual = to_price_type(table, price_type)
+
+    # Assert
+    assert actual.schema == pa.schema([get_standard_charge_schema(price_type=price_type).field(name) for name in PRICE_FIELDS])
+    for name in PRICE_FIELDS:
+        assert actual[name].to_pylist() == expected
@@ -0,0 +1,32 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from hpt_converter.lib.checkpoint import CHECKPOINT_FILE_NAME, CheckpointStore
+
+INPUT_INFO = {'input_path': '/data/hospital.csv', 'input_size': 300}
+
+
+def test_checkpoint_store(tmp_path: Path):
+    # Arrange
+    dir_path = str(tmp_path.joinpath('work'))
+    checkpoint = CheckpointStore(dir_path, INPUT_INFO)
+
+    # Act
+    checkpoint.start([(0, 100), (100, 200), (200, 300)])
+    checkpoint.complete(0, {'input_row_count': 10})
+    checkpoint.complete(2, {'input_row_count': 30})
+    resumed = CheckpointStore(dir_path, INPUT_INFO, resume=True)
+
+    # Assert
+    assert resumed.resumed
+    assert resumed.byte_ranges == [(0, 100), (100, 200), (200, 300)]
+    assert resumed.ranges == {0: {'input_row_count': 10}, 2: {'input_row_count': 30}}
+    state = json.loads(tmp_path.joinpath('work', CHECKPOINT_FILE_NAME).read_text())
+    # the offset and rows up to the first range not completed.
+    assert (state['byte_offset'], state['input_row_count']) == (100, 10)
+    with pytest.raises(ValueError, match='another input'):
+        CheckpointStore(dir_path, {**INPUT_INFO, 'input_size': 301}, resume=True)
+    assert not CheckpointStore(dir_path, INPUT_INFO).resumed
+    assert not tmp_path.joinpath('work', CHECKPOINT_FILE_NAME).exists()
@@ -0,0 +1,89 @@
+import zipfile
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+from hpt_converter.lib.compressed import (ReadAheadFile,
+                                          estimate_uncompressed_size,
+                                          get_input_size, is_compressed,
+                                          open_input)
+
+CONTENT = b''.join(f'line {i},"quoted\nvalue"\n'.encode() for i in range(10000))
+
+
+def _write_input(tmp_path: Path, suffix: str) -> str:
+    if suffix == '.zip':
+        path = tmp_path.joinpath('input.zip')
+        with zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('input.csv', CONTENT)
+        return str(path)
+    path = tmp_path.joinpath(f'input.csv{suffix}')
+    codec = {'': None, '.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}[suffix]
+    with (pa.CompressedOutputStream(str(path), codec) if codec else pa.OSFile(str(path), mode='w')) as output:
+        output.write(CONTENT)
+    return str(path)
+
+
+@pytest.mark.parametrize('read_ahead', [False, True])
+@pytest.mark.parametrize('suffix', ['', '.gz', '.zst', '.bz2', '.zip'])
+def test_open_input(suffix: str, read_ahead: bool, tmp_path: Path):
+    # Arrange
+    path = _write_input(tmp_path, suffix)
+
+    # Act
+    with open_input(path, read_ahead=read_ahead) as input_file:
+        first_line = input_file.readline()
+        content = first_line + input_file.read()
+        # a compressed file is read sequentially, and only reports its position when read ahead.
+        position = input_file.tell() if read_ahead or not suffix else None
+
+    # Assert
+    assert content == CONTENT
+    assert first_line == b'line 0,"quoted\n'
+    assert is_compressed(path) == bool(suffix)
+    assert position in (None, get_input_size(path))
+
+
+@pytest.mark.parametrize('suffix', ['', '.gz', '.zip'])
+def test_estimate_uncompressed_size(suffix: str, tmp_path: Path):
+    # Arrange
+    path = _write_input(tmp_path, suffix)
+
+    # Act
+    size = estimate_uncompressed_size(path)
+
+    # Assert
+    # a compressed file smaller than the sample is decompressed whole, so its size is exact.
+    assert size == len(CONTENT)
+
+
+def test_open_input_archive_members(tmp_path: Path):
+    # Arrange
+    path = tmp_path.joinpath('inputs.zip')
+    with zipfile.ZipFile(path, mode='w') as archive:
+        archive.writestr('a.csv', b'a')
+        archive.writestr('b/b.csv', b'b')
+
+    # Act & Assert
+    with open_input(f'{path}!b/b.csv') as input_file:
+        assert input_file.read() == b'b'
+    assert is_compressed(f'{path}!a.csv')
+    with pytest.raises(ValueError, match='has 2 files'):
+        open_input(path)
+
+
+def test_read_ahead_file_error():
+    # Arrange
+    class _BrokenStream:
+        def read(self, size: int) -> bytes:
+            raise OSError('corrupt')
+
+        def close(self):
+            pass
+
+    # Act & Assert
+    with ReadAheadFile(_BrokenStream(), lambda: 0) as input_file:
+        with pytest.raises(OSError, match='corrupt'):
+            input_file.read()
+        assert input_file.read() == b''
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+import pyarrow as pa
+
+from hpt_converter.lib.delta import (ChangeType, RowHashDelta, hash_rows,
+                                     hash_standard_charges)
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    ROW_HASH_SCHEMA, STANDARD_CHARGE_SCHEMA)
+
+
+def _create_standard_charges(rows) -> pa.Table:
+    defaults = {'file_id': 'file', 'description': 'item', 'codes': [{'code': '470', 'code_type': 'MS-DRG'}],
+                'setting': 'inpatient', 'plan_id': 'plan'}
+    return pa.Table.from_pylist([{**defaults, **row} for row in rows], schema=STANDARD_CHARGE_SCHEMA)
+
+
+def test_hash_rows():
+    # Arrange
+    table = _create_standard_charges([
+        {},
+        {'file_id': 'next file'},
+        {'modifiers': ''},
+        {'codes': []},
+        {'codes': [{'code': '470', 'code_type': 'MS-DRG'}, {'code': '1', 'code_type': 'LOCAL'}]},
+        {'negotiated_dollar': Decimal('1.00')},
+        {'negotiated_dollar': Decimal('1.10')},
+    ])
+
+    # Act
+    hashes = hash_standard_charges(table)
+
+    # Assert
+    row_hashes = hashes['row_hash'].to_pylist()
+    assert row_hashes[0] == row_hashes[1]
+    assert len(set(row_hashes[1:])) == 6
+    assert hashes['key_hash'].to_pylist()[5] == hashes['key_hash'].to_pylist()[6] == hashes['key_hash'].to_pylist()[0]
+    assert hash_rows(table.slice(2, 1), ['modifiers']).equals(hash_rows(table.slice(2, 1), ['modifiers']))
+    assert hash_rows(table.slice(0, 0), ['modifiers']).type == pa.uint64()
+
+
+def test_row_hash_delta():
+    # Arrange
+    previous = pa.Table.from_pylist([{'row_hash': 1, 'key_hash': 10},
+                                     {'row_hash': 2, 'key_hash': 20},
+                                     {'row_hash': 2, 'key_hash': 20},
+                                     {'row_hash': 3, 'key_hash': 30},
+                                     {'row_hash': 4, 'key_hash': 40}], schema=ROW_HASH_SCHEMA)
+    blocks = [pa.Table.from_pylist([{'row_hash': 1, 'key_hash': 10}, {'row_hash': 5, 'key_hash': 30}],
+                                   schema=ROW_HASH_SCHEMA),
+              pa.Table.from_pylist([{'row_hash': 2, 'key_hash': 20}, {'row_hash': 6, 'key_hash': 60}],
+                                   schema=ROW_HASH_SCHEMA)]
+    delta = RowHashDelta(previous)
+
+    # Act
+    changes = [delta.compare(block).to_pylist() for block in blocks]
+    removed = delta.removed()
+
+    # Assert
+    assert changes == [[None, ChangeType.CHANGED], [None, ChangeType.ADDED]]
+    assert removed.to_pylist() == [{'row_hash': 4, 'key_hash': 40}]
+    assert (delta.added_count, delta.changed_count, delta.removed_count) == (1, 1, 1)
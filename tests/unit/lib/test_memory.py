@@ -0,0 +1,42 @@
+import pyarrow as pa
+import pytest
+
+from hpt_converter.lib.memory import (MIN_BLOCK_BYTES, MIN_BLOCK_ROWS,
+                                      MemoryBudget, parse_size)
+
+
+@pytest.mark.parametrize('size, expected', [('1024', 1024), ('512M', 512 << 20), ('1.5g', 3 << 29), ('2GB', 2 << 30)])
+def test_parse_size(size: str, expected: int):
+    # Act & Assert
+    assert parse_size(size) == expected
+
+
+@pytest.mark.parametrize('size', ['', 'G', 'abc', '-1M', '0'])
+def test_parse_size_invalid(size: str):
+    # Act & Assert
+    with pytest.raises(ValueError, match='Invalid size'):
+        parse_size(size)
+
+
+def test_memory_budget():
+    # Arrange
+    budget = MemoryBudget(64 << 20, blocks_in_flight=4)
+    narrow = pa.table({'value': pa.array(range(1000), pa.int64())})            # 8 bytes per row
+    wide = pa.table({f'value_{i}': pa.array(range(1000), pa.int64()) for i in range(100)})   # 800 bytes per row
+
+    # Act
+    initial_rows = budget.block_rows(10000)
+    budget.observe(narrow, 1000)
+    narrow_rows = budget.block_rows(1 << 30, factor=1)
+    budget.observe(wide, 100)
+    wide_rows = budget.block_rows(1 << 30, factor=1)
+    wide_charges = budget.block_rows(1 << 30, factor=1, input_rows=False)
+
+    # Assert
+    assert initial_rows == MIN_BLOCK_ROWS * 10
+    assert narrow_rows == budget.block_bytes // 8
+    assert wide_rows == budget.block_bytes // 8000
+    assert wide_charges == budget.block_bytes // 800
+    assert budget.block_rows(100000) == max(MIN_BLOCK_ROWS, budget.block_bytes // 80000)
+    assert budget.block_bytes == (64 << 20) // 16
+    assert budget.csv_block_size(16 << 20) == MIN_BLOCK_BYTES
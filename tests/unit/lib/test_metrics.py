@@ -0,0 +1,68 @@
+import io
+import os
+import time
+
+import pytest
+
+from hpt_converter.lib import metrics
+from hpt_converter.lib.metrics import (PeakMemory, ProgressBar, StageMetrics,
+                                       iter_timed)
+
+
+def test_iter_timed():
+    # Arrange
+    stage = StageMetrics()
+
+    def _slow():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+
+    # Act
+    items = []
+    for item in iter_timed(_slow(), stage):
+        time.sleep(0.05)
+        items.append(item)
+
+    # Assert
+    assert items == [0, 1, 2]
+    assert 0.03 <= stage.wall_seconds < 0.15
+
+
+@pytest.mark.skipif(not os.path.exists(metrics._PROC_CLEAR_REFS_PATH), reason='the peak memory can be reset on Linux')
+def test_peak_memory():
+    # Arrange
+    size = 256 * 1024 * 1024
+
+    # Act
+    with PeakMemory() as outer:
+        with PeakMemory() as first:
+            data = b'x' * size
+            del data
+        with PeakMemory() as second:
+            pass
+
+    # Assert
+    # the peak of the first block isn't reported by the next one, and is carried over to the block around both.
+    assert first.peak_bytes > size
+    assert second.peak_bytes < size
+    assert outer.peak_bytes >= first.peak_bytes
+
+
+def test_progress_bar():
+    # Arrange
+    output = io.StringIO()
+    progress_bar = ProgressBar(output, width=10, interval=60)
+
+    # Act
+    progress_bar(0, 100, 0)
+    progress_bar(50, 100, 5000)
+    progress_bar(100, 100, 10000)
+    progress_bar.close()
+
+    # Assert
+    lines = output.getvalue().split('\r')
+    assert len(lines) == 3
+    assert lines[1].startswith('[..........]   0.0%')
+    assert lines[2].startswith('[##########] 100.0% 100.0 B/100.0 B 10,000 rows')
+    assert 'ETA 00:00:00' in lines[2]
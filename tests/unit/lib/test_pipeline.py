@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from hpt_converter.lib.pipeline import Pipeline
+
+
+def test_pipeline():
+    # Arrange
+    def _slow_write(items):
+        for item in items:
+            time.sleep(0.02)
+            yield item
+
+    pipeline = Pipeline(range(10), [('double', lambda x: x * 2), ('increment', lambda x: x + 1)], depth=2)
+
+    # Act
+    items = list(_slow_write(pipeline))
+
+    # Assert
+    assert items == [x * 2 + 1 for x in range(10)]
+    assert list(pipeline.metrics) == ['read', 'double', 'increment', 'write']
+    assert all(stage.items == 10 for stage in pipeline.metrics.values())
+    write = pipeline.metrics['write']
+    assert write.utilization > 0.5
+    assert 0 < write.mean_queue_depth <= write.max_queue_depth <= 2
+    assert pipeline.metrics['increment'].output_wait_seconds > 0.05
+
+
+@pytest.mark.parametrize('failing_stage', ['read', 'transform'])
+def test_pipeline_error(failing_stage: str):
+    # Arrange
+    def _read():
+        yield 1
+        if failing_stage == 'read':
+            raise ValueError('read failed')
+        yield 2
+
+    def _transform(x):
+        if failing_stage == 'transform' and x == 2:
+            raise ValueError('transform failed')
+        return x
+
+    # Act
+    items = []
+    with pytest.raises(ValueError, match=f'{failing_stage} failed'):
+        for item in Pipeline(_read(), [('transform', _transform)]):
+            items.append(item)
+
+    # Assert
+    assert items == [1]
+
+
+def test_pipeline_stop():
+    # Arrange
+    closed = []
+
+    def _read():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.append(True)
+
+    pipeline = Pipeline(_read(), [('transform', lambda x: x)], depth=1)
+
+    # Act
+    for item in pipeline:
+        if item == 3:
+            break
+
+    # Assert
+    assert closed == [True]
+    assert pipeline.metrics['read'].items < 1000
@@ -0,0 +1,146 @@
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from hpt_converter.lib.writer import (HIVE_NULL_PARTITION, OutputFormat,
+                                      OutputSink, PartitionedWriter,
+                                      RowGroupWriter)
+
+SCHEMA = pa.schema([pa.field('value', pa.int64())])
+
+
+def test_row_group_writer(tmp_path: Path):
+    # Arrange
+    file_path = tmp_path.joinpath('values.parquet')
+    tables = [pa.table({'value': list(range(start, start + 7))}, schema=SCHEMA) for start in range(0, 70, 7)]
+
+    # Act
+    with RowGroupWriter(str(file_path), SCHEMA, row_group_size=20) as writer:
+        for table in tables:
+            writer.write(table)
+
+    # Assert
+    metadata = pq.ParquetFile(file_path).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [20, 20, 20, 10]
+    assert pq.read_table(file_path).column('value').to_pylist() == list(range(70))
+    assert writer.row_count == 70
+
+
+@pytest.mark.parametrize('sink', [OutputSink(OutputFormat.PARQUET, 'zstd', 9), OutputSink(OutputFormat.PARQUET, 'none'),
+                                  OutputSink(OutputFormat.ARROW), OutputSink(OutputFormat.ARROW, 'none'),
+                                  OutputSink(OutputFormat.ARROW_STREAM, 'zstd', 3)])
+def test_row_group_writer_sink(sink: OutputSink, tmp_path: Path):
+    # Arrange
+    file_path = tmp_path.joinpath('values' + sink.suffix)
+    tables = [pa.table({'value': list(range(start, start + 7))}, schema=SCHEMA) for start in range(0, 70, 7)]
+
+    # Act
+    with RowGroupWriter(str(file_path), SCHEMA, row_group_size=20, sink=sink) as writer:
+        for table in tables:
+            writer.write(table)
+    batches = list(sink.iter_batches(str(file_path), batch_size=15))
+
+    # Assert
+    # a row group of an Arrow IPC file is a record batch, which is sliced into batches of at most batch_size rows.
+    assert sink.read_table(str(file_path)).column('value').to_pylist() == list(range(70))
+    assert [batch.num_rows for batch in batches] == ([15, 5, 15, 5, 15, 5, 10] if sink.format != OutputFormat.PARQUET
+                                                     else [15] * 4 + [10])
+    assert pa.Table.from_batches(batches).column('value').to_pylist() == list(range(70))
+
+
+@pytest.mark.parametrize('sink_options, message', [
+    ((OutputFormat.ARROW, 'snappy'), 'Invalid arrow compression'),
+    ((OutputFormat.PARQUET, 'snappy', 3), "doesn't support a compression level"),
+    ((OutputFormat.PARQUET, 'zstd', 99), 'Invalid zstd compression level'),
+])
+def test_output_sink_invalid(sink_options: tuple, message: str):
+    # Act & Assert
+    with pytest.raises(ValueError, match=message):
+        OutputSink(*sink_options)
+
+
+def test_row_group_writer_max_buffer_bytes(tmp_path: Path):
+    # Arrange
+    file_path = tmp_path.joinpath('values.parquet')
+    tables = [pa.table({'value': list(range(start, start + 7))}, schema=SCHEMA) for start in range(0, 70, 7)]
+
+    # Act
+    with RowGroupWriter(str(file_path), SCHEMA, row_group_size=20, max_buffer_bytes=14 * 8) as writer:
+        for table in tables:
+            writer.write(table)
+            assert writer.buffered_bytes < 14 * 8
+
+    # Assert
+    metadata = pq.ParquetFile(file_path).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [14] * 5
+    assert pq.read_table(file_path).column('value').to_pylist() == list(range(70))
+
+
+def test_row_group_writer_error(tmp_path: Path):
+    # Arrange
+    file_path = tmp_path.joinpath('values.parquet')
+
+    # Act & Assert
+    with pytest.raises(RuntimeError):
+        with RowGroupWriter(str(file_path), SCHEMA, row_group_size=2) as writer:
+            writer.write(pa.table({'value': [1, 2, 3]}, schema=SCHEMA))
+            raise RuntimeError("conversion failed")
+    assert not file_path.exists()
+
+
+def test_row_group_writer_sort_by(tmp_path: Path):
+    # Arrange
+    file_path = tmp_path.joinpath('values.parquet')
+    tables = [pa.table({'value': [5, 3, None, 9]}, schema=SCHEMA), pa.table({'value': [1, 7, 2]}, schema=SCHEMA)]
+
+    # Act
+    with RowGroupWriter(str(file_path), SCHEMA, row_group_size=4, sort_by=['value'], write_page_index=True) as writer:
+        for table in tables:
+            writer.write(table)
+
+    # Assert
+    parquet_file = pq.ParquetFile(file_path)
+    assert pq.read_table(file_path).column('value').to_pylist() == [3, 5, 9, None, 1, 2, 7]
+    assert parquet_file.metadata.row_group(0).sorting_columns == (pq.SortingColumn(0, nulls_first=False),)
+    assert parquet_file.metadata.row_group(0).column(0).has_column_index
+
+
+def test_partitioned_writer(tmp_path: Path):
+    # Arrange
+    schema = pa.schema([pa.field('key', pa.string()), pa.field('value', pa.int64())])
+    tables = [pa.table({'key': ['a', 'b/c', None, 'a'], 'value': [1, 2, 3, 4]}, schema=schema),
+              pa.table({'key': ['b/c', 'a'], 'value': [5, 6]}, schema=schema)]
+    dir_path = tmp_path.joinpath('dataset')
+
+    # Act
+    with PartitionedWriter(str(dir_path), schema, ['key'], row_group_size=10, max_open_files=2) as writer:
+        for table in tables:
+            writer.write(table)
+
+    # Assert
+    assert writer.row_count == 6
+    assert sorted(str(path.relative_to(dir_path)) for path in dir_path.rglob('*.parquet')) == [
+        f'key={HIVE_NULL_PARTITION}/part-0.parquet', 'key=a/part-0.parquet', 'key=a/part-1.parquet',
+        'key=b%2Fc/part-0.parquet']
+    assert pq.read_table(dir_path.joinpath('key=a', 'part-0.parquet')).to_pylist() == [{'value': 1}, {'value': 4}]
+    assert pq.read_table(dir_path.joinpath('key=a', 'part-1.parquet')).to_pylist() == [{'value': 6}]
+    dataset = ds.dataset(dir_path, partitioning=ds.partitioning(schema.remove(1), flavor='hive'))
+    assert sorted(dataset.to_table().to_pylist(), key=lambda row: row['value']) == [
+        {'value': 1, 'key': 'a'}, {'value': 2, 'key': 'b/c'}, {'value': 3, 'key': None},
+        {'value': 4, 'key': 'a'}, {'value': 5, 'key': 'b/c'}, {'value': 6, 'key': 'a'}]
+
+
+def test_partitioned_writer_error(tmp_path: Path):
+    # Arrange
+    dir_path = tmp_path.joinpath('dataset')
+    schema = pa.schema([pa.field('key', pa.string()), pa.field('value', pa.int64())])
+
+    # Act & Assert
+    with pytest.raises(RuntimeError):
+        with PartitionedWriter(str(dir_path), schema, ['key']) as writer:
+            writer.write(pa.table({'key': ['a', 'b'], 'value': [1, 2]}, schema=schema))
+            raise RuntimeError("conversion failed")
+    assert not dir_path.exists()
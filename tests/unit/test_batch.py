@@ -0,0 +1,131 @@
+import gzip
+import os
+import shutil
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from hpt_converter import batch
+from hpt_converter.batch import (ConversionStatus, convert_batch,
+                                 find_input_files, get_output_path,
+                                 read_manifest)
+from hpt_converter.csv2parquet import Csv2Parquet, FileMetaData
+
+
+def _create_input_folder(root: Path, data_root: Path) -> Path:
+    input_dir = root.joinpath('input')
+    input_dir.joinpath('system').mkdir(parents=True)
+    shutil.copy(data_root.joinpath('csv', 'tall_v2.csv'), input_dir.joinpath('tall_v2.csv'))
+    shutil.copy(data_root.joinpath('csv', 'wide_v2.csv'), input_dir.joinpath('system', 'wide_v2.csv'))
+    input_dir.joinpath('broken.csv').write_text('hospital_name\nTest Hospital\n')
+    return input_dir
+
+
+def test_find_input_files(tmp_path: Path, data_root: Path):
+    # Arrange
+    input_dir = _create_input_folder(tmp_path, data_root)
+
+    # Act & Assert
+    assert [Path(x).name for x in find_input_files(str(input_dir))] == ['broken.csv', 'wide_v2.csv', 'tall_v2.csv']
+    assert [Path(x).name for x in find_input_files(str(input_dir.joinpath('*_v2.csv')))] == ['tall_v2.csv']
+
+
+def test_find_input_files_compressed(tmp_path: Path, data_root: Path):
+    # Arrange
+    input_dir = tmp_path.joinpath('input')
+    input_dir.mkdir()
+    with gzip.open(input_dir.joinpath('tall_v2.csv.gz'), mode='wb') as compressed_file:
+        compressed_file.write(data_root.joinpath('csv', 'tall_v2.csv').read_bytes())
+    with zipfile.ZipFile(input_dir.joinpath('system.zip'), mode='w') as archive:
+        archive.write(data_root.joinpath('csv', 'wide_v2.csv'), 'wide_v2.csv')
+        archive.write(data_root.joinpath('csv', 'tall_v2.csv'), 'east/tall_v2.csv')
+        archive.writestr('README.txt', 'not an input')
+
+    # Act
+    input_files = find_input_files(str(input_dir))
+
+    # Assert
+    assert input_files == [f"{input_dir.joinpath('system.zip')}!east/tall_v2.csv",
+                           f"{input_dir.joinpath('system.zip')}!wide_v2.csv",
+                           str(input_dir.joinpath('tall_v2.csv.gz'))]
+    assert [get_output_path(path, str(input_dir), 'out') for path in input_files] == \
+        ['out/system/east/tall_v2', 'out/system/wide_v2', 'out/tall_v2']
+
+
+def test_convert_batch(tmp_path: Path, data_root: Path):
+    # Arrange
+    input_dir = _create_input_folder(tmp_path, data_root)
+    output_dir = tmp_path.joinpath('output')
+
+    # Act
+    results = convert_batch(str(input_dir), str(output_dir), workers=2)
+
+    # Assert
+    results = {Path(result.input_path).name: result for result in results}
+    assert results['tall_v2.csv'].status == ConversionStatus.SUCCEEDED
+    assert results['tall_v2.csv'].meta_data == FileMetaData(input_row_count=31, standard_charge_count=31, plan_count=2)
+    assert results['wide_v2.csv'].status == ConversionStatus.SUCCEEDED
+    assert results['broken.csv'].status == ConversionStatus.FAILED
+    assert 'missing standard charge header line' in results['broken.csv'].error
+    assert output_dir.joinpath('tall_v2', 'standard_charges.parquet').exists()
+    assert output_dir.joinpath('system', 'wide_v2', 'payer_plans.parquet').exists()
+    assert {Path(x.input_path).name: x.status for x in read_manifest(str(output_dir.joinpath('manifest.jsonl')))} == \
+        {name: result.status for name, result in results.items()}
+
+
+def test_convert_batch_skip_succeeded(tmp_path: Path, data_root: Path):
+    # Arrange
+    input_dir = _create_input_folder(tmp_path, data_root)
+    output_dir = tmp_path.joinpath('output')
+    convert_batch(str(input_dir), str(output_dir), workers=1)
+
+    # Act
+    results = convert_batch(str(input_dir), str(output_dir), workers=1, skip_succeeded=True)
+
+    # Assert
+    assert [Path(result.input_path).name for result in results] == ['broken.csv']
+    assert len(output_dir.joinpath('manifest.jsonl').read_text().splitlines()) == 4
+    assert len(read_manifest(str(output_dir.joinpath('manifest.jsonl')))) == 3
+
+
+def test_convert_batch_same_output_folder(tmp_path: Path, data_root: Path):
+    # Arrange
+    input_dir = _create_input_folder(tmp_path, data_root)
+    with gzip.open(input_dir.joinpath('tall_v2.csv.gz'), mode='wb') as compressed_file:
+        compressed_file.write(data_root.joinpath('csv', 'tall_v2.csv').read_bytes())
+    output_dir = tmp_path.joinpath('output')
+
+    # Act & Assert
+    with pytest.raises(ValueError, match='same folder'):
+        convert_batch(str(input_dir), str(output_dir), workers=1)
+    assert not output_dir.exists()
+
+
+def test_convert_batch_worker_died(tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    input_dir = _create_input_folder(tmp_path, data_root)
+    shutil.copy(data_root.joinpath('csv', 'tall_v2.csv'), input_dir.joinpath('oom.csv'))
+    output_dir = tmp_path.joinpath('output')
+
+    class _Csv2Parquet(Csv2Parquet):
+        def convert(self):
+            # the worker process dies like a process killed by the OOM killer.
+            if Path(self.csv_file_path).name == 'oom.csv':
+                os._exit(1)
+            return super().convert()
+
+    # Act
+    monkeypatch.setattr(batch, 'Csv2Parquet', _Csv2Parquet)
+    results = convert_batch(str(input_dir), str(output_dir), workers=2)
+
+    # Assert
+    # the other files are converted, and every file is recorded once.
+    results = {Path(result.input_path).name: result for result in results}
+    assert sorted(results) == ['broken.csv', 'oom.csv', 'tall_v2.csv', 'wide_v2.csv']
+    assert results['oom.csv'].status == ConversionStatus.FAILED
+    assert 'BrokenProcessPool' in results['oom.csv'].error
+    assert results['tall_v2.csv'].status == ConversionStatus.SUCCEEDED
+    assert results['wide_v2.csv'].status == ConversionStatus.SUCCEEDED
+    assert results['broken.csv'].status == ConversionStatus.FAILED
+    assert len(output_dir.joinpath('manifest.jsonl').read_text().splitlines()) == 4
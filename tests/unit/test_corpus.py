@@ -0,0 +1,150 @@
+import shutil
+from dataclasses import replace
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from hpt_converter import corpus
+from hpt_converter.corpus import (SOURCES_FILE_NAME, STANDARD_CHARGE_DIR_NAME,
+                                  compact_corpus, find_output_folders)
+from hpt_converter.csv2parquet import Csv2Parquet, Engine
+from hpt_converter.json2parquet import Json2Parquet
+
+
+def _mkdir(path: Path) -> Path:
+    path.mkdir(parents=True)
+    return path
+
+
+def _convert(output_root: Path, data_root: Path, compact: bool = True):
+    # tall_v2 and wide_v2 have the same general data elements, so the same file_id.
+    for name, file_compact in [('jm_10000', compact), ('tall_v2', False), ('wide_v2', compact)]:
+        Csv2Parquet(data_root.joinpath('csv', f'{name}.csv'), _mkdir(output_root.joinpath(name)),
+                    engine=Engine.ARROW, compact=file_compact).convert()
+
+
+def test_compact_corpus(tmp_path: Path, data_root: Path):
+    # Arrange
+    output_root, expected_root = tmp_path.joinpath('output'), tmp_path.joinpath('expected')
+    _convert(output_root, data_root)
+    _convert(expected_root, data_root, compact=False)
+    expected = pa.concat_tables([pq.read_table(expected_root.joinpath(name, 'standard_charges.parquet'))
+                                 for name in ('jm_10000', 'tall_v2')])
+    corpus_dir = tmp_path.joinpath('corpus')
+
+    # Act
+    result = compact_corpus([str(output_root)], str(corpus_dir), rows_per_file=4000, row_group_size=1000)
+
+    # Assert
+    assert (result.merged_count, result.skipped_count, result.file_count) == (2, 1, 2)
+    assert result.standard_charge_count == expected.num_rows
+    parts = sorted(corpus_dir.joinpath(STANDARD_CHARGE_DIR_NAME).iterdir())
+    assert len(parts) == result.part_count == 3
+    assert [pq.ParquetFile(part).metadata.num_rows for part in parts][:2] == [4000, 4000]
+    assert pq.read_table(parts).equals(expected)
+    payer_plans = pq.read_table(corpus_dir.joinpath('payer_plans.parquet'))
+    assert payer_plans.column_names == ['plan_id', 'payer_name', 'plan_name']
+    assert len(set(payer_plans['plan_id'].to_pylist())) == payer_plans.num_rows == result.plan_count
+    assert set(expected['plan_id'].to_pylist()) <= set(payer_plans['plan_id'].to_pylist())
+
+
+def test_compact_corpus_append(tmp_path: Path, data_root: Path):
+    # Arrange
+    output_root = tmp_path.joinpath('output')
+    _convert(output_root, data_root)
+    json_dir = _mkdir(tmp_path.joinpath('json'))
+    Json2Parquet(data_root.joinpath('json', 'v2.json'), json_dir).convert()
+    corpus_dir = tmp_path.joinpath('corpus')
+    first = compact_corpus([str(output_root.joinpath('tall_*'))], str(corpus_dir), rows_per_file=4000,
+                           row_group_size=1000)
+    orphan_path = corpus_dir.joinpath(STANDARD_CHARGE_DIR_NAME, 'part-00099.parquet')
+    orphan_path.write_bytes(b'left by a failed run')
+
+    # Act
+    second = compact_corpus([str(output_root), str(json_dir)], str(corpus_dir), rows_per_file=4000, row_group_size=1000)
+
+    # Assert
+    assert (first.merged_count, second.merged_count, second.skipped_count) == (1, 2, 2)
+    assert not orphan_path.exists()
+    sources = pq.read_table(corpus_dir.joinpath(SOURCES_FILE_NAME))
+    assert sources.num_rows == second.file_count == 3
+    assert sum(sources['standard_charge_count'].to_pylist()) == pq.read_table(
+        corpus_dir.joinpath(STANDARD_CHARGE_DIR_NAME)).num_rows
+    assert find_output_folders([str(tmp_path)]) == sorted(str(path) for path in [*output_root.iterdir(), json_dir])
+
+
+def test_compact_corpus_failed_folders(tmp_path: Path, data_root: Path):
+    # Arrange
+    output_root, expected_root = tmp_path.joinpath('output'), tmp_path.joinpath('expected')
+    _convert(output_root, data_root)
+    _convert(expected_root, data_root)
+    # folders sorted before the folders with the same file ids, so that they are not skipped.
+    Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), _mkdir(output_root.joinpath('a_float')),
+                price_type='float').convert()
+    shutil.copytree(output_root.joinpath('jm_10000'), output_root.joinpath('a_no_plans'))
+    output_root.joinpath('a_no_plans', 'payer_plans.parquet').unlink()
+
+    # Act
+    result = compact_corpus([str(output_root)], str(tmp_path.joinpath('corpus')), rows_per_file=4000,
+                            row_group_size=1000)
+
+    # Assert
+    expected = compact_corpus([str(expected_root)], str(tmp_path.joinpath('expected_corpus')), rows_per_file=4000,
+                              row_group_size=1000)
+    assert result.failed_count == 2
+    assert replace(result, failed_count=0) == expected
+    assert pq.read_table(tmp_path.joinpath('corpus', STANDARD_CHARGE_DIR_NAME)).equals(
+        pq.read_table(tmp_path.joinpath('expected_corpus', STANDARD_CHARGE_DIR_NAME)))
+
+
+def test_compact_corpus_failed_merge(tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    output_root = tmp_path.joinpath('output')
+    _convert(output_root, data_root)
+    json_dir = _mkdir(output_root.joinpath('a_json'))
+    Json2Parquet(data_root.joinpath('json', 'v2.json'), json_dir).convert()
+    calls = []
+
+    def _from_compact_standard_charges(table, plan_ids):
+        # jm_10000 fails after 5 row groups, in its second part file.
+        calls.append(table.num_rows)
+        if len(calls) > 5:
+            raise OSError('Corrupt row group')
+        return corpus.from_compact_standard_charges(table, plan_ids)
+
+    # Act
+    with monkeypatch.context() as patch:
+        patch.setattr(corpus, 'from_compact_standard_charges', _from_compact_standard_charges)
+        result = compact_corpus([str(output_root)], str(tmp_path.joinpath('corpus')), rows_per_file=4000,
+                                row_group_size=1000)
+
+    # Assert
+    # the standard charges of jm_10000 are removed from the part file it shares with a_json, and tall_v2 is merged.
+    expected = pa.concat_tables([pq.read_table(output_root.joinpath(name, 'standard_charges.parquet'))
+                                 for name in ('a_json', 'tall_v2')])
+    assert (result.merged_count, result.failed_count, result.skipped_count) == (2, 1, 1)
+    assert result.standard_charge_count == expected.num_rows
+    assert pq.read_table(tmp_path.joinpath('corpus', STANDARD_CHARGE_DIR_NAME)).equals(expected)
+    assert pq.read_table(tmp_path.joinpath('corpus', SOURCES_FILE_NAME))['output_path'].to_pylist() == \
+        [str(json_dir), str(output_root.joinpath('tall_v2'))]
+
+
+def test_compact_corpus_dimensions_without_sources(tmp_path: Path, data_root: Path):
+    # Arrange
+    output_root = tmp_path.joinpath('output')
+    _convert(output_root, data_root)
+    corpus_dir = tmp_path.joinpath('corpus')
+    compact_corpus([str(output_root.joinpath('tall_v2'))], str(corpus_dir))
+    sources = pq.read_table(corpus_dir.joinpath(SOURCES_FILE_NAME))
+    compact_corpus([str(output_root)], str(corpus_dir))
+    # a run that failed after writing the dimensions and before the sources.
+    pq.write_table(sources, corpus_dir.joinpath(SOURCES_FILE_NAME))
+
+    # Act
+    result = compact_corpus([str(output_root)], str(corpus_dir))
+
+    # Assert
+    general_data_elements = pq.read_table(corpus_dir.joinpath('general_data_elements.parquet'))
+    assert (result.merged_count, result.file_count) == (1, 2)
+    assert sorted(general_data_elements['file_id'].to_pylist()) == \
+        sorted(pq.read_table(corpus_dir.joinpath(SOURCES_FILE_NAME))['file_id'].to_pylist())
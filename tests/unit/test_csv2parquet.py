@@ -1,12 +1,32 @@
+import csv
+import io
 import shutil
+import time
+import zipfile
 from dataclasses import asdict
 from pathlib import Path
+from typing import Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import pytest
 
-from hpt_converter.csv2parquet import Csv2Parquet, FileMetaData
+from hpt_converter import csv2parquet
+from hpt_converter.csv2parquet import Csv2Parquet, Engine, FileMetaData
+from hpt_converter.lib.checkpoint import CheckpointStore
+from hpt_converter.lib.csv.arrow_engine import StandardChargeTransformer
 from hpt_converter.lib.csv.utils import CsvType
+from hpt_converter.lib.schema.abstract.v1 import PayerPlan
+from hpt_converter.lib.schema.abstract.v1.arrow_schema import (
+    COMPACT_PAYER_PLAN_SCHEMA, COMPACT_STANDARD_CHARGE_SCHEMA,
+    DICTIONARY_FIELDS, REJECTED_ROW_SCHEMA, STANDARD_CHARGE_CODE_SCHEMA,
+    STANDARD_CHARGE_SCHEMA, PriceType,
+    get_standard_charge_schema, to_price_type)
+from hpt_converter.lib.schema.csv.v2.standard_charge import (
+    StandardChargeModelCache, get_payer_plan_columns)
+from hpt_converter.lib.writer import OutputFormat, OutputSink
 
 from .common import comp_dataframes, create_standard_charge_instance
 
@@ -46,15 +66,38 @@ def test_split_raw_standard_charge_wide():
     assert payer_plans.plan_name == 'plan A1'
 
 
+def test_unpivot_raw_standard_charges():
+    # Arrange
+    file_id = "file789"
+    instances = [create_standard_charge_instance(CsvType.WIDE) for _ in range(3)]
+    payer_plan_columns = get_payer_plan_columns(instances[0].__class__.model_fields)
+    payer_plans = [PayerPlan(file_id=file_id, payer_name=payer_name, plan_name=plan_name)
+                   for payer_name, plan_name in payer_plan_columns]
+
+    # Act
+    result = Csv2Parquet.unpivot_raw_standard_charges(instances, payer_plan_columns, payer_plans, file_id)
+
+    # Assert
+    expected = [standard_charge.model_dump() for instance in instances
+                for standard_charge, _ in Csv2Parquet.split_raw_standard_charge(instance, CsvType.WIDE, file_id)]
+    assert result.num_rows == len(expected)
+    assert result.column('plan_id').to_pylist() == [sc['plan_id'] for sc in expected]
+    assert result.column('negotiated_dollar').to_pylist() == [sc['negotiated_dollar'] for sc in expected]
+    assert result.column('methodology').to_pylist() == [sc['methodology'] for sc in expected]
+    assert result.column('setting').to_pylist() == [sc['setting'] for sc in expected]
+
+
+@pytest.mark.parametrize("engine", [Engine.PYTHON, Engine.ARROW])
 @pytest.mark.parametrize("csv_type,file_name", [(CsvType.TALL, "tall_v2.csv"),
                                                 (CsvType.TALL, 'jm_10000.csv'), # from John Muir web site.
                                                 (CsvType.WIDE, "wide_v2.csv")])
-def test_convert(csv_type: CsvType, file_name: str, tmp_path: Path, data_root: Path):
+def test_convert(csv_type: CsvType, file_name: str, engine: Engine, tmp_path: Path, data_root: Path):
     # Arrange
     converter = Csv2Parquet(
         csv_file_path=data_root.joinpath('csv', file_name),
         out_dir_path=tmp_path,
-        csv_type=csv_type
+        csv_type=csv_type,
+        engine=engine
     )
 
     # Act
@@ -91,3 +134,661 @@ def test_convert(csv_type: CsvType, file_name: str, tmp_path: Path, data_root: P
             elif file.name == 'standard_charges.parquet':
                 sort_by = ['description', 'plan_id']
             comp_dataframes(df, df2, sort_by=sort_by)
+
+
+@pytest.mark.parametrize("file_name", ["tall_v2.csv", "jm_10000.csv", "wide_v2.csv"])
+def test_convert_engines_identical(file_name: str, tmp_path: Path, data_root: Path):
+    # Arrange
+    out_dirs = {engine: tmp_path.joinpath(engine.value) for engine in Engine}
+
+    # Act
+    results = {}
+    for engine, out_dir in out_dirs.items():
+        out_dir.mkdir()
+        results[engine] = Csv2Parquet(csv_file_path=data_root.joinpath('csv', file_name),
+                                      out_dir_path=out_dir,
+                                      engine=engine).convert()
+
+    # Assert
+    assert results[Engine.PYTHON] == results[Engine.ARROW]
+    for file in out_dirs[Engine.PYTHON].iterdir():
+        assert file.read_bytes() == out_dirs[Engine.ARROW].joinpath(file.name).read_bytes(), file.name
+
+
+def _write_lower_case_header(data_root: Path, tmp_path: Path, file_name: str = 'wide_v2.csv') -> Path:
+    """Writes a file with the standard charge header in lower case, so that payer plan columns match the model."""
+    lines = data_root.joinpath('csv', file_name).read_text(encoding='utf-8').splitlines(keepends=True)
+    lines[2] = lines[2].lower()
+    csv_file_path = tmp_path.joinpath(f'lower_case_{file_name}')
+    csv_file_path.write_text(''.join(lines), encoding='utf-8')
+    return csv_file_path
+
+
+def test_convert_engines_identical_blank_wide_prices(tmp_path: Path, data_root: Path):
+    # Arrange
+    csv_file_path = _write_lower_case_header(data_root, tmp_path)
+    out_dirs = {engine: tmp_path.joinpath(engine.value) for engine in Engine}
+
+    # Act
+    results = {}
+    for engine, out_dir in out_dirs.items():
+        out_dir.mkdir()
+        results[engine] = Csv2Parquet(csv_file_path, out_dir, engine=engine).convert()
+
+    # Assert
+    assert results[Engine.PYTHON] == results[Engine.ARROW]
+    negotiated_dollars = pq.read_table(out_dirs[Engine.ARROW].joinpath('standard_charges.parquet'))['negotiated_dollar']
+    assert 0 < negotiated_dollars.null_count < len(negotiated_dollars)
+    for file in out_dirs[Engine.PYTHON].iterdir():
+        assert file.read_bytes() == out_dirs[Engine.ARROW].joinpath(file.name).read_bytes(), file.name
+
+
+def _write_swapped_payer_plans(csv_file_path: Path) -> Path:
+    """Writes a wide file with the column groups of its two payer plans swapped."""
+    lines = csv_file_path.read_text(encoding='utf-8').splitlines(keepends=True)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(row[:11] + row[17:23] + row[11:17] + row[23:]
+                                                      for row in csv.reader(lines[2:]))
+    swapped_path = csv_file_path.with_name(f'swapped_{csv_file_path.name}')
+    swapped_path.write_text(''.join(lines[:2]) + buffer.getvalue(), encoding='utf-8')
+    return swapped_path
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+def test_convert_reordered_header_shared_model(engine: Engine, tmp_path: Path, data_root: Path):
+    # Arrange
+    csv_file_path = _write_lower_case_header(data_root, tmp_path)
+    swapped_path = _write_swapped_payer_plans(csv_file_path)
+    fresh_dir, shared_dir = tmp_path.joinpath('fresh'), tmp_path.joinpath('shared')
+    fresh_dir.mkdir()
+    shared_dir.mkdir()
+    model_cache = StandardChargeModelCache()
+
+    # Act
+    Csv2Parquet(csv_file_path, shared_dir, engine=engine, model_cache=model_cache).convert()
+    Csv2Parquet(swapped_path, shared_dir, engine=engine, model_cache=model_cache).convert()
+    Csv2Parquet(swapped_path, fresh_dir, engine=engine, model_cache=StandardChargeModelCache()).convert()
+
+    # Assert
+    # the model of the first file is reused, and payer plans are still in the order of the swapped header.
+    assert model_cache.info()['hits'] == 1
+    payer_plans = pq.read_table(shared_dir.joinpath('payer_plans.parquet'))
+    assert payer_plans['payer_name'].to_pylist() == ['region_health_insurance', 'platform_health_insurance']
+    for file in fresh_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(shared_dir.joinpath(file.name))), file.name
+
+
+def _write_wide_price(data_root: Path, tmp_path: Path, value: str) -> Path:
+    """Writes wide_v2.csv with a lower case header, and `value` as the negotiated dollar of the first payer plan
+    in the row at line 2."""
+    csv_file_path = _write_lower_case_header(data_root, tmp_path)
+    lines = csv_file_path.read_text(encoding='utf-8').splitlines(keepends=True)
+    rows = list(csv.reader(lines[3:]))
+    rows[1][lines[2].rstrip().split(',').index('standard_charge|platform_health_insurance|ppo|negotiated_dollar')] = value
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    csv_file_path.write_text(''.join(lines[:3]) + buffer.getvalue(), encoding='utf-8')
+    return csv_file_path
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('value', ['33.333', '20000.125', '123456789012'])
+def test_convert_invalid_wide_price(engine: Engine, value: str, tmp_path: Path, data_root: Path):
+    # Arrange
+    csv_file_path = _write_wide_price(data_root, tmp_path, value)
+    out_dir = tmp_path.joinpath('out')
+    out_dir.mkdir()
+
+    # Act & Assert
+    with pytest.raises(ValueError, match='at line 2'):
+        Csv2Parquet(csv_file_path, out_dir, engine=engine).convert()
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_lenient_invalid_wide_price(engine: Engine, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    csv_file_path = _write_wide_price(data_root, tmp_path, '33.333')
+    out_dir = tmp_path.joinpath('out')
+    out_dir.mkdir()
+
+    # Act
+    result = Csv2Parquet(csv_file_path, out_dir, engine=engine, workers=workers, lenient=True).convert()
+
+    # Assert
+    assert result.input_row_count == 20
+    assert result.rejected_row_count == 1
+    assert result.standard_charge_count == 38
+    rejected_rows = pq.read_table(out_dir.joinpath('rejected_rows.parquet')).to_pylist()
+    assert [row['line_number'] for row in rejected_rows] == [2]
+    assert 'standard_charge|platform_health_insurance|ppo|negotiated_dollar' in rejected_rows[0]['error']
+    assert dict(rejected_rows[0]['raw_values'])['standard_charge|platform_health_insurance|ppo|negotiated_dollar'] == \
+        '33.333'
+
+
+def test_convert_row_group_size(tmp_path: Path, data_root: Path):
+    # Act
+    result = Csv2Parquet(csv_file_path=data_root.joinpath('csv', 'jm_10000.csv'),
+                         out_dir_path=tmp_path,
+                         engine=Engine.ARROW,
+                         row_group_size=1000).convert()
+
+    # Assert
+    metadata = pq.ParquetFile(tmp_path.joinpath('standard_charges.parquet')).metadata
+    assert metadata.num_row_groups == 10
+    assert metadata.num_rows == result.standard_charge_count
+    assert metadata.schema.to_arrow_schema() == STANDARD_CHARGE_SCHEMA
+
+
+@pytest.mark.parametrize("engine", [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize("file_name", ["jm_10000.csv", "wide_v2.csv"])
+def test_convert_parallel(file_name: str, engine: Engine, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    sequential_dir, parallel_dir = tmp_path.joinpath('sequential'), tmp_path.joinpath('parallel')
+    sequential_dir.mkdir()
+    parallel_dir.mkdir()
+
+    # Act
+    sequential = Csv2Parquet(data_root.joinpath('csv', file_name), sequential_dir, engine=engine).convert()
+    parallel = Csv2Parquet(data_root.joinpath('csv', file_name), parallel_dir, engine=engine, workers=3).convert()
+
+    # Assert
+    assert parallel == sequential
+    assert sorted(x.name for x in parallel_dir.iterdir()) == sorted(x.name for x in sequential_dir.iterdir())
+    for file in sequential_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(parallel_dir.joinpath(file.name))), file.name
+
+
+@pytest.mark.parametrize('file_name', ['tall_v2.csv', 'wide_v2.csv'])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_compact(file_name: str, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    plain_dir, compact_dir = tmp_path.joinpath('plain'), tmp_path.joinpath('compact')
+    plain_dir.mkdir()
+    compact_dir.mkdir()
+
+    # Act
+    plain = Csv2Parquet(data_root.joinpath('csv', file_name), plain_dir, engine=Engine.ARROW).convert()
+    compact = Csv2Parquet(data_root.joinpath('csv', file_name), compact_dir, engine=Engine.ARROW,
+                          workers=workers, compact=True).convert()
+
+    # Assert
+    assert compact == plain
+    payer_plans = pq.read_table(compact_dir.joinpath('payer_plans.parquet'))
+    assert payer_plans.schema == COMPACT_PAYER_PLAN_SCHEMA
+    assert payer_plans['plan_key'].to_pylist() == list(range(plain.plan_count))
+    assert payer_plans.drop_columns(['plan_key']).cast(pq.read_schema(plain_dir.joinpath('payer_plans.parquet'))).equals(
+        pq.read_table(plain_dir.joinpath('payer_plans.parquet')))
+
+    standard_charges = pq.read_table(compact_dir.joinpath('standard_charges.parquet'))
+    assert standard_charges.schema == COMPACT_STANDARD_CHARGE_SCHEMA
+    plan_ids = payer_plans['plan_id'].to_pylist()
+    expected = pq.read_table(plain_dir.joinpath('standard_charges.parquet'))
+    assert [plan_ids[key] if key is not None else None for key in standard_charges['plan_key'].to_pylist()] == \
+        expected['plan_id'].to_pylist()
+    for name in DICTIONARY_FIELDS:
+        assert standard_charges[name].cast(STANDARD_CHARGE_SCHEMA.field(name).type).equals(expected[name]), name
+
+
+@pytest.mark.parametrize('price_type', [PriceType.FLOAT, PriceType.CENTS])
+def test_convert_price_type(price_type: PriceType, tmp_path: Path, data_root: Path):
+    # Arrange
+    decimal_dir, price_type_dir = tmp_path.joinpath('decimal'), tmp_path.joinpath(price_type.value)
+    decimal_dir.mkdir()
+    price_type_dir.mkdir()
+
+    # Act
+    Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), decimal_dir).convert()
+    Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), price_type_dir, price_type=price_type).convert()
+
+    # Assert
+    actual = pq.read_table(price_type_dir.joinpath('standard_charges.parquet'))
+    assert actual.schema == get_standard_charge_schema(price_type=price_type)
+    assert actual.equals(to_price_type(pq.read_table(decimal_dir.joinpath('standard_charges.parquet')), price_type))
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_write_codes(workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+
+    # Act
+    Csv2Parquet(data_root.joinpath('csv', 'wide_v2.csv'), tmp_path, engine=Engine.ARROW, workers=workers,
+                row_group_size=7, write_codes=True).convert()
+
+    # Assert
+    standard_charges = pq.read_table(tmp_path.joinpath('standard_charges.parquet')).to_pylist()
+    codes = pq.read_table(tmp_path.joinpath('standard_charge_codes.parquet'))
+    assert codes.schema == STANDARD_CHARGE_CODE_SCHEMA
+    assert codes.to_pylist() == [{'row_number': row_number, **code}
+                                 for row_number, sc in enumerate(standard_charges) for code in sc['codes']]
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_metrics(engine: Engine, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    csv_file_path = data_root.joinpath('csv', 'jm_10000.csv')
+    progress = []
+
+    # Act
+    result = Csv2Parquet(csv_file_path, tmp_path, engine=engine, workers=workers,
+                         progress=lambda *args: progress.append(args)).convert()
+
+    # Assert
+    file_size = csv_file_path.stat().st_size
+    assert result.input_bytes == file_size
+    assert result.output_bytes == sum(file.stat().st_size for file in tmp_path.iterdir())
+    assert result.elapsed_seconds > 0 and result.cpu_seconds > 0 and result.rows_per_second > 0
+    assert result.peak_memory_bytes > 0
+    assert {'read', 'transform', 'write'} <= set(result.stages)
+    assert result.stages['read'].rows == result.input_row_count
+    assert all(stage.wall_seconds > 0 for stage in result.stages.values())
+    assert progress[-1] == (file_size, file_size, result.input_row_count)
+    assert [rows for _, _, rows in progress] == sorted(rows for _, _, rows in progress)
+
+
+def _write_invalid_rows(data_root: Path, tmp_path: Path) -> Tuple[Path, Path]:
+    """Writes tall_v2.csv with invalid rows 1(setting), 3(price), 5(code type) and an extra row with 3 columns,
+    and the same file without them."""
+    lines = data_root.joinpath('csv', 'tall_v2.csv').read_text(encoding='utf-8').splitlines(keepends=True)
+    rows = list(csv.reader(lines[3:]))
+    invalid_rows = [list(row) for row in rows]
+    invalid_rows[0][6] = 'nowhere'
+    invalid_rows[2][9] = '$1,234'
+    invalid_rows[4][2] = 'BOGUS'
+    invalid_path, valid_path = tmp_path.joinpath('invalid.csv'), tmp_path.joinpath('valid.csv')
+    for path, csv_rows in [(invalid_path, invalid_rows + [['a', 'b', 'c']]),
+                           (valid_path, [row for index, row in enumerate(rows) if index not in (0, 2, 4)])]:
+        with open(path, mode='w', newline='', encoding='utf-8') as csv_file:
+            csv_file.writelines(lines[:3])
+            csv.writer(csv_file).writerows(csv_rows)
+    return invalid_path, valid_path
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_lenient(engine: Engine, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    invalid_path, valid_path = _write_invalid_rows(data_root, tmp_path)
+    lenient_dir, valid_dir = tmp_path.joinpath('lenient'), tmp_path.joinpath('valid')
+    lenient_dir.mkdir()
+    valid_dir.mkdir()
+
+    # Act
+    result = Csv2Parquet(invalid_path, lenient_dir, csv_type=CsvType.TALL, engine=engine, workers=workers,
+                         lenient=True).convert()
+    expected = Csv2Parquet(valid_path, valid_dir, csv_type=CsvType.TALL, engine=engine).convert()
+
+    # Assert
+    assert result.rejected_row_count == 4
+    assert result.input_row_count == 32
+    assert result.standard_charge_count == expected.standard_charge_count
+    assert pq.read_table(lenient_dir.joinpath('standard_charges.parquet')).equals(
+        pq.read_table(valid_dir.joinpath('standard_charges.parquet')))
+    rejected_rows = pq.read_table(lenient_dir.joinpath('rejected_rows.parquet'))
+    assert rejected_rows.schema == REJECTED_ROW_SCHEMA
+    rejected_rows = {row['line_number']: row for row in rejected_rows.to_pylist()}
+    assert set(rejected_rows) == {1, 3, 5, 32 if engine == Engine.PYTHON else None}
+    assert dict(rejected_rows[5]['raw_values'])['code|1|type'] == 'BOGUS'
+    assert 'code_type' in rejected_rows[5]['error']
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('limits', [{'max_errors': 2}, {'max_error_ratio': 0.1}])
+def test_convert_lenient_limits(engine: Engine, limits: dict, tmp_path: Path, data_root: Path):
+    # Arrange
+    invalid_path, _ = _write_invalid_rows(data_root, tmp_path)
+    out_dir = tmp_path.joinpath('out')
+    out_dir.mkdir()
+
+    # Act & Assert
+    with pytest.raises(ValueError, match='max_error'):
+        Csv2Parquet(invalid_path, out_dir, csv_type=CsvType.TALL, engine=engine, lenient=True, **limits).convert()
+    assert not out_dir.joinpath('standard_charges.parquet').exists()
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_partition_by(workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    plain_dir, partitioned_dir = tmp_path.joinpath('plain'), tmp_path.joinpath('partitioned')
+    plain_dir.mkdir()
+    partitioned_dir.mkdir()
+    partition_by = ['setting', 'plan_id']
+
+    # Act
+    plain = Csv2Parquet(data_root.joinpath('csv', 'wide_v2.csv'), plain_dir, engine=Engine.ARROW).convert()
+    partitioned = Csv2Parquet(data_root.joinpath('csv', 'wide_v2.csv'), partitioned_dir, engine=Engine.ARROW,
+                              workers=workers, partition_by=partition_by, sort_by=['description'],
+                              write_page_index=True).convert()
+
+    # Assert
+    assert partitioned == plain
+    assert not partitioned_dir.joinpath('standard_charges.parquet').exists()
+    files = list(partitioned_dir.joinpath('standard_charges').rglob('*.parquet'))
+    assert {file.parent.parent.name for file in files} == {'setting=inpatient', 'setting=outpatient', 'setting=both'}
+    for file in files:
+        descriptions = pq.read_table(file).column('description').to_pylist()
+        assert descriptions == sorted(descriptions)
+    partitioning = ds.partitioning(pa.schema([STANDARD_CHARGE_SCHEMA.field(name) for name in partition_by]),
+                                   flavor='hive')
+    dataset = ds.dataset(partitioned_dir.joinpath('standard_charges'), partitioning=partitioning)
+    sort_keys = [('description', 'ascending'), ('plan_id', 'ascending'), ('gross_charge', 'ascending')]
+    assert dataset.to_table().select(STANDARD_CHARGE_SCHEMA.names).sort_by(sort_keys).equals(
+        pq.read_table(plain_dir.joinpath('standard_charges.parquet')).sort_by(sort_keys))
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('write_row_hashes', [True, False])
+def test_convert_delta(engine: Engine, write_row_hashes: bool, tmp_path: Path, data_root: Path):
+    # Arrange
+    previous_dir, delta_dir = tmp_path.joinpath('previous'), tmp_path.joinpath('delta')
+    previous_dir.mkdir()
+    delta_dir.mkdir()
+    Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), previous_dir, engine=engine,
+                write_row_hashes=write_row_hashes).convert()
+    with open(data_root.joinpath('csv', 'tall_v2.csv'), newline='', encoding='utf-8') as csv_file:
+        rows = list(csv.reader(csv_file))
+    rows[1][1] = '2024-08-01'   # last_updated_on, which changes file_id
+    rows[7][9] = '99.99'        # standard_charge|gross of a standard charge
+    rows.append(['New item'] + rows[33][1:])
+    del rows[22]
+    csv_file_path = tmp_path.joinpath('tall_v2_next.csv')
+    with open(csv_file_path, mode='w', newline='', encoding='utf-8') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+
+    # Act
+    meta_data = Csv2Parquet(csv_file_path, delta_dir, engine=engine, previous_dir_path=previous_dir).convert()
+
+    # Assert
+    assert (meta_data.added_count, meta_data.changed_count, meta_data.removed_count) == (1, 1, 1)
+    assert not delta_dir.joinpath('standard_charges.parquet').exists()
+    assert previous_dir.joinpath('standard_charge_hashes.parquet').exists() == write_row_hashes
+    assert pq.read_metadata(delta_dir.joinpath('standard_charge_hashes.parquet')).num_rows == meta_data.standard_charge_count
+    delta = {row['change']: row for row in pq.read_table(delta_dir.joinpath('standard_charges_delta.parquet')).to_pylist()}
+    assert set(delta) == {'added', 'changed', 'removed'}
+    assert delta['added']['description'] == 'New item'
+    assert str(delta['changed']['gross_charge']) == '99.99'
+    assert delta['changed']['file_id'] != pq.read_table(previous_dir.joinpath('standard_charges.parquet'))['file_id'][0].as_py()
+    assert delta['removed']['description'] is None
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('suffix', ['.gz', '.zst', '.zip'])
+def test_convert_compressed(suffix: str, engine: Engine, tmp_path: Path, data_root: Path):
+    # Arrange
+    plain_dir, compressed_dir = tmp_path.joinpath('plain'), tmp_path.joinpath('compressed')
+    plain_dir.mkdir()
+    compressed_dir.mkdir()
+    csv_file_path = data_root.joinpath('csv', 'wide_v2.csv')
+    if suffix == '.zip':
+        input_path = f"{tmp_path.joinpath('inputs.zip')}!hospital/wide_v2.csv"
+        with zipfile.ZipFile(tmp_path.joinpath('inputs.zip'), mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(csv_file_path, 'hospital/wide_v2.csv')
+            archive.write(data_root.joinpath('csv', 'tall_v2.csv'), 'hospital/tall_v2.csv')
+    else:
+        input_path = str(tmp_path.joinpath(f'wide_v2.csv{suffix}'))
+        with pa.CompressedOutputStream(input_path, suffix[1:].replace('gz', 'gzip').replace('zst', 'zstd')) as output:
+            output.write(csv_file_path.read_bytes())
+    progress = []
+
+    # Act
+    plain = Csv2Parquet(csv_file_path, plain_dir, engine=engine).convert()
+    compressed = Csv2Parquet(input_path, compressed_dir, engine=engine, workers=2,
+                             progress=lambda *args: progress.append(args)).convert()
+
+    # Assert
+    assert compressed == plain
+    assert compressed.input_bytes == progress[-1][1] < csv_file_path.stat().st_size
+    for file_name in ('standard_charges.parquet', 'payer_plans.parquet', 'general_data_elements.parquet'):
+        assert pq.read_table(compressed_dir.joinpath(file_name)).equals(pq.read_table(plain_dir.joinpath(file_name)))
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_memory_map(workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    plain_dir, mapped_dir = tmp_path.joinpath('plain'), tmp_path.joinpath('mapped')
+    plain_dir.mkdir()
+    mapped_dir.mkdir()
+    csv_file_path = data_root.joinpath('csv', 'jm_10000.csv')
+
+    # Act
+    plain = Csv2Parquet(csv_file_path, plain_dir, engine=Engine.ARROW).convert()
+    converter = Csv2Parquet(csv_file_path, mapped_dir, engine=Engine.ARROW, workers=workers, memory_map=True)
+    mapped = converter.convert()
+
+    # Assert
+    assert mapped == plain
+    assert converter.mapping is None
+    assert mapped.input_bytes == csv_file_path.stat().st_size
+    assert converter.prelude.data_offset == csv_file_path.read_bytes().index(b'\n', csv_file_path.read_bytes().index(b'description')) + 1
+    for file in plain_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(mapped_dir.joinpath(file.name))), file.name
+
+
+def test_convert_memory_map_python_engine(tmp_path: Path, data_root: Path):
+    # Act & Assert
+    with pytest.raises(ValueError, match='memory_map requires the arrow engine'):
+        Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), tmp_path, engine=Engine.PYTHON, memory_map=True)
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_pipeline(engine: Engine, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    invalid_path, _ = _write_invalid_rows(data_root, tmp_path)
+    sequential_dir, pipelined_dir = tmp_path.joinpath('sequential'), tmp_path.joinpath('pipelined')
+    sequential_dir.mkdir()
+    pipelined_dir.mkdir()
+    options = dict(csv_type=CsvType.TALL, engine=engine, workers=workers, row_group_size=8, compact=True,
+                   write_codes=True, lenient=True)
+
+    # Act
+    sequential = Csv2Parquet(invalid_path, sequential_dir, **options).convert()
+    pipelined = Csv2Parquet(invalid_path, pipelined_dir, pipeline_depth=2, **options).convert()
+
+    # Assert
+    assert pipelined == sequential
+    assert not sequential.pipeline
+    assert list(pipelined.pipeline) == ['read', 'transform', 'write']
+    assert all(0 <= stage.utilization <= 1 and stage.max_queue_depth <= 2 for stage in pipelined.pipeline.values())
+    assert pipelined.pipeline['write'].items > 0
+    for file in sequential_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(pipelined_dir.joinpath(file.name))), file.name
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+def test_convert_pipeline_transform_stage(engine: Engine, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    calls = []
+    delay = 0.01 if engine == Engine.PYTHON else 0.05
+    if engine == Engine.PYTHON:
+        split = Csv2Parquet.split_raw_standard_charge
+
+        def _slow_split(*args, **kwargs):
+            calls.append(args)
+            time.sleep(delay)
+            return split(*args, **kwargs)
+        monkeypatch.setattr(Csv2Parquet, 'split_raw_standard_charge', staticmethod(_slow_split))
+    else:
+        transform = StandardChargeTransformer.transform
+
+        def _slow_transform(*args, **kwargs):
+            calls.append(args)
+            time.sleep(delay)
+            return transform(*args, **kwargs)
+        monkeypatch.setattr(StandardChargeTransformer, 'transform', _slow_transform)
+
+    # Act
+    result = Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), tmp_path, engine=engine, pipeline_depth=2).convert()
+
+    # Assert
+    # the read stage only parses rows, which are validated and transformed by the transform stage.
+    slept = delay * len(calls)
+    assert calls
+    assert result.pipeline['transform'].busy_seconds >= slept
+    assert result.pipeline['read'].busy_seconds < slept
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_max_memory(engine: Engine, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    default_dir, budget_dir = tmp_path.joinpath('default'), tmp_path.joinpath('budget')
+    default_dir.mkdir()
+    budget_dir.mkdir()
+    csv_file_path = data_root.joinpath('csv', 'jm_10000.csv')
+    max_memory = 4 << 20
+
+    # Act
+    default = Csv2Parquet(csv_file_path, default_dir, engine=engine).convert()
+    budget = Csv2Parquet(csv_file_path, budget_dir, engine=engine, workers=workers, max_memory=max_memory).convert()
+
+    # Assert
+    assert budget == default
+    assert 0 < budget.peak_buffered_bytes <= max_memory
+    assert default.peak_buffered_bytes == 0
+    assert pq.ParquetFile(budget_dir.joinpath('standard_charges.parquet')).metadata.num_row_groups > 1
+    for file in default_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(budget_dir.joinpath(file.name))), file.name
+
+
+@pytest.mark.parametrize('sink', [OutputSink(OutputFormat.PARQUET, 'zstd', 19), OutputSink(OutputFormat.ARROW),
+                                  OutputSink(OutputFormat.ARROW_STREAM, 'none')])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_convert_sink(sink: OutputSink, workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(csv2parquet, 'MIN_BYTE_RANGE_SIZE', 1)
+    default_dir, sink_dir = tmp_path.joinpath('default'), tmp_path.joinpath('sink')
+    default_dir.mkdir()
+    sink_dir.mkdir()
+    csv_file_path = data_root.joinpath('csv', 'jm_10000.csv')
+
+    # Act
+    default = Csv2Parquet(csv_file_path, default_dir, engine=Engine.ARROW, write_codes=True).convert()
+    result = Csv2Parquet(csv_file_path, sink_dir, engine=Engine.ARROW, workers=workers, write_codes=True,
+                         sink=sink).convert()
+
+    # Assert
+    assert result == default
+    assert default.output_sink == 'parquet(snappy)' and result.output_sink == str(sink)
+    assert result.output_bytes == sum(file.stat().st_size for file in sink_dir.iterdir())
+    assert result.stages['write'].bytes == result.output_bytes and result.stages['write'].wall_seconds > 0
+    for file in default_dir.iterdir():
+        sink_file_path = sink_dir.joinpath(file.stem + sink.suffix)
+        assert sink.read_table(str(sink_file_path)).equals(pq.read_table(file)), file.name
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+@pytest.mark.parametrize('file_name', ['tall_v2.csv', 'wide_v2.csv'])
+def test_iter_batches(engine: Engine, file_name: str, tmp_path: Path, data_root: Path):
+    # Arrange
+    csv_file_path = data_root.joinpath('csv', file_name)
+    expected = Csv2Parquet(csv_file_path, tmp_path, engine=engine).convert()
+    converter = Csv2Parquet(csv_file_path, engine=engine)
+
+    # Act
+    batches = list(converter.iter_batches(batch_size=7))
+
+    # Assert
+    assert all(0 < batch.num_rows <= 7 and batch.schema.equals(STANDARD_CHARGE_SCHEMA) for batch in batches)
+    assert pa.Table.from_batches(batches).equals(pq.read_table(tmp_path.joinpath('standard_charges.parquet')))
+    assert converter.meta_data == expected
+    assert [pp.model_dump() for pp in converter.payer_plans] == \
+        pq.read_table(tmp_path.joinpath('payer_plans.parquet')).to_pylist()
+    general_data_elements = pq.read_table(tmp_path.joinpath('general_data_elements.parquet')).to_pylist()[0]
+    assert converter.general_data_elements.file_id == general_data_elements['file_id']
+    assert converter.general_data_elements.hospital_name == general_data_elements['hospital_name']
+    with pytest.raises(ValueError, match='requires out_dir_path'):
+        converter.convert()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_convert_checkpoint_resume(workers: int, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    default_dir, resumed_dir = tmp_path.joinpath('default'), tmp_path.joinpath('resumed')
+    default_dir.mkdir()
+    resumed_dir.mkdir()
+    checkpoint_dir = tmp_path.joinpath('checkpoint')
+    csv_file_path = data_root.joinpath('csv', 'jm_10000.csv')
+    options = {'engine': Engine.ARROW, 'workers': workers, 'lenient': True, 'checkpoint_dir_path': str(checkpoint_dir),
+               'checkpoint_size': 512 << 10}
+    default = Csv2Parquet(csv_file_path, default_dir, engine=Engine.ARROW, lenient=True).convert()
+    complete = CheckpointStore.complete
+
+    def _complete_and_stop(checkpoint: CheckpointStore, i: int, result: dict):
+        # the conversion stops after 3 byte ranges are recorded, like an evicted process.
+        complete(checkpoint, i, result)
+        if len(checkpoint.ranges) == 3:
+            raise RuntimeError("Evicted")
+
+    # Act
+    monkeypatch.setattr(CheckpointStore, 'complete', _complete_and_stop)
+    with pytest.raises(RuntimeError, match='Evicted'):
+        Csv2Parquet(csv_file_path, resumed_dir, **options).convert()
+    completed = {path.name: path.stat().st_mtime_ns for path in checkpoint_dir.glob('standard_charges_[0-2].arrow')}
+    monkeypatch.setattr(CheckpointStore, 'complete', complete)
+    monkeypatch.setattr(CheckpointStore, 'remove', lambda checkpoint: None)
+    resumed = Csv2Parquet(csv_file_path, resumed_dir, resume=True, **options).convert()
+
+    # Assert
+    # completed ranges are merged again without being converted again, and the output is that of a single run.
+    assert len(completed) == 3
+    assert {name: checkpoint_dir.joinpath(name).stat().st_mtime_ns for name in completed} == completed
+    assert resumed == default
+    for file in default_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(resumed_dir.joinpath(file.name))), file.name
+    with pytest.raises(ValueError, match='has no checkpoint.json'):
+        Csv2Parquet(csv_file_path, resumed_dir, checkpoint_dir_path=str(default_dir)).convert()
+
+
+@pytest.mark.parametrize('engine', [Engine.PYTHON, Engine.ARROW])
+def test_convert_checkpoint_single_worker(engine: Engine, tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    invalid_path, _ = _write_invalid_rows(data_root, tmp_path)
+    default_dir, checkpoint_out_dir = tmp_path.joinpath('default'), tmp_path.joinpath('checkpointed')
+    default_dir.mkdir()
+    checkpoint_out_dir.mkdir()
+    checkpoint_dir = tmp_path.joinpath('checkpoint')
+    max_memory = 1 << 30
+    options = {'csv_type': CsvType.TALL, 'engine': engine, 'lenient': True}
+    default = Csv2Parquet(invalid_path, default_dir, **options).convert()
+
+    def _no_process_pool(*args, **kwargs):
+        raise AssertionError("A single worker doesn't start worker processes")
+
+    # Act
+    monkeypatch.setattr(csv2parquet, 'ProcessPoolExecutor', _no_process_pool)
+    monkeypatch.setattr(CheckpointStore, 'remove', lambda checkpoint: None)
+    converter = Csv2Parquet(invalid_path, checkpoint_out_dir, checkpoint_dir_path=str(checkpoint_dir),
+                            checkpoint_size=1 << 10, max_memory=max_memory, **options)
+    result = converter.convert()
+
+    # Assert
+    # byte ranges are streamed into the output, and written to the checkpoint folder only to be merged on resume.
+    assert converter.max_memory == max_memory
+    assert len(converter.checkpoint.ranges) > 1
+    assert len(list(checkpoint_dir.glob('standard_charges_*.arrow'))) == len(converter.checkpoint.ranges)
+    assert result == default
+    assert result.input_bytes == invalid_path.stat().st_size
+    for file in default_dir.iterdir():
+        if file.name != 'rejected_rows.parquet':
+            assert pq.read_table(file).equals(pq.read_table(checkpoint_out_dir.joinpath(file.name))), file.name
+    # rows of a block are rejected as they are read or transformed, so rows are only in line order within a block.
+    rejected_rows = [pq.read_table(path).sort_by('line_number').to_pylist()
+                     for path in (default_dir.joinpath('rejected_rows.parquet'),
+                                  checkpoint_out_dir.joinpath('rejected_rows.parquet'))]
+    assert rejected_rows[0] == rejected_rows[1]
+    other_engine = Engine.ARROW if engine == Engine.PYTHON else Engine.PYTHON
+    with pytest.raises(ValueError, match='another input or options'):
+        Csv2Parquet(invalid_path, checkpoint_out_dir, checkpoint_dir_path=str(checkpoint_dir), checkpoint_size=1 << 10,
+                    resume=True, **(options | {'engine': other_engine})).convert()
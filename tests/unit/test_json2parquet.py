@@ -0,0 +1,135 @@
+import json
+from decimal import Decimal
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+
+from hpt_converter.converter import FileMetaData
+from hpt_converter import json2parquet
+from hpt_converter.json2parquet import Json2Parquet
+
+
+def test_convert(tmp_path: Path, data_root: Path):
+    # Act
+    result = Json2Parquet(data_root.joinpath('json', 'v2.json'), tmp_path).convert()
+
+    # Assert
+    assert result == FileMetaData(input_row_count=3, standard_charge_count=5, plan_count=2)
+    general_data_elements = pq.read_table(tmp_path.joinpath('general_data_elements.parquet')).to_pylist()
+    payer_plans = pq.read_table(tmp_path.joinpath('payer_plans.parquet')).to_pylist()
+    standard_charges = pq.read_table(tmp_path.joinpath('standard_charges.parquet')).to_pylist()
+    assert [x['hospital_name'] for x in general_data_elements] == ['West Mercy Hospital']
+    assert [(x['payer_name'], x['plan_name']) for x in payer_plans] == [('Platform Health Insurance', 'PPO'),
+                                                                        ('Region Health Insurance', 'HMO')]
+    assert {x['file_id'] for x in standard_charges} == {general_data_elements[0]['file_id']}
+    assert [x['plan_id'] for x in standard_charges] == [payer_plans[0]['plan_id'], payer_plans[1]['plan_id'], None,
+                                                        payer_plans[0]['plan_id'], None]
+    assert standard_charges[0]['codes'] == [{'code': '470', 'code_type': 'MS-DRG'}, {'code': '175869', 'code_type': 'LOCAL'}]
+    assert standard_charges[1]['negotiated_percentage'] == Decimal('22.50')
+    assert standard_charges[1]['methodology'] == 'percent of total billed charges'
+    assert standard_charges[2]['gross_charge'] == Decimal('150.13')
+    assert standard_charges[2]['modifiers'] == '50|XU'
+    assert (standard_charges[4]['drug_unit_of_measurement'], standard_charges[4]['drug_type_of_measurement']) == ('1.5', 'ml')
+
+
+def test_convert_general_data_elements_after_standard_charges(tmp_path: Path, data_root: Path):
+    # Arrange
+    with open(data_root.joinpath('json', 'v2.json'), encoding='utf-8') as json_file:
+        document = json.load(json_file)
+    json_file_path = tmp_path.joinpath('reordered.json')
+    json_file_path.write_text(json.dumps({'standard_charge_information': document.pop('standard_charge_information'),
+                                          **document}))
+    expected_dir, actual_dir = tmp_path.joinpath('expected'), tmp_path.joinpath('actual')
+    expected_dir.mkdir()
+    actual_dir.mkdir()
+
+    # Act
+    Json2Parquet(data_root.joinpath('json', 'v2.json'), expected_dir).convert()
+    result = Json2Parquet(json_file_path, actual_dir).convert()
+
+    # Assert
+    assert result == FileMetaData(input_row_count=3, standard_charge_count=5, plan_count=2)
+    for name in ['general_data_elements', 'payer_plans', 'standard_charges']:
+        assert pq.read_table(actual_dir.joinpath(f'{name}.parquet')).equals(
+            pq.read_table(expected_dir.joinpath(f'{name}.parquet')))
+
+
+def test_convert_lenient(tmp_path: Path, data_root: Path):
+    # Arrange
+    with open(data_root.joinpath('json', 'v2.json'), encoding='utf-8') as json_file:
+        document = json.load(json_file)
+    document['standard_charge_information'][1]['standard_charges'][0]['setting'] = 'nowhere'
+    json_file_path = tmp_path.joinpath('invalid.json')
+    json_file_path.write_text(json.dumps(document))
+
+    # Act
+    result = Json2Parquet(json_file_path, tmp_path, lenient=True).convert()
+
+    # Assert
+    assert result == FileMetaData(input_row_count=3, standard_charge_count=3, plan_count=2, rejected_row_count=1)
+    rejected_rows = pq.read_table(tmp_path.joinpath('rejected_rows.parquet')).to_pylist()
+    assert [row['line_number'] for row in rejected_rows] == [2]
+    assert 'setting' in rejected_rows[0]['error']
+    assert json.loads(dict(rejected_rows[0]['raw_values'])['standard_charges'])[0]['setting'] == 'nowhere'
+
+
+@pytest.mark.parametrize('value', ['22.555', '12345678901234567890'])
+def test_convert_invalid_price(value: str, tmp_path: Path, data_root: Path):
+    # Arrange
+    with open(data_root.joinpath('json', 'v2.json'), encoding='utf-8') as json_file:
+        document = json.load(json_file, parse_float=Decimal)
+    document['standard_charge_information'][1]['standard_charges'][0]['gross_charge'] = Decimal(value)
+    json_file_path = tmp_path.joinpath('invalid.json')
+    json_file_path.write_text(json.dumps(document, default=str).replace(f'"{value}"', value))
+
+    # Act & Assert
+    # prices that don't fit decimal128(16, 2) are invalid rather than rounded, like prices of CSV files.
+    with pytest.raises(ValueError, match=f"Invalid gross_charge value\\('{value}'\\)"):
+        Json2Parquet(json_file_path, tmp_path).convert()
+
+
+@pytest.mark.parametrize('value', ['22.555', '12345678901234567890'])
+def test_convert_lenient_invalid_price(value: str, tmp_path: Path, data_root: Path):
+    # Arrange
+    with open(data_root.joinpath('json', 'v2.json'), encoding='utf-8') as json_file:
+        document = json.load(json_file, parse_float=Decimal)
+    document['standard_charge_information'][1]['standard_charges'][0]['payers_information'] = [
+        {'payer_name': 'Platform Health Insurance', 'plan_name': 'PPO', 'standard_charge_dollar': Decimal(value)}]
+    json_file_path = tmp_path.joinpath('invalid.json')
+    json_file_path.write_text(json.dumps(document, default=str).replace(f'"{value}"', value))
+
+    # Act
+    result = Json2Parquet(json_file_path, tmp_path, lenient=True).convert()
+
+    # Assert
+    # the item with the price is rejected and the other items are converted.
+    assert result == FileMetaData(input_row_count=3, standard_charge_count=3, plan_count=2, rejected_row_count=1)
+    rejected_rows = pq.read_table(tmp_path.joinpath('rejected_rows.parquet')).to_pylist()
+    assert [row['line_number'] for row in rejected_rows] == [2]
+    assert f"Invalid negotiated_dollar value('{value}')" in rejected_rows[0]['error']
+    assert len(pq.read_table(tmp_path.joinpath('standard_charges.parquet'))) == 3
+
+
+def test_convert_pipeline(tmp_path: Path, data_root: Path, monkeypatch):
+    # Arrange
+    monkeypatch.setattr(json2parquet, 'STANDARD_CHARGE_BLOCK_SIZE', 1)
+    with open(data_root.joinpath('json', 'v2.json'), encoding='utf-8') as json_file:
+        document = json.load(json_file)
+    document['standard_charge_information'][1]['standard_charges'][0]['setting'] = 'nowhere'
+    json_file_path = tmp_path.joinpath('invalid.json')
+    json_file_path.write_text(json.dumps(document))
+    sequential_dir, pipelined_dir = tmp_path.joinpath('sequential'), tmp_path.joinpath('pipelined')
+    sequential_dir.mkdir()
+    pipelined_dir.mkdir()
+
+    # Act
+    sequential = Json2Parquet(json_file_path, sequential_dir, lenient=True).convert()
+    pipelined = Json2Parquet(json_file_path, pipelined_dir, lenient=True, pipeline_depth=2).convert()
+
+    # Assert
+    # items are validated by the transform stage, one block of items at a time.
+    assert pipelined == sequential
+    assert pipelined.pipeline['read'].items == pipelined.pipeline['transform'].items == 3
+    for file in sequential_dir.iterdir():
+        assert pq.read_table(file).equals(pq.read_table(pipelined_dir.joinpath(file.name))), file.name
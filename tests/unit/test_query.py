@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+from hpt_converter.csv2parquet import Csv2Parquet, Engine
+from hpt_converter.lib.index import INDEX_FILE_NAME
+from hpt_converter.query import StandardChargeIndex
+
+
+def _find_rows(out_dir: Path, code: str = None, description: str = None, plan_id: str = None) -> list:
+    """Finds the row numbers of standard charges by scanning the whole file."""
+    standard_charges = pq.read_table(out_dir.joinpath('standard_charges.parquet'))
+    plan_ids = pq.read_table(out_dir.joinpath('payer_plans.parquet'))['plan_id'].to_pylist()
+    rows = []
+    for row_number, row in enumerate(standard_charges.to_pylist()):
+        row_plan_id = plan_ids[row['plan_key']] if 'plan_key' in row else row['plan_id']
+        if ((code is None or code in [c['code'] for c in row['codes']])
+                and (description is None or row['description'].lower() == description.lower())
+                and (plan_id is None or row_plan_id == plan_id)):
+            rows.append(row_number)
+    return rows
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_lookup(compact: bool, tmp_path: Path, data_root: Path):
+    # Arrange
+    Csv2Parquet(data_root.joinpath('csv', 'jm_10000.csv'), tmp_path, engine=Engine.ARROW, row_group_size=1000,
+                compact=compact, write_index=True).convert()
+    standard_charges = pq.read_table(tmp_path.joinpath('standard_charges.parquet'))
+    row = standard_charges.slice(2500, 1).to_pylist()[0]
+    plan_id = pq.read_table(tmp_path.joinpath('payer_plans.parquet'))['plan_id'][row['plan_key']].as_py() \
+        if compact else row['plan_id']
+    code = row['codes'][-1]['code']
+    index = StandardChargeIndex(str(tmp_path))
+
+    # Act
+    by_code = index.lookup(code=code)
+    by_code_and_plan = index.lookup(code=code, code_type=row['codes'][-1]['code_type'], plan_id=plan_id,
+                                    columns=['description', 'gross_charge'])
+    by_description = index.lookup(description=row['description'].upper())
+    not_found = index.lookup(code='NO-SUCH-CODE')
+
+    # Assert
+    assert by_code['row_number'].to_pylist() == _find_rows(tmp_path, code=code)
+    assert by_code_and_plan['row_number'].to_pylist() == _find_rows(tmp_path, code=code, plan_id=plan_id)
+    assert 2500 in by_code_and_plan['row_number'].to_pylist()
+    assert by_code_and_plan.column_names[:3] == ['row_number', 'description', 'gross_charge']
+    assert set(by_code_and_plan['plan_id'].to_pylist()) == {plan_id}
+    assert by_code_and_plan['hospital_name'][0].as_py() == 'John Muir Behavioral Health'
+    assert pc.all(pc.is_valid(by_code_and_plan['payer_name'])).as_py()
+    assert by_description['row_number'].to_pylist() == _find_rows(tmp_path, description=row['description'])
+    assert not_found.num_rows == 0
+
+
+def test_lookup_build(tmp_path: Path, data_root: Path):
+    # Arrange
+    Csv2Parquet(data_root.joinpath('csv', 'tall_v2.csv'), tmp_path).convert()
+
+    # Act & Assert
+    with pytest.raises(ValueError, match='No standard charge index'):
+        StandardChargeIndex(str(tmp_path))
+    index = StandardChargeIndex(str(tmp_path), build=True)
+    assert tmp_path.joinpath(INDEX_FILE_NAME).exists()
+    with pytest.raises(ValueError, match='at least one'):
+        index.lookup()
+
+
+def test_lookup_sorted_index_boundaries(tmp_path: Path, data_root: Path):
+    # Arrange
+    Csv2Parquet(data_root.joinpath('csv', 'jm_10000.csv'), tmp_path, engine=Engine.ARROW, row_group_size=1000,
+                write_index=True).convert()
+    index_table = pq.read_table(tmp_path.joinpath(INDEX_FILE_NAME))
+    codes = index_table.filter(pc.equal(index_table['key_type'], 'code'))['key']
+    first_code, last_code = codes[0].as_py(), codes[-1].as_py()
+    index = StandardChargeIndex(str(tmp_path))
+
+    # Act
+    first = index.lookup(code=first_code)
+    last = index.lookup(code=last_code)
+    before_first = index.lookup(code=' ')
+    after_last = index.lookup(code='￿')
+
+    # Assert
+    assert first['row_number'].to_pylist() == _find_rows(tmp_path, code=first_code)
+    assert last['row_number'].to_pylist() == _find_rows(tmp_path, code=last_code)
+    assert first.num_rows > 0 and last.num_rows > 0
+    assert before_first.num_rows == 0 and after_last.num_rows == 0